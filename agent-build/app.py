@@ -19,14 +19,27 @@ def health():
 
 @app.route('/agent_action', methods=['POST'])
 def agent_action():
-    jsondata = request.get_json()
-    data = json.loads(jsondata)
+    data = request.get_json()
+
+    # older simulators send the request body as a JSON encoded string
+    if isinstance(data, str):
+        data = json.loads(data)
 
     LOGGER.info(data)
 
     valid_actions = [tuple(x) for x in data['valid_actions']]
     return jsonify(agent_action=get_agent_action(valid_actions=valid_actions))
 
+@app.route('/agent_actions', methods=['POST'])
+def agent_actions():
+    data = request.get_json()
+
+    LOGGER.info('Batch of %d decisions', len(data['batch']))
+
+    actions = [get_agent_action(valid_actions=[tuple(x) for x in decision['valid_actions']])
+               for decision in data['batch']]
+    return jsonify(agent_actions=actions)
+
 
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000)
@@ -3,11 +3,24 @@ import os
 import shutil
 import zipfile
 
-from flask import Flask, jsonify, request, abort, render_template
+from flask import Flask, Response, jsonify, request, abort, render_template
+from poker import Card, Combo
 from werkzeug.utils import secure_filename
 
-from src.docker_client_wrapper import DockerClientWrapper
-from src.poker_engine.poker_simulator import start_simulation
+from src.agent_build_manager import AgentBuildManager, player_image_name
+from src.agent_container_pool import AgentContainerPool
+from src.metrics import REGISTRY
+from src.models.duplicate_job import DuplicateJob
+from src.models.league_job import LeagueJob
+from src.models.simulation_job import SimulationJob
+from src.models.tournament_job import TournamentJob
+from src.simulation_job_manager import SimulationJobManager
+from src.poker_engine.poker_agent_runtime import register_subprocess_agent, unregister_subprocess_agent
+from src.poker_engine.poker_duplicate import validate_duplicate_simulation
+from src.poker_engine.poker_equity import equity
+from src.poker_engine.poker_hand_analytics import find_hand_histories, hand_history_stats
+from src.poker_engine.poker_league import validate_league
+from src.poker_engine.poker_tournament import validate_tournament
 
 
 LOGGING_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
@@ -21,11 +34,40 @@ app.config["UPLOAD_FOLDER"] = './tmp'
 # List of players in memory - the player name will be corresponding to poker-agent container name
 PLAYERS = []
 
+# Process pools started by a request get at most one worker per CPU, equity estimates at most EQUITY_MAX_SAMPLES samples
+MAX_WORKERS = os.cpu_count() or 1
+EQUITY_MAX_SAMPLES = int(os.environ.get('EQUITY_MAX_SAMPLES', 1000000))
+
+# Hand histories of simulation jobs (started with record=true) are archived here
+HAND_HISTORY_DIR = os.environ.get('HAND_HISTORY_DIR', './tmp/hand_histories')
+
+# Agent images are built in the background, at most AGENT_BUILD_WORKERS at a time
+AGENT_BUILDS = AgentBuildManager(agent_build_dir='./agent-build',
+                                 build_root=os.path.join(app.config["UPLOAD_FOLDER"], 'agent_builds'),
+                                 max_workers=int(os.environ.get('AGENT_BUILD_WORKERS', 2)),
+                                 max_pending=int(os.environ.get('AGENT_BUILD_MAX_PENDING', 32)))
+
+# Agent containers are started ahead of simulations and health checked, simulation jobs wait (at most
+# AGENT_READY_TIMEOUT seconds) until the agents of their players are ready
+AGENT_POOL = AgentContainerPool(network='poker-game-simulator-shared',
+                                ready_timeout=float(os.environ.get('AGENT_READY_TIMEOUT', 30)),
+                                monitor_interval=float(os.environ.get('AGENT_MONITOR_INTERVAL', 5)))
+
+# Simulations run as background jobs, at most SIMULATION_JOB_WORKERS at a time
+SIMULATION_JOBS = SimulationJobManager(max_workers=int(os.environ.get('SIMULATION_JOB_WORKERS', 2)),
+                                       hand_history_dir=HAND_HISTORY_DIR, agent_pool=AGENT_POOL,
+                                       max_finished_jobs=int(os.environ.get('MAX_FINISHED_JOBS', 100)))
+
 
 @app.route('/health', methods=['GET'])
 def health():
     return "OK"
 
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Return simulation metrics in the Prometheus text format"""
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/players')
 def get_players():
     """Return list of players registered"""
@@ -47,19 +89,40 @@ def start_agent(player_name):
     if not player_name in PLAYERS:
         abort(400, "Player {} is not registered".format(player_name))
 
-    image_name = 'poker-agent:{}-latest'.format(player_name)
-    container_name = 'agent-{}'.format(player_name)
+    # runtime=subprocess loads the submitted agent in a worker subprocess of the simulator instead of a container
+    if request.args.get('runtime') == 'subprocess':
+        agent_dir = os.path.join(app.config["UPLOAD_FOLDER"], player_name)
+        try:
+            register_subprocess_agent(player_name, agent_dir)
+        except ValueError as ex:
+            abort(400, str(ex))
+        return ""
 
-    container = DockerClientWrapper.get_container_by_name(container_name)
-    if container:
-        container.stop()
+    unregister_subprocess_agent(player_name)
 
-    container = DockerClientWrapper.run_detached_container(
-        image_name, container_name,
-        auto_remove=True, remove=True, network="poker-game-simulator-shared"
-    )
+    build = AGENT_BUILDS.get_player_build(player_name)
+    if build and not build.is_finished:
+        abort(409, "Agent image of player {} is being built: {}".format(player_name, build.id))
 
-    return ""
+    # replicas spread the decisions of the player over several containers
+    replicas = int(request.args.get('replicas', 1))
+    if replicas < 1:
+        abort(400, "replicas must be positive")
+
+    agent_containers = AGENT_POOL.start_agent(player_name, player_image_name(player_name), replicas=replicas)
+
+    return jsonify([agent_container.to_dict() for agent_container in agent_containers]), 202
+
+@app.route('/players/agents', methods=['GET'])
+def get_agents():
+    """Return agent containers of every player, decisions only go to ready ones"""
+    return jsonify({player: [agent_container.to_dict() for agent_container in agent_containers]
+                    for (player, agent_containers) in AGENT_POOL.get_agents().items()})
+
+@app.route('/players/agents/<player_name>', methods=['GET'])
+def get_agent(player_name):
+    """Return agent containers of a player, poll until one is ready"""
+    return jsonify([agent_container.to_dict() for agent_container in AGENT_POOL.get_agent(player_name)])
 
 @app.route('/players/submit/<player_name>', methods=['GET'])
 def render_submit_agent(player_name):
@@ -83,27 +146,44 @@ def submit_agent(player_name):
     player_submission.save(final_file_path)
     LOGGER.info('New file is uploaded to %s', final_file_path)
 
+    # a new submission replaces the previous sources of the player
     unzip_path = os.path.join(app.config["UPLOAD_FOLDER"], player_name, 'src')
-    if not os.path.exists(unzip_path):
-        os.makedirs(unzip_path)
+    if os.path.exists(unzip_path):
+        shutil.rmtree(unzip_path)
+    os.makedirs(unzip_path)
 
     with zipfile.ZipFile(final_file_path, "r") as zip_ref:
         zip_ref.extractall(unzip_path)
         LOGGER.info('New file is extracted to %s', unzip_path)
 
-    shutil.copyfile('./agent-build/app.py', os.path.join(app.config["UPLOAD_FOLDER"], player_name, 'app.py'))
-    shutil.copyfile('./agent-build/Dockerfile', os.path.join(app.config["UPLOAD_FOLDER"], player_name, 'Dockerfile'))
-    shutil.copyfile('./agent-build/requirements.txt', os.path.join(app.config["UPLOAD_FOLDER"], player_name, 'requirements.txt'))
+    try:
+        build = AGENT_BUILDS.submit(player_name, unzip_path)
+    except ValueError as ex:
+        abort(503, str(ex))
 
-    DockerClientWrapper.build_image(
-        os.path.join(app.config["UPLOAD_FOLDER"], player_name), 
-        f'poker-agent:{player_name}-latest'
-    )
+    return render_template('upload.html', player_name=player_name, build_id=build.id,
+                           success_message='New file has been uploaded sucessfully! Build {} is {}'.format(
+                               build.id, build.status))
+
+@app.route('/players/builds', methods=['GET'])
+def get_agent_builds():
+    """Return agent image builds, of one player with ?player="""
+    player_name = request.args.get('player')
+    return jsonify([build.to_dict() for build in AGENT_BUILDS.get_builds()
+                    if not player_name or build.player == player_name])
+
+@app.route('/players/builds/<build_id>', methods=['GET'])
+def get_agent_build(build_id):
+    """Return status of an agent image build, poll until it is completed, cached or failed"""
+    build = AGENT_BUILDS.get_build(build_id)
+    if not build:
+        abort(404, "Build {} is not found".format(build_id))
 
-    return render_template('upload.html', player_name=player_name, success_message='New file has been uploaded sucessfully!')
+    return jsonify(build.to_dict())
 
 @app.route('/simulations/start_new', methods=['POST'])
 def start_new_simulation():
+    """Start a simulation job, poll GET /simulations/<job_id> for progress and results"""
     players = request.args['players']
     players = players.split(',')
 
@@ -113,15 +193,231 @@ def start_new_simulation():
     init_pot = int(request.args['init_pot'])
     small_blind_stake = int(request.args['small_blind_stake'])
     max_iterations = int(request.args['max_iterations'] or 1)
+    seed = int(request.args['seed']) if request.args.get('seed') else None
+    workers = request_workers()
+    record_hand_history = request.args.get('record', '').lower() == 'true'
+    # runner=async plays the games on an event loop, concurrently waiting on agent containers, runner=batched plays
+    # them side by side with one agent request per player for all the pending decisions
+    runner = request.args.get('runner') or SimulationJob.PROCESS_RUNNER
+
+    try:
+        job = SIMULATION_JOBS.submit(players=players, init_pot=init_pot, small_blind_stake=small_blind_stake,
+                                     max_iterations=max_iterations, use_local=False, seed=seed, workers=workers,
+                                     record_hand_history=record_hand_history, runner=runner)
+    except ValueError as ex:
+        abort(400, str(ex))
+
+    LOGGER.info('DONE Start new simulation job {} with players={} init_pot={} small_blind_stake={} for {} iterations'.format(
+        job.id, players, init_pot, small_blind_stake, max_iterations
+    ))
 
-    histogram = start_simulation(players=players, init_pot=init_pot, 
-                                 small_blind_stake=small_blind_stake, max_iterations=max_iterations, use_local=False)
+    return jsonify(job.to_dict()), 202
 
-    LOGGER.info('DONE Start new simulation with players={} init_pot={} small_blind_stake={} for {} iterations'.format(
-        players, init_pot, small_blind_stake, max_iterations
-    ))
+@app.route('/tournaments/start_new', methods=['POST'])
+def start_new_tournament():
+    """Start a multi-table tournament job of the registered players (or of ?players=), poll GET /tournaments/<job_id>"""
+    players = request.args['players'].split(',') if request.args.get('players') else list(PLAYERS)
+
+    if not set(players).issubset(set(PLAYERS)):
+        abort(400, "Some players have not registered: {}".format(players))
+
+    try:
+        max_hands = int(request.args['max_hands']) if request.args.get('max_hands') else None
+        starting_stack = int(request.args.get('starting_stack') or 1000)
+        table_size = int(request.args.get('table_size') or 9)
+        hands_per_level = int(request.args.get('hands_per_level') or 20)
+        hands_per_segment = int(request.args.get('hands_per_segment') or 10)
+        seed = int(request.args['seed']) if request.args.get('seed') else None
+
+        # rejected here rather than failing the job
+        validate_tournament(players, table_size, hands_per_level, hands_per_segment)
+    except ValueError as ex:
+        abort(400, str(ex))
+
+    job = SIMULATION_JOBS.submit_tournament(
+        players=players,
+        starting_stack=starting_stack,
+        table_size=table_size,
+        hands_per_level=hands_per_level,
+        hands_per_segment=hands_per_segment,
+        use_local=False,
+        seed=seed,
+        workers=request_workers(),
+        max_hands=max_hands
+    )
+
+    return jsonify(job.to_dict()), 202
+
+@app.route('/tournaments/<job_id>', methods=['GET'])
+def get_tournament(job_id):
+    """Return status, progress (level, players and tables left) and places of a tournament job"""
+    job = SIMULATION_JOBS.get_job(job_id)
+    if not isinstance(job, TournamentJob):
+        abort(404, "Tournament job not found: {}".format(job_id))
+
+    return jsonify(job.to_dict())
+
+@app.route('/leagues/start_new', methods=['POST'])
+def start_new_league():
+    """Start a round-robin league job of the registered players (or of ?players=), poll GET /leagues/<job_id>
+    for the leaderboard"""
+    players = request.args['players'].split(',') if request.args.get('players') else list(PLAYERS)
+
+    if not set(players).issubset(set(PLAYERS)):
+        abort(400, "Some players have not registered: {}".format(players))
+
+    try:
+        table_sizes = [int(size) for size in (request.args.get('table_sizes') or '2').split(',')]
+        n_way_rounds = int(request.args.get('n_way_rounds') or 1)
+        init_pot = int(request.args.get('init_pot') or 100)
+        small_blind_stake = int(request.args.get('small_blind_stake') or 5)
+        min_games = int(request.args.get('min_games') or 20)
+        max_games = int(request.args.get('max_games') or 200)
+        seed = int(request.args['seed']) if request.args.get('seed') else None
+
+        # rejected here rather than failing the job
+        validate_league(players, table_sizes, n_way_rounds, min_games, max_games)
+    except ValueError as ex:
+        abort(400, str(ex))
+
+    job = SIMULATION_JOBS.submit_league(
+        players=players,
+        table_sizes=table_sizes,
+        n_way_rounds=n_way_rounds,
+        init_pot=init_pot,
+        small_blind_stake=small_blind_stake,
+        min_games=min_games,
+        max_games=max_games,
+        use_local=False,
+        seed=seed,
+        workers=request_workers()
+    )
+
+    return jsonify(job.to_dict()), 202
+
+@app.route('/leagues/<job_id>', methods=['GET'])
+def get_league(job_id):
+    """Return status, leaderboard (partial while running) and matchups of a league job"""
+    job = SIMULATION_JOBS.get_job(job_id)
+    if not isinstance(job, LeagueJob):
+        abort(404, "League job not found: {}".format(job_id))
+
+    return jsonify(job.to_dict())
+
+@app.route('/duplicates/start_new', methods=['POST'])
+def start_new_duplicate():
+    """Start a duplicate deal job: every deal is played once per seating, players moving one seat at every seating.
+    Poll GET /duplicates/<job_id> for chips per game and standard errors"""
+    players = request.args['players'].split(',') if request.args.get('players') else list(PLAYERS)
+
+    if not set(players).issubset(set(PLAYERS)):
+        abort(400, "Some players have not registered: {}".format(players))
 
-    return jsonify(histogram)
+    try:
+        init_pot = int(request.args.get('init_pot') or 100)
+        small_blind_stake = int(request.args.get('small_blind_stake') or 5)
+        max_deals = int(request.args.get('max_deals') or 100)
+        max_rounds = int(request.args.get('max_rounds') or 100)
+        seed = int(request.args['seed']) if request.args.get('seed') else None
+
+        validate_duplicate_simulation(players, max_deals)
+    except ValueError as ex:
+        abort(400, str(ex))
+
+    job = SIMULATION_JOBS.submit_duplicate(players=players, init_pot=init_pot, small_blind_stake=small_blind_stake,
+                                           max_deals=max_deals, max_rounds=max_rounds, use_local=False, seed=seed,
+                                           workers=request_workers())
+
+    return jsonify(job.to_dict()), 202
+
+@app.route('/duplicates/<job_id>', methods=['GET'])
+def get_duplicate(job_id):
+    """Return status, progress (deals played) and per player chips per game of a duplicate deal job"""
+    job = SIMULATION_JOBS.get_job(job_id)
+    if not isinstance(job, DuplicateJob):
+        abort(404, "Duplicate job not found: {}".format(job_id))
+
+    return jsonify(job.to_dict())
+
+@app.route('/simulations', methods=['GET'])
+def get_simulations():
+    """Return all simulation jobs"""
+    return jsonify([job.to_dict() for job in SIMULATION_JOBS.get_jobs()])
+
+@app.route('/simulations/<job_id>', methods=['GET'])
+def get_simulation(job_id):
+    """Return status, progress and (partial) histogram of a simulation job"""
+    job = SIMULATION_JOBS.get_job(job_id)
+    if not job:
+        abort(404, "Simulation job not found: {}".format(job_id))
+
+    return jsonify(job.to_dict())
+
+@app.route('/simulations/<job_id>/cancel', methods=['POST'])
+def cancel_simulation(job_id):
+    job = SIMULATION_JOBS.cancel(job_id)
+    if not job:
+        abort(404, "Simulation job not found: {}".format(job_id))
+
+    return jsonify(job.to_dict())
+
+@app.route('/hand_histories/stats', methods=['GET'])
+def get_hand_history_stats():
+    """Return VPIP, PFR, showdown frequency and results per position over archived hand histories"""
+    if not os.path.isdir(HAND_HISTORY_DIR):
+        abort(404, "No hand histories archived")
+
+    # files=<name>,<name> restricts the stats to some archived files, e.g. the hand history of a job
+    if request.args.get('files'):
+        paths = [os.path.join(HAND_HISTORY_DIR, secure_filename(name)) for name in request.args['files'].split(',')]
+        missing = [os.path.basename(path) for path in paths if not os.path.isfile(path)]
+        if missing:
+            abort(404, "Hand histories not found: {}".format(missing))
+    else:
+        paths = find_hand_histories(HAND_HISTORY_DIR)
+
+    players = request.args['players'].split(',') if request.args.get('players') else None
+
+    try:
+        stats = hand_history_stats(paths, players=players)
+    except ValueError as ex:
+        abort(400, str(ex))
+
+    return jsonify(stats)
+
+@app.route('/equity', methods=['GET'])
+def get_equity():
+    """Return Monte Carlo equity of hole cards (e.g. AsKh) on board cards (e.g. Td7c2s) against opponents"""
+    try:
+        hole = Combo(request.args['hole'])
+        board = request.args.get('board', '')
+        board = [Card(board[i:i + 2]) for i in range(0, len(board), 2)]
+    except (KeyError, ValueError) as ex:
+        abort(400, "Invalid hole or board cards: {}".format(ex))
+
+    try:
+        n_opponents = int(request.args.get('opponents') or 1)
+        samples = min(int(request.args.get('samples') or 10000), EQUITY_MAX_SAMPLES)
+        seed = int(request.args['seed']) if request.args.get('seed') else None
+        ci_width = float(request.args['ci_width']) if request.args.get('ci_width') else None
+        workers = request_workers()
+
+        result = equity(hole, board, n_opponents, samples=samples, seed=seed, ci_width=ci_width, workers=workers)
+    except ValueError as ex:
+        abort(400, str(ex))
+
+    return jsonify(equity=result.equity, win=result.win, tie=result.tie,
+                   samples=result.samples, ci_width=result.ci_width)
+
+
+# Return the workers of the request, at most one per CPU
+def request_workers() -> int:
+    try:
+        workers = int(request.args.get('workers') or 1)
+    except ValueError:
+        abort(400, "workers must be an integer")
+
+    return max(1, min(workers, MAX_WORKERS))
 
 
 if __name__ == '__main__':
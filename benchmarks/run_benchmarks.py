@@ -0,0 +1,305 @@
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, List
+
+from poker import Card, Combo
+
+from src.models.betting_state import BettingState
+from src.models.game_round import GameRound
+from src.poker_engine.poker_agent import agent_call_action
+from src.poker_engine.poker_equity import board_strength_table, equity
+from src.poker_engine.poker_hand_check import detect_hand, eval_hand
+from src.poker_engine.poker_hand_eval import CARDS, evaluate_cards
+from src.poker_engine.poker_simulator import start_new_game, start_simulation
+
+
+LOGGER = logging.getLogger(__name__)
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), 'baseline.json')
+
+PLAYERS = ['dnguyen', 'erik', 'mathias', 'dtran']
+
+# A result is a regression when it is more than TOLERANCE slower than the baseline
+TOLERANCE = 0.2
+
+# Every benchmark keeps the best of REPEAT timed runs, a single short run is too noisy for the tolerance
+REPEAT = 5
+
+# Results are only compared with a baseline of the same workloads. The Python version is reported but not
+# required: the project targets Python 3.7, where the baseline cannot always be recorded
+WORKLOAD_KEYS = ('quick',)
+
+# Simulations with several workers are only compared with a baseline recorded with the same CPU count
+WORKERS_BENCHMARK_PREFIX = 'start_simulation_workers_'
+
+
+# Return the best rate (operations per second) of `repeat` timed runs of fn, fn returns its number of operations
+def measure_rate(fn: Callable[[], int], repeat: int) -> float:
+    best_rate = 0.0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        operations = fn()
+        elapsed = time.perf_counter() - start
+        best_rate = max(best_rate, operations / elapsed)
+    return best_rate
+
+
+def random_hands(n_cards: int, n_hands: int, seed: int) -> List[List[int]]:
+    rng = random.Random(seed)
+    return [rng.sample(range(52), n_cards) for _ in range(n_hands)]
+
+
+def bench_evaluate_cards(n_hands: int, repeat: int) -> float:
+    hands = random_hands(7, n_hands, seed=1)
+
+    def run():
+        for hand in hands:
+            evaluate_cards(hand)
+        return len(hands)
+
+    return measure_rate(run, repeat)
+
+
+def bench_eval_hand(n_hands: int, repeat: int) -> float:
+    hands = [[CARDS[card] for card in hand] for hand in random_hands(5, n_hands, seed=2)]
+
+    def run():
+        for hand in hands:
+            eval_hand(hand)
+        return len(hands)
+
+    return measure_rate(run, repeat)
+
+
+def bench_detect_hand(n_hands: int, repeat: int) -> float:
+    hands = [[CARDS[card] for card in hand] for hand in random_hands(7, n_hands, seed=3)]
+    player_hands = [(Combo.from_cards(hand[0], hand[1]), hand[2:]) for hand in hands]
+
+    def run():
+        for (player_hand, board_cards) in player_hands:
+            detect_hand(player_hand, board_cards)
+        return len(player_hands)
+
+    return measure_rate(run, repeat)
+
+
+# Equity samples per second on a complete board: strengths come from the board table, built once per board
+# (the table is cleared before every run so that building it is measured as well)
+def bench_equity_river(n_samples: int, repeat: int) -> float:
+    hole = Combo('AsKs')
+    board = [Card(card) for card in ('Td', '7c', '2s', 'Kd', '3h')]
+
+    def run():
+        board_strength_table.cache_clear()
+        equity(hole, board, n_opponents=3, samples=n_samples, seed=0)
+        return n_samples
+
+    return measure_rate(run, repeat)
+
+
+# Equity samples per second on the flop, every deal evaluates its own turn and river
+def bench_equity_flop(n_samples: int, repeat: int) -> float:
+    hole = Combo('AsKs')
+    board = [Card(card) for card in ('Td', '7c', '2s')]
+
+    def run():
+        equity(hole, board, n_opponents=3, samples=n_samples, seed=0)
+        return n_samples
+
+    return measure_rate(run, repeat)
+
+
+# Betting rounds with six players where everybody calls or checks, and the first player raises once
+def bench_betting_state(n_rounds: int, repeat: int) -> float:
+    players = ['player-{}'.format(i) for i in range(6)]
+    player_hands = [(2 * i, 2 * i + 1) for i in range(len(players))]
+
+    def run():
+        actions = 0
+        for pos in range(n_rounds):
+            game_round = GameRound(pos=pos, small_blind=players[0], big_blind=players[1], players=players,
+                                   player_pots=[1000] * len(players), player_hands=player_hands, small_blind_stake=5)
+            betting_state = BettingState(pos=0, board_state='pre-flop', board_cards=[], game_round=game_round,
+                                         players=players)
+            betting_state.add_player_action(players[0], ('small_blind', 5))
+            betting_state.add_player_action(players[1], ('big_blind', 10))
+
+            player_index = 0
+            while not betting_state.is_betting_state_complete():
+                player = players[player_index]
+                valid_actions = betting_state.get_valid_actions(player, 1000, 5)
+                if player_index == 2 and len(betting_state.player_actions.get(player, [])) == 0:
+                    player_action = ('raise', valid_actions[-1][1])
+                else:
+                    player_action = agent_call_action(player, valid_actions)
+
+                betting_state.add_player_action(player, player_action)
+                actions += 1
+                player_index = (player_index + 1) % len(players)
+        return actions
+
+    return measure_rate(run, repeat)
+
+
+def bench_games(n_games: int, repeat: int) -> float:
+    def run():
+        for seed in range(n_games):
+            start_new_game(PLAYERS, init_pot=50, small_blind_stake=5, use_local=True, seed=seed)
+        return n_games
+
+    return measure_rate(run, repeat)
+
+
+def bench_simulation(n_games: int, workers: int, repeat: int) -> float:
+    def run():
+        start_simulation(PLAYERS, init_pot=50, small_blind_stake=5, max_iterations=n_games, use_local=True,
+                         seed=0, workers=workers)
+        return n_games
+
+    return measure_rate(run, repeat)
+
+
+# Return {benchmark name: {'value': rate, 'unit': unit}}, quick runs use smaller workloads. Simulations are
+# measured with up to one worker per CPU: more workers would only measure the CPU count of the machine
+def run_benchmarks(quick=False, max_workers: int = None, repeat=REPEAT) -> Dict[str, Dict[str, object]]:
+    scale = 1 if quick else 5
+    max_workers = min(max_workers or os.cpu_count() or 1, os.cpu_count() or 1)
+
+    results = {
+        'evaluate_cards': (bench_evaluate_cards(20000 * scale, repeat), 'evals/s'),
+        'eval_hand': (bench_eval_hand(4000 * scale, repeat), 'evals/s'),
+        'detect_hand': (bench_detect_hand(500 * scale, repeat), 'evals/s'),
+        'equity_river': (bench_equity_river(4000 * scale, repeat), 'samples/s'),
+        'equity_flop': (bench_equity_flop(4000 * scale, repeat), 'samples/s'),
+    }
+    results['betting_state'] = (bench_betting_state(500 * scale, repeat), 'actions/s')
+    results['start_new_game'] = (bench_games(10 * scale, repeat), 'games/s')
+
+    workers = 1
+    while workers <= max_workers:
+        results[WORKERS_BENCHMARK_PREFIX + str(workers)] = (bench_simulation(40 * scale, workers, repeat),
+                                                                  'games/s')
+        workers *= 2
+
+    return {name: {'value': round(value, 2), 'unit': unit} for (name, (value, unit)) in results.items()}
+
+
+def to_report(results: Dict[str, Dict[str, object]], quick=False, repeat=REPEAT) -> dict:
+    return {
+        'meta': {
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            # major.minor only: patch releases do not move the numbers
+            'python': '.'.join(platform.python_version_tuple()[:2]),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'quick': quick,
+            'repeat': repeat
+        },
+        'results': results
+    }
+
+
+# Return the workload differences between a report and the baseline, e.g. {'quick': (False, True)}
+def workload_mismatch(meta: dict, baseline_meta: dict) -> Dict[str, tuple]:
+    return {key: (baseline_meta.get(key), meta.get(key)) for key in WORKLOAD_KEYS
+            if baseline_meta.get(key) != meta.get(key)}
+
+
+# Return names of the benchmarks that cannot be compared with a baseline recorded with another CPU count
+def cpu_bound_benchmarks(results: Dict[str, Dict[str, object]], meta: dict, baseline_meta: dict) -> List[str]:
+    if meta.get('cpu_count') == baseline_meta.get('cpu_count'):
+        return []
+
+    return [name for name in results
+            if name.startswith(WORKERS_BENCHMARK_PREFIX) and name != WORKERS_BENCHMARK_PREFIX + '1']
+
+
+# Return names of the benchmarks slower than the baseline by more than tolerance
+def compare_with_baseline(results: Dict[str, Dict[str, object]], baseline: Dict[str, Dict[str, object]],
+                          tolerance: float = TOLERANCE) -> List[str]:
+    regressions = []
+
+    for (name, result) in results.items():
+        if name not in baseline:
+            LOGGER.info('%-28s %12.2f %-10s (no baseline)', name, result['value'], result['unit'])
+            continue
+
+        ratio = result['value'] / baseline[name]['value']
+        LOGGER.info('%-28s %12.2f %-10s %6.2fx baseline', name, result['value'], result['unit'], ratio)
+
+        if ratio < 1 - tolerance:
+            regressions.append(name)
+
+    return regressions
+
+
+def main(args: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description='Benchmark the hand evaluator, betting engine and game throughput')
+    parser.add_argument('--quick', action='store_true', help='smaller workloads, for a fast sanity check')
+    parser.add_argument('--max-workers', type=int, default=None)
+    parser.add_argument('--output', default=None, help='write the JSON report to this file (default: stdout)')
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE)
+    parser.add_argument('--repeat', type=int, default=REPEAT, help='timed runs per benchmark, the best one is kept')
+    parser.add_argument('--save-baseline', action='store_true', help='store the results as the new baseline')
+    args = parser.parse_args(args)
+
+    report = to_report(run_benchmarks(quick=args.quick, max_workers=args.max_workers, repeat=args.repeat),
+                       quick=args.quick, repeat=args.repeat)
+    report_json = json.dumps(report, indent=2)
+
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            output_file.write(report_json + '\n')
+    else:
+        print(report_json)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as baseline_file:
+            baseline_file.write(report_json + '\n')
+        LOGGER.info('Baseline is saved to %s', args.baseline)
+        return 0
+
+    if not os.path.exists(args.baseline):
+        LOGGER.warning('No baseline found at %s (run with --save-baseline)', args.baseline)
+        return 0
+
+    with open(args.baseline) as baseline_file:
+        baseline = json.load(baseline_file)
+
+    mismatch = workload_mismatch(report['meta'], baseline['meta'])
+    if mismatch:
+        LOGGER.warning('Baseline was recorded with other workloads, results are not compared '
+                       '(baseline, current): %s. Run with --save-baseline to record one here', mismatch)
+        return 0
+
+    if report['meta']['python'] != baseline['meta'].get('python'):
+        LOGGER.warning('Baseline was recorded with Python %s, results are compared anyway',
+                       baseline['meta'].get('python'))
+
+    skipped = cpu_bound_benchmarks(report['results'], report['meta'], baseline['meta'])
+    if skipped:
+        LOGGER.warning('Baseline was recorded with %s CPUs, %s are not compared', baseline['meta'].get('cpu_count'),
+                       skipped)
+
+    results = {name: result for (name, result) in report['results'].items() if name not in skipped}
+    regressions = compare_with_baseline(results, baseline['results'], args.tolerance)
+    if regressions:
+        LOGGER.error('Regressions against baseline: %s', regressions)
+        return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level='INFO')
+    # per game logs would be measured as well
+    logging.getLogger('src').setLevel(logging.WARNING)
+    sys.exit(main())
@@ -0,0 +1,233 @@
+import argparse
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+from src.docker_client_wrapper import DockerClientWrapper
+from src.metrics import REGISTRY
+from src.models.agent_build import AgentBuild
+
+
+LOGGER = logging.getLogger(__name__)
+
+AGENT_BUILDS = REGISTRY.counter('poker_agent_builds_total', 'Agent image builds by result', ('result',))
+AGENT_BUILD_SECONDS = REGISTRY.histogram('poker_agent_build_seconds', 'Duration of agent image builds',
+                                         buckets=(1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0))
+
+BASE_IMAGE_REPOSITORY = 'poker-agent-base'
+
+# Tag of the last base image built, the default base of agent-build/Dockerfile
+BASE_IMAGE_LATEST = '{}:latest'.format(BASE_IMAGE_REPOSITORY)
+AGENT_IMAGE_REPOSITORY = 'poker-agent'
+
+# Files of agent-build making the base image: python, the agent requirements and the agent HTTP app
+BASE_IMAGE_FILES = ('Dockerfile.base', 'requirements.txt', 'app.py')
+
+
+class AgentBuildManager:
+
+    # Agent images are the submitted src/ on top of a shared base image with the dependencies baked in, tagged by
+    # the hash of their content: an upload identical to an image already built is only tagged for the player.
+    # Builds run on max_workers background threads, at most max_pending builds are queued or running
+    def __init__(self, agent_build_dir: str = './agent-build', build_root: str = './tmp/agent_builds',
+                 max_workers: int = 2, max_pending: int = 32):
+        self._agent_build_dir = agent_build_dir
+        self._build_root = build_root
+        self._max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='agent-build')
+
+        self._builds: Dict[str, AgentBuild] = {}
+        self._player_builds: Dict[str, AgentBuild] = {}
+
+        # builds waiting for the image of a content hash, one image build per content hash at a time
+        self._waiting_builds: Dict[str, List[AgentBuild]] = {}
+        self._lock = threading.Lock()
+
+        self._base_image_name = base_image_name(agent_build_dir)
+        self._base_image_lock = threading.Lock()
+
+    @property
+    def base_image_name(self):
+        return self._base_image_name
+
+    # Queue the build of the agent image of a player from its source directory (the submitted src/)
+    def submit(self, player: str, source_dir: str) -> AgentBuild:
+        content_hash = self._hash_agent(source_dir)
+        image_name = '{}:{}'.format(AGENT_IMAGE_REPOSITORY, content_hash[:16])
+        build = AgentBuild(player=player, content_hash=content_hash,
+                           build_path=os.path.join(self._build_root, content_hash), image_name=image_name)
+
+        with self._lock:
+            if self._pending_count() >= self._max_pending:
+                raise ValueError('Too many agent builds are pending ({}), retry later'.format(self._max_pending))
+
+            self._builds[build.id] = build
+            self._player_builds[player] = build
+
+            if content_hash in self._waiting_builds:
+                # the same content is being built for another submission
+                if self._waiting_builds[content_hash][0].status == AgentBuild.RUNNING:
+                    build.set_running()
+                self._waiting_builds[content_hash].append(build)
+                LOGGER.info('Agent build %s waits for the image %s', build.id, image_name)
+                return build
+
+            image = DockerClientWrapper.get_image(image_name)
+            if image:
+                self._tag_player_image(build, image, AgentBuild.CACHED)
+                return build
+
+            self._waiting_builds[content_hash] = [build]
+
+        try:
+            self._prepare_build_context(source_dir, build.build_path)
+        except OSError as ex:
+            with self._lock:
+                for waiting_build in self._waiting_builds.pop(content_hash):
+                    waiting_build.set_finished(AgentBuild.FAILED, error=str(ex))
+            raise
+
+        self._executor.submit(self._run_build, content_hash, image_name, build.build_path)
+        LOGGER.info('New agent build: %s', build)
+        return build
+
+    def get_build(self, build_id: str) -> AgentBuild:
+        return self._builds.get(build_id)
+
+    def get_builds(self) -> List[AgentBuild]:
+        return list(self._builds.values())
+
+    # Return the last build submitted for a player
+    def get_player_build(self, player: str) -> AgentBuild:
+        return self._player_builds.get(player)
+
+    def _pending_count(self) -> int:
+        return sum(len(builds) for builds in self._waiting_builds.values())
+
+    def _run_build(self, content_hash: str, image_name: str, build_path: str):
+        with self._lock:
+            for build in self._waiting_builds[content_hash]:
+                build.set_running()
+
+        start_time = time.perf_counter()
+        try:
+            base_image_name = self._ensure_base_image()
+            image = DockerClientWrapper.build_image(build_path, image_name, buildargs={'BASE_IMAGE': base_image_name})
+        except Exception as ex:  # pylint: disable=broad-except
+            LOGGER.exception('Agent image build failed: %s', image_name)
+            with self._lock:
+                for build in self._waiting_builds.pop(content_hash):
+                    build.set_finished(AgentBuild.FAILED, error=str(ex))
+                    AGENT_BUILDS.inc(labels=(AgentBuild.FAILED,))
+            return
+
+        AGENT_BUILD_SECONDS.observe(time.perf_counter() - start_time)
+
+        with self._lock:
+            for build in self._waiting_builds.pop(content_hash):
+                self._tag_player_image(build, image, AgentBuild.COMPLETED)
+
+    def _tag_player_image(self, build: AgentBuild, image, status: str):
+        try:
+            DockerClientWrapper.tag_image(image, player_image_name(build.player))
+        except Exception as ex:  # pylint: disable=broad-except
+            LOGGER.exception('Agent image tag failed: %s', build.image_name)
+            build.set_finished(AgentBuild.FAILED, error=str(ex))
+            AGENT_BUILDS.inc(labels=(AgentBuild.FAILED,))
+            return
+
+        build.set_finished(status)
+        AGENT_BUILDS.inc(labels=(status,))
+        LOGGER.info('Agent image %s is tagged %s (%s)', build.image_name, player_image_name(build.player), status)
+
+    # Build the base image once per content of its files, Docker layer caching does the rest. It is tagged latest
+    # as well, like the base image of `make build-agent-base`
+    def _ensure_base_image(self) -> str:
+        with self._base_image_lock:
+            image = DockerClientWrapper.get_image(self._base_image_name)
+            if not image:
+                LOGGER.info('Building agent base image: %s', self._base_image_name)
+                image = DockerClientWrapper.build_image(self._agent_build_dir, self._base_image_name,
+                                                        dockerfile='Dockerfile.base')
+
+            DockerClientWrapper.tag_image(image, BASE_IMAGE_LATEST)
+
+        return self._base_image_name
+
+    # Return the hash of everything making the agent image: base image, agent Dockerfile and source files
+    def _hash_agent(self, source_dir: str) -> str:
+        digest = hashlib.sha256(self._base_image_name.encode('utf-8'))
+        update_file_digest(digest, 'Dockerfile', os.path.join(self._agent_build_dir, 'Dockerfile'))
+
+        for (relative_path, path) in list_source_files(source_dir):
+            update_file_digest(digest, 'src/' + relative_path, path)
+
+        return digest.hexdigest()
+
+    # Build contexts are keyed by content hash, an existing one has the same files
+    def _prepare_build_context(self, source_dir: str, build_path: str):
+        if os.path.exists(build_path):
+            return
+
+        os.makedirs(self._build_root, exist_ok=True)
+        staging_path = tempfile.mkdtemp(dir=self._build_root)
+        shutil.copytree(source_dir, os.path.join(staging_path, 'src'),
+                        ignore=shutil.ignore_patterns('__pycache__', '*.pyc'))
+        shutil.copyfile(os.path.join(self._agent_build_dir, 'Dockerfile'), os.path.join(staging_path, 'Dockerfile'))
+
+        try:
+            os.rename(staging_path, build_path)
+        except OSError:
+            # prepared meanwhile by another submission
+            shutil.rmtree(staging_path, ignore_errors=True)
+
+
+# Return the name of the base image, tagged by the hash of the content of its files
+def base_image_name(agent_build_dir: str = './agent-build') -> str:
+    digest = hashlib.sha256()
+    for file_name in BASE_IMAGE_FILES:
+        update_file_digest(digest, file_name, os.path.join(agent_build_dir, file_name))
+    return '{}:{}'.format(BASE_IMAGE_REPOSITORY, digest.hexdigest()[:16])
+
+
+def player_image_name(player: str) -> str:
+    return '{}:{}-latest'.format(AGENT_IMAGE_REPOSITORY, player)
+
+
+# Return (path relative to source_dir, path) of the source files, in a stable order
+def list_source_files(source_dir: str) -> List[tuple]:
+    source_files = []
+    for (dir_path, dir_names, file_names) in os.walk(source_dir):
+        dir_names[:] = sorted(dir_name for dir_name in dir_names if dir_name != '__pycache__')
+        for file_name in sorted(file_names):
+            if not file_name.endswith('.pyc'):
+                path = os.path.join(dir_path, file_name)
+                source_files.append((os.path.relpath(path, source_dir).replace(os.sep, '/'), path))
+
+    return source_files
+
+
+def update_file_digest(digest, name: str, path: str):
+    with open(path, 'rb') as source_file:
+        content = source_file.read()
+
+    digest.update('{}\0{}\0'.format(name, len(content)).encode('utf-8'))
+    digest.update(content)
+
+
+def main(args: List[str] = None):
+    parser = argparse.ArgumentParser(description='Print the name of the agent base image, used by `make build-agent-base`')
+    parser.add_argument('--agent-build-dir', default='./agent-build')
+    args = parser.parse_args(args)
+
+    print(base_image_name(args.agent_build_dir))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,239 @@
+import logging
+import threading
+import time
+from typing import Dict, List
+
+import docker
+import requests
+
+from src.docker_client_wrapper import DockerClientWrapper
+from src.metrics import REGISTRY
+from src.models.agent_container import AgentContainer
+from src.poker_engine.poker_agent import set_agent_urls
+
+
+LOGGER = logging.getLogger(__name__)
+
+AGENT_CONTAINER_RESTARTS = REGISTRY.counter('poker_agent_container_restarts_total',
+                                            'Agent containers restarted after a crash or failed health check',
+                                            ('player',))
+AGENT_CONTAINER_READY_SECONDS = REGISTRY.histogram('poker_agent_container_ready_seconds',
+                                                   'Time from container start to a healthy /health',
+                                                   buckets=(0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0))
+AGENT_CONTAINERS_READY = REGISTRY.counter('poker_agent_containers_ready_total', 'Agent containers turned ready',
+                                          ('player',))
+
+AGENT_CONTAINER_URL = 'http://{}:5000'
+
+
+def agent_container_name(player: str, replica: int) -> str:
+    # the first replica keeps the name agents always had
+    return 'agent-{}'.format(player) if replica == 0 else 'agent-{}-replica{}'.format(player, replica)
+
+
+class AgentContainerPool:
+
+    # Agent containers are started ahead of simulations and only receive decisions once their /health answers.
+    # Container handles are kept, a monitor thread probes every ready container each monitor_interval seconds and
+    # restarts the ones which exited or stopped answering, as well as failed ones up to max_restarts times
+    def __init__(self, network: str, ready_timeout=30.0, probe_interval=0.2, probe_timeout=1.0,
+                 monitor_interval=5.0, max_restarts=5):
+        self._network = network
+        self._max_restarts = max_restarts
+        self._ready_timeout = ready_timeout
+        self._probe_interval = probe_interval
+        self._probe_timeout = probe_timeout
+        self._monitor_interval = monitor_interval
+
+        self._agents: Dict[str, List[AgentContainer]] = {}
+        self._lock = threading.Lock()
+        self._ready_changed = threading.Condition(self._lock)
+
+        self._session = requests.Session()
+        self._monitor = None
+        self._stop_monitor = threading.Event()
+
+    # Start (or restart with a new image) the replicas of an agent, readiness is probed in the background
+    def start_agent(self, player: str, image_name: str, replicas: int = 1) -> List[AgentContainer]:
+        self.stop_agent(player)
+
+        agent_containers = [AgentContainer(player, replica, agent_container_name(player, replica), image_name,
+                                           AGENT_CONTAINER_URL.format(agent_container_name(player, replica)))
+                            for replica in range(replicas)]
+
+        with self._lock:
+            self._agents[player] = agent_containers
+
+        for agent_container in agent_containers:
+            self._start_container(agent_container)
+
+        self._ensure_monitor()
+        return agent_containers
+
+    def stop_agent(self, player: str):
+        with self._lock:
+            agent_containers = self._agents.pop(player, [])
+        set_agent_urls(player, [])
+
+        for agent_container in agent_containers:
+            self._stop_container(agent_container)
+
+        # containers left by a previous simulator process are not known by the pool
+        if not agent_containers:
+            container = DockerClientWrapper.get_container_by_name(agent_container_name(player, 0))
+            if container:
+                container.stop()
+
+    def get_agent(self, player: str) -> List[AgentContainer]:
+        with self._lock:
+            return list(self._agents.get(player, []))
+
+    def get_agents(self) -> Dict[str, List[AgentContainer]]:
+        with self._lock:
+            return {player: list(agent_containers) for (player, agent_containers) in self._agents.items()}
+
+    def is_ready(self, player: str) -> bool:
+        with self._lock:
+            return any(agent_container.is_ready for agent_container in self._agents.get(player, []))
+
+    # Wait until every pooled agent of players has a ready replica, players not started by the pool are skipped
+    def wait_ready(self, players: List[str], timeout: float = None):
+        deadline = time.monotonic() + (self._ready_timeout if timeout is None else timeout)
+
+        with self._ready_changed:
+            while True:
+                not_ready = [player for player in players if player in self._agents and
+                             not any(agent_container.is_ready for agent_container in self._agents[player])]
+                if not not_ready:
+                    return
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise ValueError('Agents are not ready: {}'.format(not_ready))
+                self._ready_changed.wait(remaining)
+
+    def _start_container(self, agent_container: AgentContainer):
+        try:
+            old_container = DockerClientWrapper.get_container_by_name(agent_container.name)
+            if old_container:
+                old_container.stop()
+
+            container = DockerClientWrapper.run_detached_container(
+                agent_container.image_name, agent_container.name,
+                auto_remove=True, remove=True, network=self._network
+            )
+        except docker.errors.APIError as ex:
+            LOGGER.warning('Cannot start agent container: %s error=%s', agent_container.name, ex)
+            agent_container.set_failed(str(ex))
+            return
+
+        agent_container.set_starting(container)
+        threading.Thread(target=self._probe_until_ready, args=(agent_container, container), daemon=True,
+                         name='agent-probe-{}'.format(agent_container.name)).start()
+
+    def _stop_container(self, agent_container: AgentContainer):
+        container = agent_container.container
+        agent_container.set_stopped()
+        if container is None:
+            return
+
+        try:
+            container.stop()
+        except docker.errors.NotFound:
+            pass
+
+    def _probe_until_ready(self, agent_container: AgentContainer, container):
+        start_time = time.perf_counter()
+        deadline = time.monotonic() + self._ready_timeout
+
+        while time.monotonic() < deadline:
+            # the container was replaced or stopped meanwhile
+            if agent_container.container is not container:
+                return
+
+            if self._is_healthy(agent_container):
+                AGENT_CONTAINER_READY_SECONDS.observe(time.perf_counter() - start_time)
+                AGENT_CONTAINERS_READY.inc(labels=(agent_container.player,))
+                LOGGER.info('Agent container is ready: %s (%.2fs)', agent_container.name,
+                            time.perf_counter() - start_time)
+                self._set_ready(agent_container)
+                return
+
+            time.sleep(self._probe_interval)
+
+        LOGGER.warning('Agent container is not ready after %.1fs: %s', self._ready_timeout, agent_container.name)
+        agent_container.set_failed('Not ready after {}s'.format(self._ready_timeout))
+
+    def _is_healthy(self, agent_container: AgentContainer) -> bool:
+        try:
+            return self._session.get(agent_container.url + '/health', timeout=self._probe_timeout).status_code == 200
+        except (requests.ConnectionError, requests.Timeout):
+            return False
+
+    def _set_ready(self, agent_container: AgentContainer):
+        with self._ready_changed:
+            agent_container.set_ready()
+            self._publish_urls(agent_container.player)
+            self._ready_changed.notify_all()
+
+    # Decisions only go to ready replicas
+    def _publish_urls(self, player: str):
+        set_agent_urls(player, [agent_container.url for agent_container in self._agents.get(player, [])
+                                if agent_container.is_ready])
+
+    def _ensure_monitor(self):
+        with self._lock:
+            if self._monitor and self._monitor.is_alive():
+                return
+
+            self._monitor = threading.Thread(target=self._monitor_containers, daemon=True, name='agent-monitor')
+            self._monitor.start()
+
+    def _monitor_containers(self):
+        while not self._stop_monitor.wait(self._monitor_interval):
+            for agent_containers in self.get_agents().values():
+                for agent_container in agent_containers:
+                    # a docker error on one container must not stop the monitoring of the others
+                    try:
+                        self._check_container(agent_container)
+                    except docker.errors.APIError as ex:
+                        LOGGER.warning('Cannot check agent container: %s error=%s', agent_container.name, ex)
+
+    def _check_container(self, agent_container: AgentContainer):
+        if agent_container.is_ready and not self._is_alive(agent_container):
+            agent_container.set_failed('Container exited or stopped answering')
+            with self._lock:
+                self._publish_urls(agent_container.player)
+
+        if agent_container.status == AgentContainer.FAILED and agent_container.restarts < self._max_restarts:
+            self._restart_container(agent_container)
+
+    # Return True when the container is running and answers, its cached handle is refreshed instead of
+    # listing containers
+    def _is_alive(self, agent_container: AgentContainer) -> bool:
+        container = agent_container.container
+        try:
+            container.reload()
+        except docker.errors.NotFound:
+            return False
+
+        return container.status == 'running' and self._is_healthy(agent_container)
+
+    def _restart_container(self, agent_container: AgentContainer):
+        with self._lock:
+            if agent_container not in self._agents.get(agent_container.player, []):
+                return
+            agent_container.set_failed('Restarting')
+            # the attempt counts even when docker cannot run the container, so that max_restarts bounds retries
+            agent_container.add_restart()
+            self._publish_urls(agent_container.player)
+
+        LOGGER.warning('Agent container is down, restarting: %s (restart %d)', agent_container.name,
+                       agent_container.restarts)
+        AGENT_CONTAINER_RESTARTS.inc(labels=(agent_container.player,))
+        self._start_container(agent_container)
+
+    def close(self):
+        self._stop_monitor.set()
+        for player in list(self._agents):
+            self.stop_agent(player)
@@ -34,6 +34,18 @@ class DockerClientWrapper:
         LOGGER.info('Build logs: %s', ['\n' + line for line in build_logs])
         return build_image
 
+    @classmethod
+    def get_image(cls, image_name: str) -> Image:
+        try:
+            return cls.docker_client.images.get(image_name)
+        except docker.errors.ImageNotFound:
+            return None
+
+    @classmethod
+    def tag_image(cls, image: Image, image_name: str) -> bool:
+        repository, tag = image_name.rsplit(':', 1)
+        return image.tag(repository, tag)
+
     @classmethod
     def is_container_running(cls, container_name: str) -> bool:
         containers = cls.docker_client.containers.list()
@@ -0,0 +1,211 @@
+import os
+import threading
+from bisect import bisect_left
+from typing import Callable, Dict, List, Sequence, Tuple
+
+# Set METRICS_ENABLED=false to turn every counter and histogram into a no-op
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() != 'false'
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# (name, type, help, [(labels, value)]) as returned by collectors, e.g. for values owned by other modules
+MetricFamily = Tuple[str, str, str, List[Tuple[Dict[str, str], float]]]
+
+
+class Counter:
+
+    TYPE = 'counter'
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()):
+        self._name = name
+        self._documentation = documentation
+        self._label_names = tuple(label_names)
+        self._values: Dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def name(self):
+        return self._name
+
+    # label values are given in the order of label_names
+    def inc(self, amount: float = 1, labels: tuple = ()):
+        if not METRICS_ENABLED:
+            return
+
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, labels: tuple = ()) -> float:
+        return self._values.get(labels, 0)
+
+    def render(self) -> List[str]:
+        lines = ['# HELP {} {}'.format(self._name, self._documentation), '# TYPE {} {}'.format(self._name, self.TYPE)]
+        # rendered from a copy: scrapes run while other threads add label sets
+        for (labels, value) in sorted(self.snapshot().items()):
+            lines.append('{}{} {}'.format(self._name, format_labels(self._label_names, labels), format_value(value)))
+        return lines
+
+    def snapshot(self) -> Dict[tuple, float]:
+        with self._lock:
+            return dict(self._values)
+
+    def merge(self, snapshot: Dict[tuple, float]):
+        with self._lock:
+            for (labels, value) in snapshot.items():
+                self._values[labels] = self._values.get(labels, 0) + value
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+
+class Histogram:
+
+    TYPE = 'histogram'
+
+    def __init__(self, name: str, documentation: str, buckets: Sequence[float] = LATENCY_BUCKETS,
+                 label_names: Sequence[str] = ()):
+        self._name = name
+        self._documentation = documentation
+        self._buckets = tuple(buckets)
+        self._label_names = tuple(label_names)
+        # labels -> [count per bucket (+Inf last), sum, count], bucket counts are made cumulative when rendered
+        self._values: Dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def name(self):
+        return self._name
+
+    def observe(self, value: float, labels: tuple = ()):
+        if not METRICS_ENABLED:
+            return
+
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                state = self._values[labels] = [[0] * (len(self._buckets) + 1), 0.0, 0]
+
+            state[0][bisect_left(self._buckets, value)] += 1
+            state[1] += value
+            state[2] += 1
+
+    def count(self, labels: tuple = ()) -> int:
+        state = self._values.get(labels)
+        return state[2] if state else 0
+
+    def total(self, labels: tuple = ()) -> float:
+        state = self._values.get(labels)
+        return state[1] if state else 0.0
+
+    def render(self) -> List[str]:
+        lines = ['# HELP {} {}'.format(self._name, self._documentation), '# TYPE {} {}'.format(self._name, self.TYPE)]
+        label_names = self._label_names + ('le',)
+
+        # rendered from a copy: scrapes run while other threads add label sets and observe values
+        for (labels, (bucket_counts, total, count)) in sorted(self.snapshot().items()):
+            cumulative_count = 0
+            for (bucket, bucket_count) in zip(self._buckets + (float('inf'),), bucket_counts):
+                cumulative_count += bucket_count
+                lines.append('{}_bucket{} {}'.format(self._name, format_labels(label_names, labels + (bucket,)),
+                                                     cumulative_count))
+
+            lines.append('{}_sum{} {}'.format(self._name, format_labels(self._label_names, labels),
+                                              format_value(total)))
+            lines.append('{}_count{} {}'.format(self._name, format_labels(self._label_names, labels), count))
+
+        return lines
+
+    def snapshot(self) -> Dict[tuple, list]:
+        with self._lock:
+            return {labels: [list(state[0]), state[1], state[2]] for (labels, state) in self._values.items()}
+
+    def merge(self, snapshot: Dict[tuple, list]):
+        with self._lock:
+            for (labels, (bucket_counts, total, count)) in snapshot.items():
+                state = self._values.get(labels)
+                if state is None:
+                    state = self._values[labels] = [[0] * (len(self._buckets) + 1), 0.0, 0]
+
+                state[0] = [a + b for (a, b) in zip(state[0], bucket_counts)]
+                state[1] += total
+                state[2] += count
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+
+class MetricsRegistry:
+
+    def __init__(self):
+        self._metrics = {}
+        self._collectors: List[Callable[[], List[MetricFamily]]] = []
+
+    def counter(self, name: str, documentation: str, label_names: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, label_names))
+
+    def histogram(self, name: str, documentation: str, buckets: Sequence[float] = LATENCY_BUCKETS,
+                  label_names: Sequence[str] = ()) -> Histogram:
+        return self._register(Histogram(name, documentation, buckets, label_names))
+
+    def _register(self, metric):
+        # a module imported twice gets the metric registered the first time
+        return self._metrics.setdefault(metric.name, metric)
+
+    def add_collector(self, collector: Callable[[], List[MetricFamily]]):
+        self._collectors.append(collector)
+
+    # Return all metrics in the Prometheus text exposition format
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+
+        for collector in self._collectors:
+            for (name, metric_type, documentation, samples) in collector():
+                lines.append('# HELP {} {}'.format(name, documentation))
+                lines.append('# TYPE {} {}'.format(name, metric_type))
+                for (labels, value) in samples:
+                    lines.append('{}{} {}'.format(name, format_labels(tuple(labels), tuple(labels.values())),
+                                                  format_value(value)))
+
+        return '\n'.join(lines) + '\n'
+
+    # Snapshots are picklable, so metrics collected in worker processes can be merged in the parent
+    def snapshot(self) -> Dict[str, dict]:
+        return {name: metric.snapshot() for (name, metric) in self._metrics.items()}
+
+    def merge(self, snapshot: Dict[str, dict]):
+        for (name, metric_snapshot) in snapshot.items():
+            if name in self._metrics:
+                self._metrics[name].merge(metric_snapshot)
+
+    def reset(self):
+        for metric in self._metrics.values():
+            metric.reset()
+
+
+def format_labels(label_names: Sequence[str], labels: tuple) -> str:
+    if not label_names:
+        return ''
+
+    return '{' + ','.join('{}="{}"'.format(name, escape_label_value(value))
+                          for (name, value) in zip(label_names, labels)) + '}'
+
+
+def escape_label_value(value) -> str:
+    if isinstance(value, float):
+        return format_value(value)
+
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+REGISTRY = MetricsRegistry()
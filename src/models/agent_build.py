@@ -0,0 +1,95 @@
+import threading
+import time
+import uuid
+
+
+class AgentBuild:
+
+    PENDING = 'pending'
+    RUNNING = 'running'
+    COMPLETED = 'completed'
+    CACHED = 'cached'
+    FAILED = 'failed'
+
+    def __init__(self, player: str, content_hash: str, build_path: str, image_name: str):
+        self._id = uuid.uuid4().hex
+        self._player = player
+        self._content_hash = content_hash
+        self._build_path = build_path
+        self._image_name = image_name
+
+        self._status = self.PENDING
+        self._error = None
+        self._submitted_at = time.time()
+        self._started_at = None
+        self._finished_at = None
+
+        self._finished = threading.Event()
+
+    @property
+    def id(self):
+        return self._id
+
+    @property
+    def player(self):
+        return self._player
+
+    @property
+    def content_hash(self):
+        return self._content_hash
+
+    @property
+    def build_path(self):
+        return self._build_path
+
+    @property
+    def image_name(self):
+        return self._image_name
+
+    @property
+    def status(self):
+        return self._status
+
+    @property
+    def error(self):
+        return self._error
+
+    @property
+    def is_finished(self):
+        return self._status in (self.COMPLETED, self.CACHED, self.FAILED)
+
+    def set_running(self):
+        self._status = self.RUNNING
+        self._started_at = time.time()
+
+    def set_finished(self, status: str, error: str = None):
+        self._status = status
+        self._error = error
+        self._finished_at = time.time()
+        self._finished.set()
+
+    # Return True when the build finished within timeout seconds
+    def wait(self, timeout: float = None) -> bool:
+        return self._finished.wait(timeout)
+
+    def to_dict(self):
+        return {
+            'id': self._id,
+            'player': self._player,
+            'status': self._status,
+            'content_hash': self._content_hash,
+            'image': self._image_name,
+            'queued_sec': (self._started_at or self._finished_at or time.time()) - self._submitted_at,
+            'build_sec': (self._finished_at or time.time()) - self._started_at if self._started_at else None,
+            'error': self._error
+        }
+
+    def __str__(self):
+        return """
+        AgentBuild [
+            id={id},
+            player={player},
+            status={status},
+            content_hash={content_hash}
+        ]
+        """.format(id=self._id, player=self._player, status=self._status, content_hash=self._content_hash)
@@ -0,0 +1,108 @@
+import time
+
+from docker.models.containers import Container
+
+
+class AgentContainer:
+
+    STARTING = 'starting'
+    READY = 'ready'
+    FAILED = 'failed'
+    STOPPED = 'stopped'
+
+    def __init__(self, player: str, replica: int, name: str, image_name: str, url: str):
+        self._player = player
+        self._replica = replica
+        self._name = name
+        self._image_name = image_name
+        self._url = url
+
+        self._container: Container = None
+        self._status = self.STARTING
+        self._error = None
+        self._restarts = 0
+        self._started_at = None
+        self._ready_at = None
+
+    @property
+    def player(self):
+        return self._player
+
+    @property
+    def replica(self):
+        return self._replica
+
+    @property
+    def name(self):
+        return self._name
+
+    @property
+    def image_name(self):
+        return self._image_name
+
+    @property
+    def url(self):
+        return self._url
+
+    @property
+    def container(self):
+        return self._container
+
+    @property
+    def status(self):
+        return self._status
+
+    @property
+    def restarts(self):
+        return self._restarts
+
+    @property
+    def is_ready(self):
+        return self._status == self.READY
+
+    def set_starting(self, container: Container):
+        self._container = container
+        self._status = self.STARTING
+        self._error = None
+        self._started_at = time.time()
+        self._ready_at = None
+
+    def add_restart(self):
+        self._restarts += 1
+
+    def set_ready(self):
+        self._status = self.READY
+        self._ready_at = time.time()
+
+    def set_failed(self, error: str):
+        self._status = self.FAILED
+        self._error = error
+
+    def set_stopped(self):
+        self._container = None
+        self._status = self.STOPPED
+
+    def to_dict(self):
+        return {
+            'player': self._player,
+            'replica': self._replica,
+            'name': self._name,
+            'image': self._image_name,
+            'url': self._url,
+            'status': self._status,
+            'restarts': self._restarts,
+            'ready_sec': self._ready_at - self._started_at if self._ready_at and self._started_at else None,
+            'error': self._error
+        }
+
+    def __str__(self):
+        return """
+        AgentContainer [
+            name={name},
+            player={player},
+            replica={replica},
+            status={status},
+            restarts={restarts}
+        ]
+        """.format(name=self._name, player=self._player, replica=self._replica, status=self._status,
+                   restarts=self._restarts)
@@ -1,17 +1,22 @@
 import logging
 from typing import List, Tuple, Dict
-from poker import Card
 
+from src.metrics import REGISTRY
 from src.models.game_round import GameRound
-from src.poker_engine.poker_hand_check import detect_hand, compare_hands
+from src.poker_engine.poker_hand_eval import evaluate_cards, ints_to_cards
+from src.poker_engine.poker_pot import build_side_pots, split_pots
 
 
 LOGGER = logging.getLogger(__name__)
 
+HANDS_EVALUATED = REGISTRY.counter('poker_hands_evaluated_total', 'Hands evaluated at showdowns')
+
+BOARD_STATES = ['pre-flop', 'post-flop', 'turn', 'river']
+
 
 class BettingState:
 
-    def __init__(self, pos: int, board_state: str, board_cards: List[Card], game_round: GameRound,
+    def __init__(self, pos: int, board_state: str, board_cards: List[int], game_round: GameRound,
                  players: List[str], player_actions: Dict[str, List[Tuple[str, int]]] = None,
                  previous_state: 'BettingState' = None):
 
@@ -20,9 +25,26 @@ class BettingState:
         self._board_cards = board_cards
         self._game_round = game_round
         self._players = players
-        self._player_actions = player_actions or {}
+        self._player_actions = {}
+        self._action_history: List[Tuple[str, Tuple[str, int]]] = []
         self._previous_state = previous_state
 
+        # running accounting, maintained by add_player_action
+        self._player_chips: Dict[str, int] = {}
+        self._folded_players = set()
+        self._max_bet = 0               # most chips committed by a player who has not folded
+        self._max_bet_players = 0       # number of players (not folded) who committed max_bet
+        self._pot = 0
+        self._previous_total_pot = previous_state.get_round_total_pot() if previous_state else 0
+        self._remaining_players = None
+
+        # players who have put all their chips in stay in the round without acting anymore
+        self._all_in_players = set(previous_state.all_in_players) if previous_state else set()
+
+        for (player, actions) in (player_actions or {}).items():
+            for player_action in actions:
+                self.add_player_action(player, player_action)
+
     @property
     def board_state(self):
         return self._board_state
@@ -39,10 +61,21 @@ class BettingState:
     def player_actions(self):
         return self._player_actions
 
+    # (player, action) in the order the actions were taken
+    @property
+    def action_history(self):
+        return self._action_history
+
+    @property
+    def all_in_players(self):
+        return self._all_in_players
+
     @property
     def remaining_players(self):
-        filtered_players = [player for (player, actions) in self._player_actions.items() if actions[-1][0] != 'fold']
-        return self._game_round.get_orderd_players(filtered_players)
+        if self._remaining_players is None:
+            filtered_players = [player for player in self._players if player not in self._folded_players]
+            self._remaining_players = self._game_round.get_orderd_players(filtered_players)
+        return self._remaining_players
 
     def is_pre_flop_state(self):
         return bool(self._board_state == 'pre-flop')
@@ -57,89 +90,155 @@ class BettingState:
         return bool(self._board_state == 'river')
 
     def is_betting_state_complete(self):
+        # everybody else folded, the last player has nobody to bet against
+        if len(self._folded_players) == len(self._players) - 1:
+            return True
+
+        if self._all_in_players:
+            return self._is_betting_complete_with_all_in()
+
         all_players_called_action = len(self._players) == len(self._player_actions)
         if all_players_called_action:
 
-            player_betting_chips = [sum([x[1] for x in actions])
-                                    for actions in self._player_actions.values() if actions[-1][0] != 'fold']
-
-            is_chips_the_same = len(set(player_betting_chips)) == 1
+            not_folded_players = len(self._player_actions) - len(self._folded_players)
+            is_chips_the_same = not_folded_players > 0 and self._max_bet_players == not_folded_players
 
             return is_chips_the_same
 
         return False
 
-    def is_round_complete(self):
-        all_players_called_action = len(self._players) == len(self._player_actions)
-        if all_players_called_action:
+    def _is_betting_complete_with_all_in(self):
+        # players who can still act must all have acted and matched the biggest bet,
+        # a single one left only has to match the all-in bets
+        active_players = [player for player in self._players
+                          if player not in self._folded_players and player not in self._all_in_players]
+
+        if len(active_players) <= 1:
+            return all(self._player_chips.get(player, 0) == self._max_bet for player in active_players)
 
-            number_of_players_folded = len([player for (player, actions) in
-                                            self._player_actions.items() if actions[-1][0] == 'fold'])
+        return all(player in self._player_actions and self._player_chips[player] == self._max_bet
+                   for player in active_players)
 
-            is_other_players_folded = number_of_players_folded == (len(self._players) - 1)
+    def is_round_complete(self):
+        if self.is_betting_state_complete():
 
-            return is_other_players_folded or (self.is_betting_state_complete() and self.is_river_state())
+            is_other_players_folded = len(self._folded_players) == (len(self._players) - 1)
+
+            return is_other_players_folded or self.is_river_state()
 
         return False
 
-    def add_player_action(self, player: str, player_action: Tuple[str, int]):
+    def add_player_action(self, player: str, player_action: Tuple[str, int], is_all_in=False):
+        has_acted = player in self._player_actions
         self._player_actions.setdefault(player, []).append(player_action)
+        self._action_history.append((player, player_action))
+        self._remaining_players = None
+
+        if is_all_in:
+            self._all_in_players.add(player)
+
+        action, chip = player_action
+        previous_chips = self._player_chips.get(player, 0)
+        chips = previous_chips + chip
+
+        self._player_chips[player] = chips
+        self._pot += chip
+
+        was_at_max_bet = has_acted and previous_chips == self._max_bet and player not in self._folded_players
+
+        if action == 'fold':
+            self._folded_players.add(player)
+            if was_at_max_bet:
+                self._max_bet_players -= 1
+                if self._max_bet_players == 0:
+                    self._reset_max_bet()
+        elif chips > self._max_bet:
+            self._max_bet = chips
+            self._max_bet_players = 1
+        elif chips == self._max_bet and not was_at_max_bet:
+            self._max_bet_players += 1
+
+    def _reset_max_bet(self):
+        # only needed when the last player holding the biggest bet folds
+        not_folded_chips = [chips for (player, chips) in self._player_chips.items() if player not in self._folded_players]
+        self._max_bet = max(not_folded_chips) if not_folded_chips else 0
+        self._max_bet_players = not_folded_chips.count(self._max_bet)
 
     def get_valid_actions(self, player: str, player_pot: int, small_blind_stake: int) -> List[Tuple[str, int, int]]:
         # valid actions: check, call, raise, fold
         # no_action (if player has already folded) -> for this we return an empty list
         valid_actions = []
 
-        # do nothing if player has already folded
-        previous_player_action = self._player_actions[player][-1] if player in self._player_actions else None
-        if (previous_player_action and previous_player_action[0] == 'fold'):
+        # do nothing if player has already folded (in this or an earlier betting state) or is all-in
+        if player not in self._players or player in self._folded_players or player in self._all_in_players \
+                or player_pot <= 0:
             return valid_actions
 
         valid_actions.append(('fold', 0, 0))
 
-        biggest_betting_chip = max([sum([x[1] for x in actions]) for (pl, actions) in self._player_actions.items()
-                                    if actions[-1][0] != 'fold' and pl != player]) \
-                               if len(self._player_actions) > 0 else 0
+        # the player's own bet can be counted as well: when it is the biggest one, the player can check or raise
+        biggest_betting_chip = self._max_bet
 
         if biggest_betting_chip == 0:
             valid_actions.append(('check', 0, 0))
-            valid_actions.append(('raise', small_blind_stake, player_pot))
+            valid_actions.append(('raise', min(small_blind_stake, player_pot), player_pot))
         else:
-            current_betting_chip = sum([action[1] for action in self._player_actions[player]]) \
-                                   if player in self._player_actions else 0
+            current_betting_chip = self._player_chips.get(player, 0)
             if current_betting_chip < biggest_betting_chip:
-                valid_actions.append(
-                    ('call', biggest_betting_chip - current_betting_chip, biggest_betting_chip - current_betting_chip))
-                valid_actions.append(
-                    ('raise', biggest_betting_chip - current_betting_chip + small_blind_stake, player_pot))
+                # a player who cannot cover the bet can only call all-in
+                call_chip = min(biggest_betting_chip - current_betting_chip, player_pot)
+                valid_actions.append(('call', call_chip, call_chip))
+                if player_pot > call_chip:
+                    valid_actions.append(
+                        ('raise', min(call_chip + small_blind_stake, player_pot), player_pot))
             else:
                 valid_actions.append(('check', 0, 0))
-                valid_actions.append(('raise', small_blind_stake, player_pot))
+                valid_actions.append(('raise', min(small_blind_stake, player_pot), player_pot))
 
         return valid_actions
 
+    # Return the player winning the biggest share of the pot
     def get_round_winner(self):
-        if not self.is_river_state():
-            return [player for (player, actions) in self._player_actions.items() if actions[-1][0] != 'fold'][0]
+        payouts = self.get_round_payouts()
+        return max(self.remaining_players, key=lambda player: payouts.get(player, 0))
+
+    # Return chips won by every player at the end of the round: every contender is evaluated once,
+    # main and side pots are then split between the best hands eligible for them
+    def get_round_payouts(self) -> Dict[str, int]:
+        remaining_players = self.remaining_players
+
+        if len(remaining_players) == 1:
+            return {remaining_players[0]: self.get_round_total_pot()}
+
+        player_hand_strengths = {
+            player: evaluate_cards(player_hand + tuple(self._board_cards))
+            for (player, player_hand) in zip(remaining_players,
+                                             self._game_round.get_ordered_player_hands(remaining_players))
+        }
+
+        HANDS_EVALUATED.inc(len(player_hand_strengths))
+        LOGGER.debug('Player hand strengths: %s', player_hand_strengths)
 
-        player_hand_checks = [detect_hand(player_hand, self._board_cards)
-                              for player_hand in self._game_round.get_ordered_player_hands(self.remaining_players)]
+        pots = build_side_pots(self.get_round_player_chips(), remaining_players)
 
-        LOGGER.debug('Player hand checks: %s', player_hand_checks)
+        LOGGER.debug('Pots: %s', pots)
 
-        best_hand = compare_hands(player_hand_checks)
+        return split_pots(pots, player_hand_strengths)
 
-        # detect if it is a tied round
-        # TODO: do something here
+    # Return chips committed by every player over all betting states of the round
+    def get_round_player_chips(self) -> Dict[str, int]:
+        round_player_chips: Dict[str, int] = {}
 
-        winner = self.remaining_players[player_hand_checks.index((best_hand))]
+        betting_state = self
+        while betting_state:
+            for (player, chips) in betting_state._player_chips.items():  # pylint: disable=protected-access
+                round_player_chips[player] = round_player_chips.get(player, 0) + chips
+            betting_state = betting_state._previous_state  # pylint: disable=protected-access
 
-        return winner
+        return round_player_chips
 
     def get_round_total_pot(self):
-        previous_state_total_pot = self._previous_state.get_round_total_pot() if self._previous_state else 0
-        return previous_state_total_pot + sum([betting_chip for actions in
-                                               self._player_actions.values() for (action, betting_chip) in actions])
+        return self._previous_total_pot + self._pot
 
     def __str__(self):
         return """
@@ -150,5 +249,5 @@ class BettingState:
             players={players},
             player_actions={player_actions}
         ]
-        """.format(pos=self._pos, board_state=self._board_state, board_cards=self._board_cards,
+        """.format(pos=self._pos, board_state=self._board_state, board_cards=ints_to_cards(self._board_cards),
                    players=self._players, player_actions=self._player_actions)
@@ -0,0 +1,40 @@
+from typing import List
+
+from src.models.job import Job
+
+
+class DuplicateJob(Job):
+
+    TYPE = 'duplicate'
+
+    def __init__(self, players: List[str], init_pot: int, small_blind_stake: int, max_deals: int, max_rounds: int,
+                 use_local: bool, seed: int = None, workers: int = 1):
+        super().__init__(players=players, use_local=use_local, seed=seed, workers=workers)
+        self._init_pot = init_pot
+        self._small_blind_stake = small_blind_stake
+        self._max_deals = max_deals
+        self._max_rounds = max_rounds
+
+    @property
+    def init_pot(self):
+        return self._init_pot
+
+    @property
+    def small_blind_stake(self):
+        return self._small_blind_stake
+
+    @property
+    def max_deals(self):
+        return self._max_deals
+
+    @property
+    def max_rounds(self):
+        return self._max_rounds
+
+    def params_dict(self) -> dict:
+        return {
+            'players': self._players,
+            'init_pot': self._init_pot,
+            'small_blind_stake': self._small_blind_stake,
+            'max_deals': self._max_deals
+        }
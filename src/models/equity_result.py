@@ -0,0 +1,44 @@
+
+
+class EquityResult:
+
+    def __init__(self, equity: float, win: float, tie: float, samples: int, ci_width: float):
+        self._equity = equity
+        self._win = win
+        self._tie = tie
+        self._samples = samples
+        self._ci_width = ci_width
+
+    @property
+    def equity(self):
+        return self._equity
+
+    @property
+    def win(self):
+        return self._win
+
+    @property
+    def tie(self):
+        return self._tie
+
+    @property
+    def samples(self):
+        return self._samples
+
+    @property
+    def ci_width(self):
+        return self._ci_width
+
+    def __str__(self):
+        return """
+        EquityResult [
+            equity={equity},
+            win={win},
+            tie={tie},
+            samples={samples},
+            ci_width={ci_width}
+        ]
+        """.format(
+            equity=self._equity, win=self._win, tie=self._tie,
+            samples=self._samples, ci_width=self._ci_width
+        )
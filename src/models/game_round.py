@@ -1,20 +1,29 @@
-from typing import List
-from poker import Combo
+from typing import List, Tuple
+
+from src.poker_engine.poker_hand_eval import ints_to_combo
 
 
 class GameRound:
 
+    __slots__ = ('_pos', '_small_blind', '_big_blind', '_players', '_seats', '_player_pots', '_player_hands',
+                 '_small_blind_stake')
+
     def __init__(self, pos: int, small_blind: str, big_blind: str,
-                 players: List[str], player_pots: List[int], player_hands: List[Combo], small_blind_stake: int):
+                 players: List[str], player_pots: List[int], player_hands: List[Tuple[int, int]], small_blind_stake: int):
 
         self._pos = pos
         self._small_blind = small_blind
         self._big_blind = big_blind
         self._players = players
+        self._seats = {player: seat for (seat, player) in enumerate(players)}
         self._player_pots = player_pots
         self._player_hands = player_hands
         self._small_blind_stake = small_blind_stake
 
+    @property
+    def pos(self):
+        return self._pos
+
     @property
     def small_blind(self):
         return self._small_blind
@@ -35,18 +44,25 @@ class GameRound:
     def player_hands(self):
         return self._player_hands
 
+    @property
+    def player_combos(self):
+        return [ints_to_combo(first, second) for (first, second) in self._player_hands]
+
     @property
     def small_blind_stake(self):
         return self._small_blind_stake
 
+    def get_seat(self, player: str) -> int:
+        return self._seats[player]
+
     def get_first_moving_player_index(self):
-        return self._players.index(self._small_blind)
+        return self._seats[self._small_blind]
 
     def get_orderd_players(self, filtered_players: List[str]):
-        return [player for player in self._players if player in filtered_players]
+        return [self._players[seat] for seat in sorted(self._seats[player] for player in filtered_players)]
 
     def get_ordered_player_hands(self, filtered_players: List[str]):
-        return [self._player_hands[i] for i, player in enumerate(self._players) if player in filtered_players]
+        return [self._player_hands[seat] for seat in sorted(self._seats[player] for player in filtered_players)]
 
     def __str__(self):
         return """
@@ -61,6 +77,6 @@ class GameRound:
         ]
         """.format(
             pos=self._pos, small_blind=self._small_blind, big_blind=self._big_blind,
-            players=self._players, player_pots=self._player_pots, player_hands=self._player_hands,
+            players=self._players, player_pots=self._player_pots, player_hands=self.player_combos,
             small_blind_stake=self._small_blind_stake)
         
\ No newline at end of file
@@ -1,43 +1,77 @@
+from array import array
+from bisect import insort
 from typing import List, Tuple
-from poker import Combo
+
+from src.poker_engine.poker_deck import Deck
 
 
 class GameState:
 
+    __slots__ = ('_players', '_seats', '_player_pots', '_active_seats', '_remaining_players')
+
     def __init__(self, players: List[str], player_pots: List[int]):
-        self.players = players
-        self.player_pots = player_pots
+        self._players = list(players)
+        self._seats = {player: seat for (seat, player) in enumerate(self._players)}
+        self._player_pots = array('q', player_pots)
+
+        # seats of players with chips left, kept in seat order
+        self._active_seats = [seat for (seat, pot) in enumerate(self._player_pots) if pot > 0]
+        self._remaining_players = None
+
+    @property
+    def players(self):
+        return self._players
+
+    @property
+    def player_pots(self):
+        return self._player_pots
+
+    def get_seat(self, player: str) -> int:
+        return self._seats[player]
 
     def get_small_blind_player(self, round_pos: int):
-        return self.remaining_players[round_pos % len(self.remaining_players)]
+        return self._players[self._active_seats[round_pos % len(self._active_seats)]]
 
     def get_big_blind_player(self, round_pos: int):
-        small_blind_player_index = round_pos % len(self.remaining_players)
-        big_blind_player_index = small_blind_player_index + 1
+        big_blind_player_index = (round_pos % len(self._active_seats)) + 1
 
-        return self.remaining_players[big_blind_player_index
-                                      if big_blind_player_index < len(self.remaining_players) else 0]
+        return self._players[self._active_seats[big_blind_player_index
+                                                if big_blind_player_index < len(self._active_seats) else 0]]
 
     @property
     def remaining_players(self):
-        return [x for (x, y) in self.current_player_states if y > 0]
+        # rebuilt only when a player runs out of chips or gets chips back
+        if self._remaining_players is None:
+            self._remaining_players = [self._players[seat] for seat in self._active_seats]
+        return self._remaining_players
 
     @property
     def remaining_player_pots(self):
-        return [y for (x, y) in self.current_player_states if y > 0]
+        return [self._player_pots[seat] for seat in self._active_seats]
 
     @property
     def current_player_states(self) -> List[Tuple[str, int]]:
-        return list(zip(self.players, self.player_pots))
+        return list(zip(self._players, self._player_pots))
 
-    def generate_player_hands(self, deck: List[Combo]):
-        return [Combo.from_cards(deck.pop(), deck.pop()) for _ in range(len(self.remaining_players))]
+    def generate_player_hands(self, deck: Deck) -> List[Tuple[int, int]]:
+        return [deck.deal_hand() for _ in range(len(self._active_seats))]
 
     def update_player_pot(self, player: str, chip_amount: int):
-        self.player_pots[self.players.index(player)] = self.player_pots[self.players.index(player)] + chip_amount
+        seat = self._seats[player]
+        was_active = self._player_pots[seat] > 0
+
+        self._player_pots[seat] += chip_amount
+
+        is_active = self._player_pots[seat] > 0
+        if was_active and not is_active:
+            self._active_seats.remove(seat)
+            self._remaining_players = None
+        elif is_active and not was_active:
+            insort(self._active_seats, seat)
+            self._remaining_players = None
 
     def get_player_pot(self, player: str):
-        return self.player_pots[self.players.index(player)]
+        return self._player_pots[self._seats[player]]
 
     def get_player_with_most_chips(self):
         return sorted([(x, y) for (x, y) in self.current_player_states if y > 0], key=lambda x: x[1])[-1][0]
@@ -47,4 +81,4 @@ class GameState:
         GameState[
             players={players}
         ]
-        """.format(players=list(zip(self.players, self.player_pots)))
+        """.format(players=self.current_player_states)
@@ -0,0 +1,118 @@
+import threading
+import time
+import uuid
+from typing import List
+
+
+# Lifecycle shared by the jobs of SimulationJobManager: pending, running, then completed, cancelled or failed.
+# Job types add their own parameters (params_dict) and set their result when they finish
+class Job:
+
+    TYPE = 'job'
+
+    PENDING = 'pending'
+    RUNNING = 'running'
+    COMPLETED = 'completed'
+    CANCELLED = 'cancelled'
+    FAILED = 'failed'
+
+    def __init__(self, players: List[str], use_local: bool, seed: int = None, workers: int = 1):
+        self._id = uuid.uuid4().hex
+        self._players = players
+        self._use_local = use_local
+        self._seed = seed
+        self._workers = workers
+
+        self._status = self.PENDING
+        self._progress = {}
+        self._result = None
+        self._error = None
+        self._started_at = None
+        self._finished_at = None
+
+        self._cancel_requested = threading.Event()
+
+    @property
+    def id(self):
+        return self._id
+
+    @property
+    def players(self):
+        return self._players
+
+    @property
+    def use_local(self):
+        return self._use_local
+
+    @property
+    def seed(self):
+        return self._seed
+
+    @property
+    def workers(self):
+        return self._workers
+
+    @property
+    def status(self):
+        return self._status
+
+    @property
+    def result(self):
+        return self._result
+
+    @property
+    def finished_at(self):
+        return self._finished_at
+
+    @property
+    def is_finished(self):
+        return self._status in (self.COMPLETED, self.CANCELLED, self.FAILED)
+
+    @property
+    def is_cancel_requested(self):
+        return self._cancel_requested.is_set()
+
+    def request_cancel(self):
+        self._cancel_requested.set()
+
+    def set_running(self):
+        self._status = self.RUNNING
+        self._started_at = time.time()
+
+    def set_progress(self, progress: dict):
+        self._progress = progress
+
+    def set_finished(self, status: str, result=None, error: str = None):
+        self._status = status
+        self._result = result
+        self._error = error
+        self._finished_at = time.time()
+
+    def elapsed_sec(self) -> float:
+        return (self._finished_at or time.time()) - self._started_at if self._started_at else 0.0
+
+    # Return the parameters of the job type, reported by to_dict
+    def params_dict(self) -> dict:
+        return {'players': self._players}
+
+    def to_dict(self):
+        return {
+            'id': self._id,
+            'type': self.TYPE,
+            'status': self._status,
+            **self.params_dict(),
+            'seed': self._seed,
+            'progress': self._progress,
+            'elapsed_sec': self.elapsed_sec(),
+            'result': self._result,
+            'error': self._error
+        }
+
+    def __str__(self):
+        return """
+        {name} [
+            id={id},
+            status={status},
+            params={params}
+        ]
+        """.format(name=type(self).__name__, id=self._id, status=self._status, params=self.params_dict())
@@ -0,0 +1,56 @@
+from typing import List
+
+from src.models.job import Job
+
+
+class LeagueJob(Job):
+
+    TYPE = 'league'
+
+    def __init__(self, players: List[str], table_sizes: List[int], n_way_rounds: int, init_pot: int,
+                 small_blind_stake: int, min_games: int, max_games: int, use_local: bool, seed: int = None,
+                 workers: int = 1):
+        super().__init__(players=players, use_local=use_local, seed=seed, workers=workers)
+        self._table_sizes = table_sizes
+        self._n_way_rounds = n_way_rounds
+        self._init_pot = init_pot
+        self._small_blind_stake = small_blind_stake
+        self._min_games = min_games
+        self._max_games = max_games
+
+    @property
+    def table_sizes(self):
+        return self._table_sizes
+
+    @property
+    def n_way_rounds(self):
+        return self._n_way_rounds
+
+    @property
+    def init_pot(self):
+        return self._init_pot
+
+    @property
+    def small_blind_stake(self):
+        return self._small_blind_stake
+
+    @property
+    def min_games(self):
+        return self._min_games
+
+    @property
+    def max_games(self):
+        return self._max_games
+
+    # progress has the partial leaderboard, then the final one
+    def set_finished(self, status: str, result: dict = None, error: str = None):
+        super().set_finished(status, result=result, error=error)
+        self._progress = {key: value for (key, value) in result.items() if key != 'matchups'} if result else {}
+
+    def params_dict(self) -> dict:
+        return {
+            'players': self._players,
+            'table_sizes': self._table_sizes,
+            'min_games': self._min_games,
+            'max_games': self._max_games
+        }
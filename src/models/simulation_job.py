@@ -0,0 +1,94 @@
+import os
+import threading
+from typing import Dict, List
+
+from src.models.job import Job
+
+
+class SimulationJob(Job):
+
+    TYPE = 'simulation'
+
+    # games run on worker processes, concurrently on an event loop, or side by side with batched agent calls
+    PROCESS_RUNNER = 'process'
+    ASYNC_RUNNER = 'async'
+    BATCHED_RUNNER = 'batched'
+    RUNNERS = (PROCESS_RUNNER, ASYNC_RUNNER, BATCHED_RUNNER)
+
+    def __init__(self, players: List[str], init_pot: int, small_blind_stake: int, max_iterations: int,
+                 use_local: bool, seed: int = None, workers: int = 1, hand_history_dir: str = None,
+                 runner: str = PROCESS_RUNNER):
+        super().__init__(players=players, use_local=use_local, seed=seed, workers=workers)
+        self._init_pot = init_pot
+        self._small_blind_stake = small_blind_stake
+        self._max_iterations = max_iterations
+        self._runner = runner
+        self._hand_history_path = os.path.join(hand_history_dir, self._id + '.phh') if hand_history_dir else None
+
+        # the histogram is the result, filled game by game while the job runs
+        self._games_done = 0
+        self._histogram = {player: 0 for player in players}
+        self._lock = threading.Lock()
+
+    @property
+    def init_pot(self):
+        return self._init_pot
+
+    @property
+    def small_blind_stake(self):
+        return self._small_blind_stake
+
+    @property
+    def max_iterations(self):
+        return self._max_iterations
+
+    @property
+    def runner(self):
+        return self._runner
+
+    @property
+    def hand_history_path(self):
+        return self._hand_history_path
+
+    @property
+    def histogram(self):
+        with self._lock:
+            return dict(self._histogram)
+
+    @property
+    def result(self):
+        return self.histogram
+
+    def add_results(self, histogram: Dict[str, int]):
+        with self._lock:
+            for (player, win_count) in histogram.items():
+                self._histogram[player] += win_count
+                self._games_done += win_count
+
+    def games_per_second(self) -> float:
+        elapsed = self.elapsed_sec()
+        return self._games_done / elapsed if elapsed > 0 else 0.0
+
+    def params_dict(self) -> dict:
+        return {
+            'players': self._players,
+            'init_pot': self._init_pot,
+            'small_blind_stake': self._small_blind_stake,
+            'max_iterations': self._max_iterations
+        }
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                'id': self._id,
+                'type': self.TYPE,
+                'status': self._status,
+                **self.params_dict(),
+                'seed': self._seed,
+                'runner': self._runner,
+                'hand_history': os.path.basename(self._hand_history_path) if self._hand_history_path else None,
+                'games_done': self._games_done,
+                'games_per_sec': self.games_per_second(),
+                'histogram': dict(self._histogram),
+                'error': self._error
+            }
@@ -0,0 +1,45 @@
+from typing import List
+
+from src.models.job import Job
+
+
+class TournamentJob(Job):
+
+    TYPE = 'tournament'
+
+    def __init__(self, players: List[str], starting_stack: int, table_size: int, hands_per_level: int,
+                 hands_per_segment: int, use_local: bool, seed: int = None, workers: int = 1, max_hands: int = None):
+        super().__init__(players=players, use_local=use_local, seed=seed, workers=workers)
+        self._starting_stack = starting_stack
+        self._table_size = table_size
+        self._hands_per_level = hands_per_level
+        self._hands_per_segment = hands_per_segment
+        self._max_hands = max_hands
+
+    @property
+    def starting_stack(self):
+        return self._starting_stack
+
+    @property
+    def table_size(self):
+        return self._table_size
+
+    @property
+    def hands_per_level(self):
+        return self._hands_per_level
+
+    @property
+    def hands_per_segment(self):
+        return self._hands_per_segment
+
+    @property
+    def max_hands(self):
+        return self._max_hands
+
+    def params_dict(self) -> dict:
+        return {
+            'players': len(self._players),
+            'starting_stack': self._starting_stack,
+            'table_size': self._table_size,
+            'hands_per_level': self._hands_per_level
+        }
@@ -1,12 +1,297 @@
+import asyncio
+import itertools
 import logging
-import json
-from typing import List, Tuple
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Tuple
 
+import aiohttp
 import requests
+from requests.adapters import HTTPAdapter
+
+from src.metrics import REGISTRY
+from src.poker_engine.poker_agent_runtime import fallback_action, get_agent_runtime, parse_agent_action, \
+    parse_agent_actions, parse_agent_response
 
 
 LOGGER = logging.getLogger(__name__)
 
+AGENT_CALL_SECONDS = REGISTRY.histogram('poker_agent_call_seconds', 'Latency of remote agent calls, retries included',
+                                        label_names=('player',))
+AGENT_CALL_FAILURES = REGISTRY.counter('poker_agent_call_failures_total',
+                                       'Remote agent calls answered by the fallback action', ('player',))
+AGENT_BREAKER_OPENINGS = REGISTRY.counter('poker_agent_breaker_openings_total',
+                                          'Agent circuit breakers opened after consecutive failed calls', ('player',))
+
+AGENT_URL = 'http://agent-{}:5000'
+
+# Remote agent call settings, in seconds
+AGENT_CONNECT_TIMEOUT = float(os.environ.get('AGENT_CONNECT_TIMEOUT', 1.0))
+AGENT_READ_TIMEOUT = float(os.environ.get('AGENT_READ_TIMEOUT', 5.0))
+AGENT_RETRIES = int(os.environ.get('AGENT_RETRIES', 2))
+AGENT_POOL_SIZE = int(os.environ.get('AGENT_POOL_SIZE', 10))
+AGENT_BREAKER_FAILURES = int(os.environ.get('AGENT_BREAKER_FAILURES', 5))
+AGENT_BREAKER_COOLDOWN = float(os.environ.get('AGENT_BREAKER_COOLDOWN', 30.0))
+
+
+class CircuitBreaker:
+
+    # After failures consecutive failed calls the breaker opens: calls are skipped for cooldown seconds, then one
+    # call is let through, a success closes the breaker and a failure opens it again
+    def __init__(self, player: str, failures=AGENT_BREAKER_FAILURES, cooldown=AGENT_BREAKER_COOLDOWN):
+        self._player = player
+        self._max_failures = failures
+        self._cooldown = cooldown
+        self._failures = 0
+        self._open_until = None
+        self._lock = threading.Lock()
+
+    # Return True when a call may be made
+    def allow(self) -> bool:
+        with self._lock:
+            if self._open_until is None:
+                return True
+            if time.monotonic() < self._open_until:
+                return False
+
+            # half open: the next call tells whether the agent is back
+            self._open_until = time.monotonic() + self._cooldown
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._open_until = None
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._failures < self._max_failures:
+                return
+
+            if self._open_until is None:
+                LOGGER.warning('Agent calls skipped for %.1fs after %d failed calls: player=%s', self._cooldown,
+                               self._failures, self._player)
+                AGENT_BREAKER_OPENINGS.inc(labels=(self._player,))
+            self._open_until = time.monotonic() + self._cooldown
+
+
+class AgentClient:
+
+    def __init__(self, player: str, connect_timeout=AGENT_CONNECT_TIMEOUT, read_timeout=AGENT_READ_TIMEOUT,
+                 retries=AGENT_RETRIES, pool_size=AGENT_POOL_SIZE):
+        self._player = player
+        self._urls = get_agent_urls(player)
+        self._next_url = itertools.count()
+        self._timeout = (connect_timeout, read_timeout)
+        self._retries = retries
+        self._breaker = CircuitBreaker(player)
+
+        # keep-alive connections to the agent containers are reused across decisions
+        self._session = requests.Session()
+        self._session.mount('http://', HTTPAdapter(pool_connections=len(self._urls), pool_maxsize=pool_size))
+
+    @property
+    def player(self):
+        return self._player
+
+    def call_action(self, valid_actions: List[Tuple[str, int, int]]) -> Tuple[str, int]:
+        req = {
+            'valid_actions': valid_actions
+        }
+
+        agent_action = self._post('/agent_action', req,
+                                  lambda res: parse_agent_action(res['agent_action'], valid_actions))
+        if agent_action is None:
+            return fallback_action(valid_actions)
+
+        return agent_action
+
+    # One request for the decisions of many tables, actions are returned in the same order
+    def call_actions(self, valid_actions_batch: List[List[Tuple[str, int, int]]]) -> List[Tuple[str, int]]:
+        req = {
+            'batch': [{'valid_actions': valid_actions} for valid_actions in valid_actions_batch]
+        }
+
+        agent_actions = self._post('/agent_actions', req, lambda res: parse_agent_actions(res, valid_actions_batch))
+        if agent_actions is None:
+            return [fallback_action(valid_actions) for valid_actions in valid_actions_batch]
+
+        return agent_actions
+
+    # Return the parsed response, None when the agent cannot answer or the breaker skips the call
+    def _post(self, path: str, req: dict, parse: Callable[[dict], Any]):
+        if not self._breaker.allow():
+            AGENT_CALL_FAILURES.inc(labels=(self._player,))
+            return None
+
+        start_time = time.perf_counter()
+        res = self._post_with_retries(path, req)
+        AGENT_CALL_SECONDS.observe(time.perf_counter() - start_time, (self._player,))
+
+        return record_agent_response(self._player, self._breaker, path, res, parse)
+
+    def _post_with_retries(self, path: str, req: dict):
+        # calls are spread over the replicas of the agent, a retry goes to the next replica
+        first_url = next(self._next_url)
+        for attempt in range(self._retries + 1):
+            url = self._urls[(first_url + attempt) % len(self._urls)]
+            try:
+                res = self._session.post(url + path, json=req, timeout=self._timeout)
+            except (requests.ConnectionError, requests.Timeout) as ex:
+                LOGGER.warning('Agent call failed: player=%s attempt=%d error=%s', self._player, attempt + 1, ex)
+                continue
+
+            if res.status_code == 200:
+                try:
+                    return res.json()
+                except ValueError as ex:
+                    LOGGER.warning('Invalid agent response: player=%s path=%s error=%s', self._player, path, ex)
+                    break
+
+            LOGGER.warning('Cannot proceed agent call: player=%s path=%s response=%s',
+                           self._player, path, res)
+            break
+
+        return None
+
+    def close(self):
+        self._session.close()
+
+
+class AsyncAgentClient:
+
+    def __init__(self, player: str, session: aiohttp.ClientSession, concurrency: int,
+                 connect_timeout=AGENT_CONNECT_TIMEOUT, read_timeout=AGENT_READ_TIMEOUT, retries=AGENT_RETRIES):
+        self._player = player
+        self._urls = get_agent_urls(player)
+        self._next_url = itertools.count()
+        self._session = session
+        self._timeout = aiohttp.ClientTimeout(sock_connect=connect_timeout, sock_read=read_timeout)
+        self._retries = retries
+        self._breaker = CircuitBreaker(player)
+
+        # caps the number of in-flight requests to the agent container
+        self._semaphore = asyncio.Semaphore(concurrency)
+
+    @property
+    def player(self):
+        return self._player
+
+    async def call_action(self, valid_actions: List[Tuple[str, int, int]]) -> Tuple[str, int]:
+        req = {
+            'valid_actions': valid_actions
+        }
+
+        agent_action = await self._post('/agent_action', req,
+                                        lambda res: parse_agent_action(res['agent_action'], valid_actions))
+        if agent_action is None:
+            return fallback_action(valid_actions)
+
+        return agent_action
+
+    async def call_actions(self, valid_actions_batch: List[List[Tuple[str, int, int]]]) -> List[Tuple[str, int]]:
+        req = {
+            'batch': [{'valid_actions': valid_actions} for valid_actions in valid_actions_batch]
+        }
+
+        agent_actions = await self._post('/agent_actions', req,
+                                         lambda res: parse_agent_actions(res, valid_actions_batch))
+        if agent_actions is None:
+            return [fallback_action(valid_actions) for valid_actions in valid_actions_batch]
+
+        return agent_actions
+
+    async def _post(self, path: str, req: dict, parse: Callable[[dict], Any]):
+        if not self._breaker.allow():
+            AGENT_CALL_FAILURES.inc(labels=(self._player,))
+            return None
+
+        start_time = time.perf_counter()
+        res = await self._post_with_retries(path, req)
+        AGENT_CALL_SECONDS.observe(time.perf_counter() - start_time, (self._player,))
+
+        return record_agent_response(self._player, self._breaker, path, res, parse)
+
+    async def _post_with_retries(self, path: str, req: dict):
+        async with self._semaphore:
+            first_url = next(self._next_url)
+            for attempt in range(self._retries + 1):
+                url = self._urls[(first_url + attempt) % len(self._urls)]
+                try:
+                    async with self._session.post(url + path, json=req, timeout=self._timeout) as res:
+                        if res.status == 200:
+                            try:
+                                return await res.json()
+                            except (aiohttp.ContentTypeError, ValueError) as ex:
+                                LOGGER.warning('Invalid agent response: player=%s path=%s error=%r', self._player,
+                                               path, ex)
+                                break
+
+                        LOGGER.warning('Cannot proceed agent call: player=%s path=%s response=%s',
+                                       self._player, path, res.status)
+                        break
+                except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as ex:
+                    LOGGER.warning('Agent call failed: player=%s attempt=%d error=%r', self._player, attempt + 1, ex)
+
+        return None
+
+
+# Return the parsed agent response, None for a failed call or an invalid response. The breaker of the agent
+# records the outcome
+def record_agent_response(player: str, breaker: CircuitBreaker, path: str, res, parse: Callable[[dict], Any]):
+    res = parse_agent_response(player, path, res, parse)
+    if res is None:
+        AGENT_CALL_FAILURES.inc(labels=(player,))
+        breaker.record_failure()
+    else:
+        breaker.record_success()
+    return res
+
+
+_AGENT_CLIENTS: Dict[str, AgentClient] = {}
+_AGENT_CLIENTS_PID = os.getpid()
+_AGENT_CLIENTS_LOCK = threading.Lock()
+
+# Base URLs of the ready replicas of agents started by the container pool, other agents are called at AGENT_URL
+_AGENT_URLS: Dict[str, List[str]] = {}
+
+
+def set_agent_urls(player: str, urls: List[str]):
+    with _AGENT_CLIENTS_LOCK:
+        if urls:
+            _AGENT_URLS[player] = list(urls)
+        else:
+            _AGENT_URLS.pop(player, None)
+
+        # the next decision gets a client of the new replicas
+        _AGENT_CLIENTS.pop(player, None)
+
+
+def agent_urls() -> Dict[str, List[str]]:
+    with _AGENT_CLIENTS_LOCK:
+        return {player: list(urls) for (player, urls) in _AGENT_URLS.items()}
+
+
+def get_agent_urls(player: str) -> List[str]:
+    return _AGENT_URLS.get(player) or [AGENT_URL.format(player)]
+
+
+def get_agent_client(player: str) -> AgentClient:
+    global _AGENT_CLIENTS_PID  # pylint: disable=global-statement
+
+    with _AGENT_CLIENTS_LOCK:
+        # pooled connections must not be shared with forked simulation workers
+        if _AGENT_CLIENTS_PID != os.getpid():
+            _AGENT_CLIENTS.clear()
+            _AGENT_CLIENTS_PID = os.getpid()
+
+        if player not in _AGENT_CLIENTS:
+            _AGENT_CLIENTS[player] = AgentClient(player)
+
+        return _AGENT_CLIENTS[player]
+
 
 def agent_call_action(player: str, valid_actions: List[Tuple[str, int, int]], use_local=True) -> Tuple[str, int]:
     if use_local:
@@ -21,18 +306,23 @@ def agent_call_action(player: str, valid_actions: List[Tuple[str, int, int]], us
         LOGGER.warning('Cannot proceed agent_call_action: player={} valid_actions={}'.format(player, valid_actions))
         return ('fold', 0)
 
+    # Agent loaded in a worker subprocess
+    agent_runtime = get_agent_runtime(player)
+    if agent_runtime:
+        return agent_runtime.call_action(valid_actions)
+
     # Remote call to agent container
-    req = {
-        'valid_actions': valid_actions
-    }
+    return get_agent_client(player).call_action(valid_actions)
 
-    res = requests.post('http://agent-{}:5000/agent_action'.format(player), json=json.dumps(req))
 
-    if res.status_code == 200:
-        return tuple(res.json()['agent_action'])
+def agent_call_actions(player: str, valid_actions_batch: List[List[Tuple[str, int, int]]],
+                       use_local=True) -> List[Tuple[str, int]]:
+    if use_local:
+        return [agent_call_action(player, valid_actions, use_local=True) for valid_actions in valid_actions_batch]
 
-    LOGGER.warning(
-        'Cannot proceed agent_call_action: player={} valid_actions={} response={}'
-        .format(player, valid_actions, res))
+    agent_runtime = get_agent_runtime(player)
+    if agent_runtime:
+        return agent_runtime.call_actions(valid_actions_batch)
 
-    return ('fold', 0)
+    # Remote batched call to agent container
+    return get_agent_client(player).call_actions(valid_actions_batch)
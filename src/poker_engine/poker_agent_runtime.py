@@ -0,0 +1,306 @@
+import atexit
+import json
+import logging
+import os
+import select
+import subprocess
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from src.metrics import REGISTRY
+
+
+LOGGER = logging.getLogger(__name__)
+
+AGENT_RUNTIME_SECONDS = REGISTRY.histogram('poker_agent_runtime_call_seconds',
+                                           'Latency of calls to agent worker subprocesses', label_names=('player',))
+AGENT_RUNTIME_FAILURES = REGISTRY.counter('poker_agent_runtime_failures_total',
+                                          'Agent worker calls answered by the fallback action', ('player',))
+AGENT_RUNTIME_RESTARTS = REGISTRY.counter('poker_agent_runtime_restarts_total',
+                                          'Agent worker subprocesses (re)started', ('player',))
+
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'poker_agent_worker.py')
+
+# Agent worker settings: seconds to answer a decision, address space (MB) and CPU seconds limits of a worker
+AGENT_RUNTIME_TIMEOUT = float(os.environ.get('AGENT_RUNTIME_TIMEOUT', 5.0))
+AGENT_RUNTIME_MEMORY_MB = int(os.environ.get('AGENT_RUNTIME_MEMORY_MB', 512))
+AGENT_RUNTIME_CPU_SECONDS = int(os.environ.get('AGENT_RUNTIME_CPU_SECONDS', 0))
+
+
+# Agent loaded from a submitted agent directory (with src/poker_agent.py) in a worker subprocess.
+# The worker is started with an isolated interpreter, an empty environment and resource limits, and answers
+# decisions over its stdin/stdout pipes, without the HTTP round trip of agent containers
+class SubprocessAgent:
+
+    def __init__(self, player: str, agent_dir: str, timeout=AGENT_RUNTIME_TIMEOUT,
+                 memory_mb=AGENT_RUNTIME_MEMORY_MB, cpu_seconds=AGENT_RUNTIME_CPU_SECONDS):
+        self._player = player
+        self._agent_dir = os.path.abspath(agent_dir)
+        self._timeout = timeout
+        self._memory_mb = memory_mb
+        self._cpu_seconds = cpu_seconds
+        self._process: Optional[subprocess.Popen] = None
+        self._buffer = b''
+
+        # one decision at a time per worker
+        self._lock = threading.Lock()
+
+        if not os.path.isfile(os.path.join(self._agent_dir, 'src', 'poker_agent.py')):
+            raise ValueError('No src/poker_agent.py in agent directory {}'.format(agent_dir))
+
+    @property
+    def player(self):
+        return self._player
+
+    @property
+    def agent_dir(self):
+        return self._agent_dir
+
+    @property
+    def pid(self):
+        return self._process.pid if self._process else None
+
+    # Replies are validated as the replies of agent containers, an invalid one gets the fallback action
+    def call_action(self, valid_actions: List[Tuple[str, int, int]]) -> Tuple[str, int]:
+        agent_action = self._call({'valid_actions': valid_actions}, 'agent_action',
+                                  lambda res: parse_agent_action(res['agent_action'], valid_actions))
+        if agent_action is None:
+            return fallback_action(valid_actions)
+
+        return agent_action
+
+    # One message for the decisions of many tables, actions are returned in the same order
+    def call_actions(self, valid_actions_batch: List[List[Tuple[str, int, int]]]) -> List[Tuple[str, int]]:
+        req = {'batch': [{'valid_actions': valid_actions} for valid_actions in valid_actions_batch]}
+        agent_actions = self._call(req, 'agent_actions', lambda res: parse_agent_actions(res, valid_actions_batch))
+        if agent_actions is None:
+            return [fallback_action(valid_actions) for valid_actions in valid_actions_batch]
+
+        return agent_actions
+
+    # Return the parsed reply, None when the worker cannot answer or its reply is invalid
+    def _call(self, req: dict, path: str, parse: Callable[[dict], Any]):
+        start_time = time.perf_counter()
+        with self._lock:
+            res = self._call_worker(req)
+        AGENT_RUNTIME_SECONDS.observe(time.perf_counter() - start_time, (self._player,))
+
+        res = parse_agent_response(self._player, path, res, parse)
+        if res is None:
+            AGENT_RUNTIME_FAILURES.inc(labels=(self._player,))
+        return res
+
+    def _call_worker(self, req: dict) -> Optional[dict]:
+        if self._process is None or self._process.poll() is not None:
+            self._start()
+
+        try:
+            self._process.stdin.write(json.dumps(req).encode('utf-8') + b'\n')
+            self._process.stdin.flush()
+            line = self._read_line()
+        except (OSError, ValueError) as ex:
+            LOGGER.warning('Agent worker call failed: player=%s error=%r', self._player, ex)
+            line = None
+
+        if line is None:
+            # a worker which did not answer may still be busy, it is replaced for the next decision
+            self._stop()
+            return None
+
+        try:
+            res = json.loads(line)
+        except ValueError:
+            LOGGER.warning('Invalid agent worker response: player=%s response=%r', self._player, line[:200])
+            self._stop()
+            return None
+
+        if isinstance(res, dict) and 'error' in res:
+            LOGGER.warning('Agent worker error: player=%s error=%s', self._player, res['error'])
+            return None
+
+        return res
+
+    # Return the next response line of the worker, None when it does not answer in time or exits
+    def _read_line(self) -> Optional[bytes]:
+        deadline = time.monotonic() + self._timeout
+        stdout_fd = self._process.stdout.fileno()
+
+        while b'\n' not in self._buffer:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                LOGGER.warning('Agent worker timed out: player=%s timeout=%.1fs', self._player, self._timeout)
+                return None
+
+            readable, _, _ = select.select([stdout_fd], [], [], remaining)
+            if not readable:
+                continue
+
+            data = os.read(stdout_fd, 1 << 16)
+            if not data:
+                LOGGER.warning('Agent worker exited: player=%s returncode=%s', self._player, self._process.poll())
+                return None
+            self._buffer += data
+
+        line, self._buffer = self._buffer.split(b'\n', 1)
+        return line
+
+    def _start(self):
+        self._stop()
+
+        # resource limits are applied by the worker itself before it loads the agent: a preexec_fn is not safe
+        # in a process with threads (request, job and monitor threads)
+        self._process = subprocess.Popen(
+            [sys.executable, '-I', WORKER_SCRIPT, self._agent_dir, str(self._memory_mb), str(self._cpu_seconds)],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=None, bufsize=0,
+            cwd=self._agent_dir, env={'PATH': os.defpath, 'PYTHONHASHSEED': '0'}, close_fds=True,
+            start_new_session=True
+        )
+        self._buffer = b''
+        AGENT_RUNTIME_RESTARTS.inc(labels=(self._player,))
+        LOGGER.info('Started agent worker: player=%s pid=%d agent_dir=%s', self._player, self._process.pid,
+                    self._agent_dir)
+
+    def _stop(self):
+        if self._process is None:
+            return
+
+        process, self._process = self._process, None
+        for pipe in (process.stdin, process.stdout):
+            try:
+                pipe.close()
+            except OSError:
+                pass
+
+        try:
+            process.wait(timeout=0.5)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+    def close(self):
+        with self._lock:
+            self._stop()
+
+    def __str__(self):
+        return """
+            SubprocessAgent: player={}, agent_dir={}, pid={}, timeout={}
+        """.format(self._player, self._agent_dir, self.pid, self._timeout)
+
+
+# Agent directories of players answering from a worker subprocess, players not registered here are called
+# over HTTP. Workers are started lazily, once per simulation process
+_AGENT_DIRS: Dict[str, str] = {}
+_AGENT_RUNTIMES: Dict[str, SubprocessAgent] = {}
+_AGENT_RUNTIMES_PID = os.getpid()
+_AGENT_RUNTIMES_LOCK = threading.Lock()
+
+
+def register_subprocess_agent(player: str, agent_dir: str):
+    agent_dir = os.path.abspath(agent_dir)
+    if not os.path.isfile(os.path.join(agent_dir, 'src', 'poker_agent.py')):
+        raise ValueError('No src/poker_agent.py in agent directory {}'.format(agent_dir))
+
+    with _AGENT_RUNTIMES_LOCK:
+        _AGENT_DIRS[player] = agent_dir
+
+        # the new agent is loaded on the next decision
+        agent_runtime = _AGENT_RUNTIMES.pop(player, None)
+        if agent_runtime and _AGENT_RUNTIMES_PID == os.getpid():
+            agent_runtime.close()
+
+    LOGGER.info('Player %s is answered by a subprocess agent from %s', player, agent_dir)
+
+
+def unregister_subprocess_agent(player: str):
+    with _AGENT_RUNTIMES_LOCK:
+        _AGENT_DIRS.pop(player, None)
+
+        agent_runtime = _AGENT_RUNTIMES.pop(player, None)
+        if agent_runtime and _AGENT_RUNTIMES_PID == os.getpid():
+            agent_runtime.close()
+
+
+def subprocess_agents() -> Dict[str, str]:
+    return dict(_AGENT_DIRS)
+
+
+# Return the subprocess agent of a player, None when the player is called over HTTP
+def get_agent_runtime(player: str) -> Optional[SubprocessAgent]:
+    global _AGENT_RUNTIMES_PID  # pylint: disable=global-statement
+
+    if player not in _AGENT_DIRS:
+        return None
+
+    with _AGENT_RUNTIMES_LOCK:
+        # pipes of the parent's workers must not be shared with forked simulation workers
+        if _AGENT_RUNTIMES_PID != os.getpid():
+            _AGENT_RUNTIMES.clear()
+            _AGENT_RUNTIMES_PID = os.getpid()
+
+        if player not in _AGENT_RUNTIMES:
+            _AGENT_RUNTIMES[player] = SubprocessAgent(player, _AGENT_DIRS[player])
+
+        return _AGENT_RUNTIMES[player]
+
+
+@atexit.register
+def close_agent_runtimes():
+    with _AGENT_RUNTIMES_LOCK:
+        if _AGENT_RUNTIMES_PID != os.getpid():
+            return
+
+        for agent_runtime in _AGENT_RUNTIMES.values():
+            agent_runtime.close()
+        _AGENT_RUNTIMES.clear()
+
+
+# Return the action of an agent response, which must be an (action, amount) pair of one of the valid actions,
+# amount an integer between the min and max chips of the action. Raise a ValueError otherwise
+def parse_agent_action(agent_action, valid_actions: List[Tuple[str, int, int]]) -> Tuple[str, int]:
+    if not isinstance(agent_action, (list, tuple)) or len(agent_action) != 2:
+        raise ValueError('Agent action is not an (action, amount) pair: {!r}'.format(agent_action))
+
+    (action, amount) = agent_action
+    if not isinstance(amount, int) or isinstance(amount, bool):
+        raise ValueError('Agent action amount is not an integer: {!r}'.format(agent_action))
+
+    for (valid_action, min_chip, max_chip) in valid_actions:
+        if action == valid_action:
+            if not min_chip <= amount <= max_chip:
+                raise ValueError('Agent action amount is not between {} and {}: {!r}'.format(min_chip, max_chip,
+                                                                                          agent_action))
+            return (action, amount)
+
+    raise ValueError('Agent action is not one of {}: {!r}'.format(
+        [valid_action for (valid_action, _, _) in valid_actions], agent_action))
+
+
+def parse_agent_actions(res: dict, valid_actions_batch: List[List[Tuple[str, int, int]]]) -> List[Tuple[str, int]]:
+    agent_actions = res['agent_actions']
+    if not isinstance(agent_actions, list) or len(agent_actions) != len(valid_actions_batch):
+        raise ValueError('Expected {} actions, got {!r}'.format(len(valid_actions_batch), agent_actions))
+
+    return [parse_agent_action(agent_action, valid_actions)
+            for (agent_action, valid_actions) in zip(agent_actions, valid_actions_batch)]
+
+
+# Return the parsed agent response, None for no response or an invalid one
+def parse_agent_response(player: str, path: str, res, parse: Callable[[dict], Any]):
+    if res is None:
+        return None
+
+    try:
+        return parse(res)
+    except (KeyError, TypeError, ValueError) as ex:
+        LOGGER.warning('Invalid agent response: player=%s path=%s error=%r', player, path, ex)
+        return None
+
+
+# Action taken when an agent does not answer: check if possible, otherwise fold
+def fallback_action(valid_actions: List[Tuple[str, int, int]]) -> Tuple[str, int]:
+    if 'check' in [action for (action, min_chip, max_chip) in valid_actions]:
+        return ('check', 0)
+
+    return ('fold', 0)
@@ -0,0 +1,52 @@
+# Sandboxed agent worker, started by poker_agent_runtime as
+# `python -I poker_agent_worker.py <agent_dir> <memory_mb> <cpu_seconds>` (0 for no limit). It limits its own
+# resources, then loads get_agent_action from <agent_dir>/src/poker_agent.py (the contract of agent-build) and answers
+# one JSON request per line on stdin with one JSON response per line on stdout:
+#   {"valid_actions": [...]}            -> {"agent_action": [action, chip]}
+#   {"batch": [{"valid_actions": ...}]} -> {"agent_actions": [[action, chip], ...]}
+# Errors are answered with {"error": "..."}. The worker must not import the simulator: agents ship their
+# own `src` package
+import json
+import os
+import resource
+import sys
+import traceback
+
+
+def limit_resources(memory_mb: int, cpu_seconds: int):
+    if memory_mb > 0:
+        limit = memory_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    if cpu_seconds > 0:
+        resource.setrlimit(resource.RLIMIT_CPU, (cpu_seconds, cpu_seconds))
+
+
+def main(agent_dir: str, memory_mb: int = 0, cpu_seconds: int = 0):
+    # the limits are set before any agent code runs
+    limit_resources(memory_mb, cpu_seconds)
+
+    # the protocol gets its own copy of stdout, anything printed by the agent goes to stderr
+    protocol_out = os.fdopen(os.dup(sys.stdout.fileno()), 'w')
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+
+    sys.path.insert(0, agent_dir)
+    from src.poker_agent import get_agent_action  # pylint: disable=import-error,import-outside-toplevel
+
+    for line in sys.stdin:
+        try:
+            req = json.loads(line)
+            if 'batch' in req:
+                res = {'agent_actions': [get_agent_action(valid_actions=[tuple(x) for x in decision['valid_actions']])
+                                         for decision in req['batch']]}
+            else:
+                res = {'agent_action': get_agent_action(valid_actions=[tuple(x) for x in req['valid_actions']])}
+        except Exception as ex:  # pylint: disable=broad-except
+            traceback.print_exc()
+            res = {'error': repr(ex)}
+
+        protocol_out.write(json.dumps(res) + '\n')
+        protocol_out.flush()
+
+
+if __name__ == '__main__':
+    main(sys.argv[1], *[int(arg) for arg in sys.argv[2:4]])
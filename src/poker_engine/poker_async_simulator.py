@@ -0,0 +1,82 @@
+import asyncio
+import logging
+from typing import Callable, Dict, List, Tuple
+
+import aiohttp
+
+from src.poker_engine.poker_agent import AsyncAgentClient, agent_call_action
+from src.poker_engine.poker_agent_runtime import get_agent_runtime
+from src.poker_engine.poker_simulator import derive_game_seeds, log_simulation_result, play_game
+
+
+LOGGER = logging.getLogger(__name__)
+
+
+# Run games concurrently on one event loop: while a game waits for a remote agent, other games move on.
+# max_concurrent_games caps in-flight games, agent_concurrency caps in-flight requests per agent container.
+# on_result gets the winner of every game, is_cancelled is checked before every game
+def start_async_simulation(players: List[str], init_pot=100, small_blind_stake=5, max_iterations=100,
+                           use_local=False, seed: int = None, max_concurrent_games=64, agent_concurrency=8,
+                           on_result: Callable[[Dict[str, int]], None] = None,
+                           is_cancelled: Callable[[], bool] = None):
+    return asyncio.run(run_async_simulation(
+        players=players, init_pot=init_pot, small_blind_stake=small_blind_stake, max_iterations=max_iterations,
+        use_local=use_local, seed=seed, max_concurrent_games=max_concurrent_games,
+        agent_concurrency=agent_concurrency, on_result=on_result, is_cancelled=is_cancelled
+    ))
+
+
+async def run_async_simulation(players: List[str], init_pot=100, small_blind_stake=5, max_iterations=100,
+                               use_local=False, seed: int = None, max_concurrent_games=64, agent_concurrency=8,
+                               on_result: Callable[[Dict[str, int]], None] = None,
+                               is_cancelled: Callable[[], bool] = None) -> Dict[str, int]:
+    # seeds are taken one at a time by a fixed set of game tasks, memory does not grow with max_iterations
+    game_seeds = iter(derive_game_seeds(seed, max_iterations))
+    histogram = {player: 0 for player in players}
+
+    connector = aiohttp.TCPConnector(limit=0, limit_per_host=agent_concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        agent_clients = {player: AsyncAgentClient(player, session, agent_concurrency) for player in players}
+
+        async def run_games():
+            for game_seed in game_seeds:
+                if is_cancelled and is_cancelled():
+                    return
+
+                winner = await start_async_game(players, init_pot, small_blind_stake, use_local, game_seed,
+                                                agent_clients)
+                histogram[winner] += 1
+                if on_result:
+                    on_result({winner: 1})
+
+        await asyncio.gather(*[run_games() for _ in range(max(1, min(max_concurrent_games, max_iterations)))])
+
+    log_simulation_result(histogram, sum(histogram.values()))
+    return histogram
+
+
+async def start_async_game(players: List[str], init_pot: int, small_blind_stake: int, use_local: bool,
+                           seed: int, agent_clients: Dict[str, AsyncAgentClient]) -> str:
+    game = play_game(players=players, init_pot=init_pot, small_blind_stake=small_blind_stake, seed=seed)
+
+    try:
+        player, valid_actions = next(game)
+        while True:
+            player_action = await async_agent_call_action(player, valid_actions, use_local, agent_clients)
+            player, valid_actions = game.send(player_action)
+    except StopIteration as game_end:
+        return game_end.value
+
+
+# Same dispatch as agent_call_action: local agent, subprocess agent, then agent container
+async def async_agent_call_action(player: str, valid_actions: List[Tuple[str, int, int]], use_local: bool,
+                                  agent_clients: Dict[str, AsyncAgentClient]) -> Tuple[str, int]:
+    if use_local:
+        return agent_call_action(player=player, valid_actions=valid_actions, use_local=True)
+
+    # subprocess agents answer over blocking pipes, the event loop keeps running the other games meanwhile
+    agent_runtime = get_agent_runtime(player)
+    if agent_runtime:
+        return await asyncio.get_running_loop().run_in_executor(None, agent_runtime.call_action, valid_actions)
+
+    return await agent_clients[player].call_action(valid_actions)
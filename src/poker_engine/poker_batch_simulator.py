@@ -0,0 +1,82 @@
+import logging
+from typing import Callable, Dict, Generator, List, Optional, Tuple
+
+from src.poker_engine.poker_agent import agent_call_actions
+from src.poker_engine.poker_simulator import derive_game_seeds, log_simulation_result, play_game
+
+
+LOGGER = logging.getLogger(__name__)
+
+Decision = Tuple[str, List[Tuple[str, int, int]]]
+
+
+# Play up to `tables` games side by side: pending decisions of all tables are collected and every agent
+# receives a single batched request per step, instead of one request per decision. Once cancelled, no new game is
+# started and the open tables are played to the end
+def start_batched_simulation(players: List[str], init_pot=100, small_blind_stake=5, max_iterations=100,
+                             use_local=False, seed: int = None, tables=64,
+                             on_result: Callable[[Dict[str, int]], None] = None,
+                             is_cancelled: Callable[[], bool] = None) -> Dict[str, int]:
+    histogram = {player: 0 for player in players}
+    game_seeds = iter(derive_game_seeds(seed, max_iterations))
+    open_tables: List[Tuple[Generator, Decision]] = []
+
+    def add_winner(winner: str):
+        histogram[winner] += 1
+        if on_result:
+            on_result({winner: 1})
+
+    def fill_tables():
+        while len(open_tables) < tables and not (is_cancelled and is_cancelled()):
+            game_seed = next(game_seeds, None)
+            if game_seed is None:
+                return
+
+            game = play_game(players=players, init_pot=init_pot, small_blind_stake=small_blind_stake, seed=game_seed)
+            decision, winner = step_game(game)
+            if decision:
+                open_tables.append((game, decision))
+            else:
+                add_winner(winner)
+
+    fill_tables()
+    while open_tables:
+        player_actions = collect_player_actions([decision for (_, decision) in open_tables], use_local)
+
+        still_open = []
+        for (game, _), player_action in zip(open_tables, player_actions):
+            decision, winner = step_game(game, player_action)
+            if decision:
+                still_open.append((game, decision))
+            else:
+                add_winner(winner)
+
+        open_tables[:] = still_open
+        fill_tables()
+
+    log_simulation_result(histogram, sum(histogram.values()))
+    return histogram
+
+
+# Return actions for pending decisions, in the same order, with one agent call per player
+def collect_player_actions(decisions: List[Decision], use_local: bool) -> List[Tuple[str, int]]:
+    decision_indexes: Dict[str, List[int]] = {}
+    for i, (player, _) in enumerate(decisions):
+        decision_indexes.setdefault(player, []).append(i)
+
+    player_actions = [None] * len(decisions)
+    for (player, indexes) in decision_indexes.items():
+        actions = agent_call_actions(player, [decisions[i][1] for i in indexes], use_local=use_local)
+        for i, action in zip(indexes, actions):
+            player_actions[i] = action
+
+    LOGGER.debug('Collected %d decisions from %d agents', len(decisions), len(decision_indexes))
+    return player_actions
+
+
+# Advance a play_game generator, return (next decision, None) or (None, winner) once the game is over
+def step_game(game: Generator, player_action: Tuple[str, int] = None) -> Tuple[Optional[Decision], Optional[str]]:
+    try:
+        return (game.send(player_action) if player_action else next(game)), None
+    except StopIteration as game_end:
+        return None, game_end.value
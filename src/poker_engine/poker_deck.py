@@ -0,0 +1,34 @@
+import random
+from array import array
+from typing import List, Tuple
+
+
+# Reusable deck of 0-51 integer cards (encoding in poker_hand_eval). The buffer is allocated once
+# and shuffled in place every round, so no card objects are created in the simulation loop
+class Deck:
+
+    def __init__(self, rng: random.Random = None):
+        self._cards = array('B', range(52))
+        self._pos = 0
+        self._random = rng or random
+
+    def shuffle(self):
+        self._random.shuffle(self._cards)
+        self._pos = 0
+
+    def deal(self) -> int:
+        card = self._cards[self._pos]
+        self._pos += 1
+        return card
+
+    def deal_many(self, count: int) -> List[int]:
+        cards = self._cards[self._pos:self._pos + count].tolist()
+        self._pos += count
+        return cards
+
+    def deal_hand(self) -> Tuple[int, int]:
+        return (self.deal(), self.deal())
+
+    @property
+    def remaining(self) -> int:
+        return len(self._cards) - self._pos
@@ -0,0 +1,185 @@
+import argparse
+import json
+import logging
+import math
+import random
+import time
+from functools import partial
+from typing import Callable, Dict, List, Optional, Tuple
+
+from src.metrics import REGISTRY
+from src.models.game_state import GameState
+from src.poker_engine.poker_agent import agent_call_action
+from src.poker_engine.poker_deck import Deck
+from src.poker_engine.poker_simulator import GAMES, derive_game_seeds, play_rounds
+from src.poker_engine.poker_worker_pool import worker_pool
+
+
+LOGGER = logging.getLogger(__name__)
+
+DUPLICATE_DEALS = REGISTRY.counter('poker_duplicate_deals_total', 'Deals played in duplicate simulations')
+
+
+# Duplicate poker: every deal (a seed, so the same cards for every seat and round) is played once per seating,
+# players moving one seat further at every seating. The cards of every seat are then played by every player, the
+# chips won with them cancel out in the deal score of a player: the mean of its chip results over the seatings.
+# Return, per deal, the chip results of every player in every seating
+def play_duplicate_deal(players: List[str], init_pot: int, small_blind_stake: int, max_rounds: int,
+                        use_local: bool, seed: int) -> List[Dict[str, int]]:
+    seating_results = []
+
+    for rotation in range(len(players)):
+        seating = players[rotation:] + players[:rotation]
+        game_state = GameState(players=seating, player_pots=[init_pot for _ in seating])
+        game = play_rounds(game_state, small_blind_stake, Deck(random.Random(seed)), range(max_rounds))
+
+        try:
+            player, valid_actions = next(game)
+            while True:
+                player_action = agent_call_action(player=player, valid_actions=valid_actions, use_local=use_local)
+                player, valid_actions = game.send(player_action)
+        except StopIteration:
+            pass
+
+        GAMES.inc()
+        seating_results.append({player: game_state.get_player_pot(player) - init_pot for player in seating})
+
+    DUPLICATE_DEALS.inc()
+    return seating_results
+
+
+def play_duplicate_deals(players: List[str], init_pot: int, small_blind_stake: int, max_rounds: int,
+                         use_local: bool, deal_seeds: List[int]) -> List[List[Dict[str, int]]]:
+    return [play_duplicate_deal(players, init_pot, small_blind_stake, max_rounds, use_local, deal_seed)
+            for deal_seed in deal_seeds]
+
+
+# play_duplicate_deals for worker processes: metrics collected by the worker are returned to be merged by the parent
+def play_duplicate_deals_with_metrics(*args) -> Tuple[List[List[Dict[str, int]]], dict]:
+    # a worker runs several tasks, every task returns only its own metrics
+    REGISTRY.reset()
+    deal_results = play_duplicate_deals(*args)
+    return deal_results, REGISTRY.snapshot()
+
+
+# Play max_deals duplicate deals (len(players) games each) and return, per player, the mean deal score in chips
+# per game and its standard error. The first seating of every deal is a plain (non duplicate) sample of the same
+# size, its standard error is reported as well: efficiency is how many times fewer games duplicate deals need
+# for the same standard error. on_progress gets the number of deals played after every deal (every chunk with
+# workers), a cancelled simulation returns the stats of the deals played so far
+def start_duplicate_simulation(players: List[str], init_pot=100, small_blind_stake=5, max_deals=100, max_rounds=100,
+                               use_local=True, seed: int = None, workers: int = 1,
+                               on_progress: Callable[[dict], None] = None,
+                               is_cancelled: Callable[[], bool] = None) -> dict:
+    validate_duplicate_simulation(players, max_deals)
+
+    deal_seeds = derive_game_seeds(seed, max_deals)
+    start_time = time.perf_counter()
+    deal_results = []
+
+    def add_deal_results(results: List[List[Dict[str, int]]]):
+        deal_results.extend(results)
+        if on_progress:
+            on_progress({'deals': len(deal_results), 'max_deals': max_deals})
+
+    if workers > 1:
+        chunk_size = max(1, -(-max_deals // (workers * 4)))
+        chunks = [deal_seeds[i:i + chunk_size] for i in range(0, max_deals, chunk_size)]
+        run_chunk = partial(play_duplicate_deals_with_metrics, players, init_pot, small_blind_stake, max_rounds,
+                            use_local)
+
+        with worker_pool(workers) as executor:
+            futures = [executor.submit(run_chunk, chunk) for chunk in chunks]
+            for future in futures:
+                if is_cancelled and is_cancelled():
+                    for pending in futures:
+                        pending.cancel()
+                    break
+
+                chunk_results, chunk_metrics = future.result()
+                REGISTRY.merge(chunk_metrics)
+                add_deal_results(chunk_results)
+    else:
+        for deal_seed in deal_seeds:
+            if is_cancelled and is_cancelled():
+                break
+            add_deal_results([play_duplicate_deal(players, init_pot, small_blind_stake, max_rounds, use_local,
+                                                  deal_seed)])
+
+    result = duplicate_stats(players, deal_results)
+
+    elapsed = time.perf_counter() - start_time
+    LOGGER.info('End duplicate simulation: %d deals, %d games in %.1fs. Chips per game: %s', result['deals'],
+                result['games'], elapsed,
+                {player: stats['chips_per_game'] for (player, stats) in result['players'].items()})
+    return result
+
+
+def validate_duplicate_simulation(players: List[str], max_deals: int):
+    if len(set(players)) != len(players) or len(players) < 2:
+        raise ValueError('A duplicate simulation needs at least 2 distinct players')
+    # the standard errors need at least 2 deals
+    if max_deals < 2:
+        raise ValueError('A duplicate simulation needs at least 2 deals')
+
+
+def duplicate_stats(players: List[str], deal_results: List[List[Dict[str, int]]]) -> dict:
+    player_stats = {}
+    for player in players:
+        deal_scores = [sum(seating[player] for seating in seatings) / len(seatings) for seatings in deal_results]
+        plain_results = [seatings[0][player] for seatings in deal_results]
+
+        duplicate_mean, duplicate_error = mean_and_standard_error(deal_scores)
+        plain_mean, plain_error = mean_and_standard_error(plain_results)
+
+        # a deal is len(players) games, a plain sample is one game
+        efficiency = None
+        if duplicate_error and plain_error is not None:
+            efficiency = plain_error ** 2 / (duplicate_error ** 2 * len(players))
+
+        player_stats[player] = {
+            'chips_per_game': duplicate_mean,
+            'std_error': duplicate_error,
+            'plain_chips_per_game': plain_mean,
+            'plain_std_error': plain_error,
+            'efficiency': efficiency
+        }
+
+    return {'deals': len(deal_results), 'games': len(deal_results) * len(players), 'players': player_stats}
+
+
+# Return None for what cannot be estimated, e.g. after a simulation cancelled before its second deal
+def mean_and_standard_error(values: List[float]) -> Tuple[Optional[float], Optional[float]]:
+    if not values:
+        return None, None
+
+    mean = sum(values) / len(values)
+    if len(values) < 2:
+        return mean, None
+
+    variance = sum((value - mean) ** 2 for value in values) / (len(values) - 1)
+    return mean, math.sqrt(variance / len(values))
+
+
+def main(args: List[str] = None):
+    parser = argparse.ArgumentParser(description='Compare agents on duplicate deals')
+    parser.add_argument('--players', required=True, help='comma separated players')
+    parser.add_argument('--init-pot', type=int, default=100)
+    parser.add_argument('--small-blind-stake', type=int, default=5)
+    parser.add_argument('--deals', type=int, default=100)
+    parser.add_argument('--max-rounds', type=int, default=100)
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--remote', action='store_true', help='call agent containers instead of local agents')
+    args = parser.parse_args(args)
+
+    result = start_duplicate_simulation(args.players.split(','), init_pot=args.init_pot,
+                                        small_blind_stake=args.small_blind_stake, max_deals=args.deals,
+                                        max_rounds=args.max_rounds, use_local=not args.remote, seed=args.seed,
+                                        workers=args.workers)
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == '__main__':
+    logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level='INFO')
+    main()
@@ -0,0 +1,150 @@
+import functools
+import itertools
+import logging
+import math
+from typing import List, Sequence, Tuple
+
+import numpy as np
+from poker import Card, Combo
+
+from src.models.equity_result import EquityResult
+from src.poker_engine.poker_hand_batch import evaluate_batch, evaluate_board
+from src.poker_engine.poker_hand_eval import cards_to_ints
+from src.poker_engine.poker_worker_pool import worker_pool
+
+
+LOGGER = logging.getLogger(__name__)
+
+# z value of a two-sided 95% confidence interval
+CONFIDENCE_Z = 1.96
+
+BATCH_SIZE = 2000
+
+
+# Return Monte Carlo equity of hole cards against n_opponents random hands, given 0, 3, 4 or 5 board cards.
+# Sampling stops once the 95% confidence interval of the equity is narrower than ci_width (if set)
+def equity(hole: Combo, board: List[Card], n_opponents: int, samples=10000, seed: int = None,
+           ci_width: float = None, workers: int = 1) -> EquityResult:
+    hole_cards = cards_to_ints([hole.first, hole.second])
+    board_cards = cards_to_ints(board)
+    validate_equity_request(hole_cards, board_cards, n_opponents, samples)
+
+    # one seed per batch, so the result for a seed does not depend on the number of workers
+    batch_count = -(-samples // BATCH_SIZE)
+    batch_seeds = np.random.SeedSequence(seed).spawn(batch_count)
+    batch_sizes = [min(BATCH_SIZE, samples - i * BATCH_SIZE) for i in range(batch_count)]
+
+    totals = np.zeros(5)
+    if workers > 1:
+        with worker_pool(workers) as executor:
+            for start in range(0, batch_count, workers):
+                futures = [executor.submit(sample_equity_batch, hole_cards, board_cards, n_opponents,
+                                           batch_sizes[i], batch_seeds[i])
+                           for i in range(start, min(start + workers, batch_count))]
+
+                if accumulate_batches(totals, [future.result() for future in futures], ci_width):
+                    break
+    else:
+        for i in range(batch_count):
+            batch = sample_equity_batch(hole_cards, board_cards, n_opponents, batch_sizes[i], batch_seeds[i])
+
+            if accumulate_batches(totals, [batch], ci_width):
+                break
+
+    result = to_equity_result(totals)
+    LOGGER.debug('Equity of %s on %s against %d opponents: %s', hole, board, n_opponents, result)
+    return result
+
+
+def validate_equity_request(hole_cards: List[int], board_cards: List[int], n_opponents: int, samples: int):
+    if len(board_cards) not in (0, 3, 4, 5):
+        raise ValueError('Board must have 0, 3, 4 or 5 cards, got {}'.format(len(board_cards)))
+
+    if len(set(hole_cards + board_cards)) != len(hole_cards) + len(board_cards):
+        raise ValueError('Hole and board cards must be distinct')
+
+    if n_opponents < 1 or 2 + 5 + 2 * n_opponents > 52:
+        raise ValueError('Invalid number of opponents: {}'.format(n_opponents))
+
+    if samples < 1:
+        raise ValueError('Invalid number of samples: {}'.format(samples))
+
+
+# Return (samples, equity sum, squared equity sum, wins, ties) of one batch of random deals
+def sample_equity_batch(hole_cards: Sequence[int], board_cards: Sequence[int], n_opponents: int,
+                        batch_size: int, seed: np.random.SeedSequence) -> Tuple[int, float, float, int, int]:
+    rng = np.random.default_rng(seed)
+
+    known_cards = set(hole_cards) | set(board_cards)
+    deck = np.array([card for card in range(52) if card not in known_cards], dtype=np.int64)
+    missing_board = 5 - len(board_cards)
+
+    drawn = deck[np.argsort(rng.random((batch_size, len(deck))), axis=1)[:, :missing_board + 2 * n_opponents]]
+
+    opponent_hands = drawn[:, missing_board:].reshape(batch_size * n_opponents, 2)
+
+    if missing_board == 0:
+        # every deal shares the board, strengths are looked up rather than evaluated again
+        strengths = board_strength_table(tuple(board_cards))
+        hero = np.full(batch_size, strengths[hole_cards[0], hole_cards[1]])
+        opponents = strengths[opponent_hands[:, 0], opponent_hands[:, 1]]
+    else:
+        boards = np.concatenate([np.broadcast_to(np.array(board_cards, dtype=np.int64),
+                                                 (batch_size, len(board_cards))),
+                                 drawn[:, :missing_board]], axis=1)
+        hero = evaluate_batch(np.concatenate([np.broadcast_to(np.array(hole_cards, dtype=np.int64), (batch_size, 2)),
+                                              boards], axis=1))
+        opponents = evaluate_batch(np.concatenate([opponent_hands, np.repeat(boards, n_opponents, axis=0)], axis=1))
+    opponents = opponents.reshape(batch_size, n_opponents)
+
+    best_opponent = opponents.max(axis=1)
+    wins = hero > best_opponent
+    ties = hero == best_opponent
+
+    # a tied pot is split between the hero and every opponent holding the same hand
+    shares = wins + ties / (1 + (opponents == hero[:, None]).sum(axis=1))
+
+    return batch_size, float(shares.sum()), float((shares ** 2).sum()), int(wins.sum()), int(ties.sum())
+
+
+# Return the (52, 52) strengths of every pair of hole cards on a complete board, -1 for pairs holding a board card
+# or the same card twice. 1326 evaluations once per board instead of (1 + opponents) per sampled deal
+@functools.lru_cache(maxsize=64)
+def board_strength_table(board_cards: Tuple[int, ...]) -> np.ndarray:
+    hole_cards = np.array([pair for pair in itertools.combinations(range(52), 2)
+                           if not set(pair) & set(board_cards)], dtype=np.int64)
+
+    table = np.full((52, 52), -1, dtype=np.int64)
+    strengths = evaluate_board(hole_cards, board_cards)
+    table[hole_cards[:, 0], hole_cards[:, 1]] = strengths
+    table[hole_cards[:, 1], hole_cards[:, 0]] = strengths
+
+    # shared by every caller
+    table.setflags(write=False)
+    return table
+
+
+# Add batches to the running totals, return True when the confidence interval is narrow enough
+def accumulate_batches(totals: np.ndarray, batches: List[Tuple[int, float, float, int, int]], ci_width: float) -> bool:
+    for batch in batches:
+        totals += batch
+
+        if ci_width is not None and confidence_interval_width(totals) <= ci_width:
+            return True
+
+    return False
+
+
+def confidence_interval_width(totals: np.ndarray) -> float:
+    count, share_sum, share_square_sum, _, _ = totals
+    mean = share_sum / count
+    variance = max(share_square_sum / count - mean ** 2, 0.0)
+    return 2 * CONFIDENCE_Z * math.sqrt(variance / count)
+
+
+def to_equity_result(totals: np.ndarray) -> EquityResult:
+    count, share_sum, _, wins, ties = totals
+    return EquityResult(
+        equity=share_sum / count, win=wins / count, tie=ties / count,
+        samples=int(count), ci_width=confidence_interval_width(totals)
+    )
@@ -0,0 +1,322 @@
+import argparse
+import json
+import logging
+import mmap
+import os
+import struct
+import tempfile
+import zlib
+from typing import Dict, List
+
+from src.poker_engine.poker_hand_history import ACTION, ACTION_CODES, CHUNK_COMPRESSED, CHUNK_HEADER, FILE_HEADER, \
+    GAME_END, GAME_END_HEADER, GAME_START, GAME_START_HEADER, MAGIC, OTHER_ACTION, PAYOUT, RECORD_LENGTH, ROUND, \
+    ROUND_HEADER, VERSION, is_hand_history_part
+
+
+LOGGER = logging.getLogger(__name__)
+
+# Summary of a hand history file, stored next to it and reused as long as the file does not change
+SUMMARY_SUFFIX = '.summary.json'
+SUMMARY_VERSION = 1
+# summary files are written to a temporary file first
+SUMMARY_TMP_SUFFIX = '.summary.tmp'
+
+CALL = ACTION_CODES['call']
+RAISE = ACTION_CODES['raise']
+FOLD = ACTION_CODES['fold']
+PRE_FLOP = 0
+
+
+# Return position of a seat: SB, BB, then P<k> for the player k seats after the small blind
+def position_name(offset: int) -> str:
+    if offset == 0:
+        return 'SB'
+    if offset == 1:
+        return 'BB'
+    return 'P{}'.format(offset)
+
+
+def new_summary() -> dict:
+    return {'games': 0, 'rounds': 0, 'players': {}}
+
+
+def new_player_summary() -> dict:
+    return {'hands': 0, 'vpip': 0, 'pfr': 0, 'showdowns': 0, 'games_won': 0, 'positions': {}}
+
+
+# Return counts (not ratios, so that summaries can be merged) of a hand history file in one streaming pass.
+# The file is memory-mapped and records are decoded in place, only the fields needed by the stats are read
+def scan_hand_history(path: str) -> dict:
+    try:
+        return scan_hand_history_file(path)
+    except (zlib.error, struct.error) as ex:
+        raise ValueError('Corrupt or truncated hand history file {}: {}'.format(path, ex))
+
+
+def scan_hand_history_file(path: str) -> dict:
+    summary = new_summary()
+
+    if os.path.getsize(path) < FILE_HEADER.size:
+        raise ValueError('Not a hand history file: {}'.format(path))
+
+    with open(path, 'rb') as history_file, \
+            mmap.mmap(history_file.fileno(), 0, access=mmap.ACCESS_READ) as history_map:
+
+        magic, version = FILE_HEADER.unpack_from(history_map, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError('Not a hand history file (version {}): {}'.format(VERSION, path))
+
+        game_players: List[dict] = []
+        offset = FILE_HEADER.size
+        while offset < len(history_map):
+            flags, length = CHUNK_HEADER.unpack_from(history_map, offset)
+            offset += CHUNK_HEADER.size
+
+            with memoryview(history_map)[offset:offset + length] as chunk:
+                payload = zlib.decompress(chunk) if flags & CHUNK_COMPRESSED else bytes(chunk)
+            offset += length
+
+            game_players = scan_chunk(payload, summary, game_players)
+
+    return summary
+
+
+def scan_chunk(payload: bytes, summary: dict, game_players: List[dict]) -> List[dict]:
+    players = summary['players']
+
+    offset = 0
+    while offset < len(payload):
+        (length,) = RECORD_LENGTH.unpack_from(payload, offset)
+        offset += RECORD_LENGTH.size
+        record_type = payload[offset]
+
+        if record_type == GAME_START:
+            game_players = scan_game_start(payload, offset, players)
+            summary['games'] += 1
+        elif record_type == ROUND:
+            scan_round(payload, offset, game_players)
+            summary['rounds'] += 1
+        elif record_type == GAME_END:
+            _, winner, _ = GAME_END_HEADER.unpack_from(payload, offset)
+            game_players[winner]['games_won'] += 1
+
+        offset += length
+
+    return game_players
+
+
+# Return summaries of the players of the game, by player index in the game
+def scan_game_start(payload: bytes, offset: int, players: Dict[str, dict]) -> List[dict]:
+    n_players = GAME_START_HEADER.unpack_from(payload, offset)[3]
+    offset += GAME_START_HEADER.size
+
+    game_players = []
+    for _ in range(n_players):
+        name_length = payload[offset]
+        player = payload[offset + 1:offset + 1 + name_length].decode('utf-8')
+        offset += 1 + name_length
+
+        if player not in players:
+            players[player] = new_player_summary()
+        game_players.append(players[player])
+
+    return game_players
+
+
+def scan_round(payload: bytes, offset: int, game_players: List[dict]):
+    _, _, n_players, small_blind, _ = ROUND_HEADER.unpack_from(payload, offset)
+    offset += ROUND_HEADER.size
+
+    round_players = [game_players[index] for index in payload[offset:offset + n_players]]
+
+    # skip pots and hole cards
+    offset += n_players + 4 * n_players + 2 * n_players
+
+    n_board_cards = payload[offset]
+    offset += 1 + n_board_cards
+
+    (n_actions,) = struct.unpack_from('<H', payload, offset)
+    offset += 2
+
+    voluntary = set()
+    raised = set()
+    folded = set()
+    chips_in = [0] * n_players
+    for _ in range(n_actions):
+        board_state, seat, code, chips = ACTION.unpack_from(payload, offset)
+        offset += ACTION.size
+        if code == OTHER_ACTION:
+            offset += 1 + payload[offset]
+
+        chips_in[seat] += chips
+        if code == FOLD:
+            folded.add(seat)
+        elif board_state == PRE_FLOP and code in (CALL, RAISE):
+            voluntary.add(seat)
+            if code == RAISE:
+                raised.add(seat)
+
+    # skip pot
+    offset += 4
+
+    n_payouts = payload[offset]
+    offset += 1
+
+    chips_out = [0] * n_players
+    for _ in range(n_payouts):
+        seat, chips = PAYOUT.unpack_from(payload, offset)
+        offset += PAYOUT.size
+        chips_out[seat] = chips
+
+    is_showdown = n_board_cards == 5 and n_players - len(folded) > 1
+
+    for (seat, player) in enumerate(round_players):
+        player['hands'] += 1
+        player['vpip'] += seat in voluntary
+        player['pfr'] += seat in raised
+        player['showdowns'] += is_showdown and seat not in folded
+
+        position = player['positions'].setdefault(position_name((seat - small_blind) % n_players),
+                                                  {'rounds': 0, 'wins': 0, 'net_chips': 0})
+        position['rounds'] += 1
+        position['wins'] += chips_out[seat] > 0
+        position['net_chips'] += chips_out[seat] - chips_in[seat]
+
+
+# Return the summary of a hand history file, from its summary file when it is up to date
+def load_summary(path: str, use_index=True) -> dict:
+    summary_path = path + SUMMARY_SUFFIX
+    file_stat = os.stat(path)
+    file_key = {'version': SUMMARY_VERSION, 'size': file_stat.st_size, 'mtime_ns': file_stat.st_mtime_ns}
+
+    if use_index and os.path.exists(summary_path):
+        with open(summary_path) as summary_file:
+            index = json.load(summary_file)
+        if index.get('file') == file_key:
+            return index['summary']
+
+    summary = scan_hand_history(path)
+
+    if use_index:
+        save_summary(summary_path, {'file': file_key, 'summary': summary})
+        LOGGER.debug('Summary of %s is saved to %s', path, summary_path)
+
+    return summary
+
+
+# Write a summary file atomically: requests summarizing the same file at the same time each write their own
+# temporary file, readers only ever see a complete summary file
+def save_summary(summary_path: str, index: dict):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(summary_path) or '.',
+                                    prefix=os.path.basename(summary_path) + '.', suffix=SUMMARY_TMP_SUFFIX)
+    try:
+        with os.fdopen(fd, 'w') as summary_file:
+            json.dump(index, summary_file)
+        os.replace(tmp_path, summary_path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def merge_summaries(summaries: List[dict]) -> dict:
+    merged = new_summary()
+
+    for summary in summaries:
+        merged['games'] += summary['games']
+        merged['rounds'] += summary['rounds']
+
+        for (player, counts) in summary['players'].items():
+            merged_counts = merged['players'].setdefault(player, new_player_summary())
+            for key in ('hands', 'vpip', 'pfr', 'showdowns', 'games_won'):
+                merged_counts[key] += counts[key]
+
+            for (position, position_counts) in counts['positions'].items():
+                merged_position = merged_counts['positions'].setdefault(position,
+                                                                        {'rounds': 0, 'wins': 0, 'net_chips': 0})
+                for key in ('rounds', 'wins', 'net_chips'):
+                    merged_position[key] += position_counts[key]
+
+    return merged
+
+
+# Return hand history files of a directory (or the file itself). Part files of running simulations are skipped
+# and summary files left by removed files are deleted
+def find_hand_histories(path: str) -> List[str]:
+    if not os.path.isdir(path):
+        return [path]
+
+    paths = []
+    for file_name in sorted(os.listdir(path)):
+        file_path = os.path.join(path, file_name)
+        if file_name.endswith(SUMMARY_SUFFIX):
+            if not os.path.exists(file_path[:-len(SUMMARY_SUFFIX)]):
+                remove_orphan_summary(file_path)
+            continue
+        if file_name.endswith(SUMMARY_TMP_SUFFIX) or is_hand_history_part(file_name) or not os.path.isfile(file_path):
+            continue
+
+        with open(file_path, 'rb') as history_file:
+            if history_file.read(len(MAGIC)) == MAGIC:
+                paths.append(file_path)
+
+    return paths
+
+
+def remove_orphan_summary(summary_path: str):
+    try:
+        os.remove(summary_path)
+        LOGGER.debug('Removed summary file of a removed hand history: %s', summary_path)
+    except FileNotFoundError:
+        pass
+
+
+def ratio(count: int, total: int) -> float:
+    return count / total if total else 0.0
+
+
+# Return VPIP, PFR, showdown frequency and results per position of every player
+def hand_history_stats(paths: List[str], players: List[str] = None, use_index=True) -> dict:
+    history_paths = [history_path for path in paths for history_path in find_hand_histories(path)]
+    summary = merge_summaries([load_summary(path, use_index) for path in history_paths])
+
+    player_stats = {}
+    for (player, counts) in sorted(summary['players'].items()):
+        if players and player not in players:
+            continue
+
+        hands = counts['hands']
+        player_stats[player] = {
+            'hands': hands,
+            'games_won': counts['games_won'],
+            'vpip': ratio(counts['vpip'], hands),
+            'pfr': ratio(counts['pfr'], hands),
+            'showdown_frequency': ratio(counts['showdowns'], hands),
+            'positions': {
+                position: {
+                    'rounds': position_counts['rounds'],
+                    'win_rate': ratio(position_counts['wins'], position_counts['rounds']),
+                    'net_chips_per_round': ratio(position_counts['net_chips'], position_counts['rounds'])
+                }
+                for (position, position_counts) in sorted(counts['positions'].items())
+            }
+        }
+
+    return {'files': len(history_paths), 'games': summary['games'], 'rounds': summary['rounds'],
+            'players': player_stats}
+
+
+def main(args: List[str] = None):
+    parser = argparse.ArgumentParser(description='Aggregate player stats over hand history files')
+    parser.add_argument('paths', nargs='+', help='hand history files or directories')
+    parser.add_argument('--players', help='comma separated players to report (default: all)')
+    parser.add_argument('--no-index', action='store_true', help='neither read nor write summary files')
+    args = parser.parse_args(args)
+
+    stats = hand_history_stats(args.paths, players=args.players.split(',') if args.players else None,
+                               use_index=not args.no_index)
+    print(json.dumps(stats, indent=2))
+
+
+if __name__ == '__main__':
+    logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level='INFO')
+    main()
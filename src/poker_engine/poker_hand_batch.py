@@ -0,0 +1,51 @@
+from typing import Sequence
+
+import numpy as np
+
+from src.poker_engine.poker_hand_eval import (
+    CARD_KEYS, FLUSH_SUIT_TABLE, FLUSH_TABLE, RANK_BITS, RANK_KEY_MASK, RANK_TABLE, SUIT_SHIFT
+)
+
+
+# NumPy views of the poker_hand_eval lookup tables. The rank multiset table is a dict there, here it
+# becomes a sorted key array searched with np.searchsorted
+_CARD_RANK_KEYS = np.array([key & RANK_KEY_MASK for key in CARD_KEYS], dtype=np.int64)
+_CARD_SUIT_KEYS = np.array([key >> SUIT_SHIFT for key in CARD_KEYS], dtype=np.int64)
+_CARD_RANK_BITS = np.array(RANK_BITS, dtype=np.int64)
+_CARD_SUITS = np.arange(52, dtype=np.int64) & 3
+
+_FLUSH_SUITS = np.array(FLUSH_SUIT_TABLE, dtype=np.int64)
+_FLUSH_STRENGTHS = np.array(FLUSH_TABLE, dtype=np.int64)
+
+_RANK_KEYS = np.array(sorted(RANK_TABLE), dtype=np.int64)
+_RANK_STRENGTHS = np.array([RANK_TABLE[key] for key in _RANK_KEYS.tolist()], dtype=np.int64)
+
+
+# Return strengths (same values as evaluate_cards) of an (N, 5..7) array of integer-encoded cards
+def evaluate_batch(cards: np.ndarray) -> np.ndarray:
+    cards = np.asarray(cards, dtype=np.int64)
+    if cards.ndim != 2 or not 5 <= cards.shape[1] <= 7:
+        raise ValueError('Expected an (N, 5..7) array of cards, got shape {}'.format(cards.shape))
+
+    # rank histograms and suit counts, packed as base 5 and base 8 digits
+    rank_keys = _CARD_RANK_KEYS[cards].sum(axis=1)
+    suit_keys = _CARD_SUIT_KEYS[cards].sum(axis=1)
+
+    strengths = _RANK_STRENGTHS[np.searchsorted(_RANK_KEYS, rank_keys)]
+
+    flush_suits = _FLUSH_SUITS[suit_keys]
+    is_flush = flush_suits >= 0
+    if is_flush.any():
+        flush_cards = cards[is_flush]
+        in_suit = _CARD_SUITS[flush_cards] == flush_suits[is_flush][:, None]
+        flush_masks = (_CARD_RANK_BITS[flush_cards] * in_suit).sum(axis=1)
+        strengths[is_flush] = _FLUSH_STRENGTHS[flush_masks]
+
+    return strengths
+
+
+# Return strengths of (N, 2) hole cards sharing the same board cards
+def evaluate_board(hole_cards: np.ndarray, board_cards: Sequence[int]) -> np.ndarray:
+    hole_cards = np.asarray(hole_cards, dtype=np.int64)
+    board = np.broadcast_to(np.asarray(board_cards, dtype=np.int64), (len(hole_cards), len(board_cards)))
+    return evaluate_batch(np.concatenate([hole_cards, board], axis=1))
@@ -4,6 +4,8 @@ from typing import List, Tuple
 
 from poker import Card, Combo, Rank
 
+from src.poker_engine.poker_hand_eval import evaluate_cards, cards_to_ints
+
 
 card_order_dict = {
     Rank.DEUCE: 2,
@@ -23,16 +25,27 @@ card_order_dict = {
 
 
 # Return best possible hand from the combination of Deck and Player's hand
-def detect_hand(player_hand: Combo, board_cards: List[Card]) -> Tuple[int, List[Card]]:
+def detect_hand(player_hand: Combo, board_cards: List[Card]) -> Tuple[Card, ...]:
     all_cards = [player_hand.first, player_hand.second] + board_cards
-    hand_combinations = list(combinations(all_cards, 5))
+    all_card_ints = cards_to_ints(all_cards)
+    best_strength = evaluate_cards(all_card_ints)
+
+    # compare_hands keeps the last of equally ranked hands, so search the combinations backwards
+    for indexes in reversed(list(combinations(range(len(all_cards)), 5))):
+        if evaluate_cards([all_card_ints[i] for i in indexes]) == best_strength:
+            return tuple(all_cards[i] for i in indexes)
+
+    raise ValueError('Cannot detect hand from less than 5 cards: {}'.format(all_cards))
 
-    return compare_hands(hand_combinations)
+# Return integer strength of the best possible hand, higher is better
+def hand_strength(player_hand: Combo, board_cards: List[Card]) -> int:
+    return evaluate_cards(cards_to_ints([player_hand.first, player_hand.second] + board_cards))
 
 # Return winner hand
 def compare_hands(hands):
-    hand_scores = [(i, eval_hand(hand)) for i, hand in enumerate(hands)]
-    winner = sorted(hand_scores, key=lambda x: x[1])[-1][0]
+    hand_scores = [evaluate_cards(cards_to_ints(hand)) for hand in hands]
+    best_score = max(hand_scores)
+    winner = len(hand_scores) - 1 - hand_scores[::-1].index(best_score)
 
     return hands[winner]
 
@@ -101,7 +114,7 @@ def eval_hand_ranking(hand):
 def check_royal_flush(hand):
     if check_flush(hand) and check_straight(hand):
         values = [c.rank for c in hand]
-        return bool(set(values).issuperset(set(["T", "J", "Q", "K", "A"])))
+        return bool(set(values).issuperset(set([Rank.TEN, Rank.JACK, Rank.QUEEN, Rank.KING, Rank.ACE])))
     else:
         return False
 
@@ -141,7 +154,7 @@ def check_straight(hand):
         return True
 
     #check straight with low Ace
-    if set(values).issuperset(set(["A", "2", "3", "4", "5"])):
+    if set(values).issuperset(set([Rank.ACE, Rank.DEUCE, Rank.THREE, Rank.FOUR, Rank.FIVE])):
         return True
     return False
 
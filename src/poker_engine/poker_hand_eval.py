@@ -0,0 +1,190 @@
+from itertools import combinations_with_replacement
+from typing import Dict, List, Sequence
+
+from poker import Card, Combo, Rank, Suit
+
+
+# Integer card encoding: card = rank_index * 4 + suit_index, which matches the order of list(Card)
+# (2c, 2d, 2h, 2s, 3c, ..., As), so rank_index = card >> 2 and suit_index = card & 3
+RANKS = list(Rank)
+SUITS = list(Suit)
+CARDS = list(Card)
+CARD_INTS: Dict[Card, int] = {card: i for i, card in enumerate(CARDS)}
+
+# Hand strength is a single integer: category << 20 followed by up to five 4-bit rank nibbles
+# (rank values 2..14, 1 for the low Ace of a 5 high straight). Categories follow eval_hand_ranking,
+# with the royal flush folded into the straight flush
+HIGH_CARD = 1
+ONE_PAIR = 2
+TWO_PAIRS = 3
+THREE_OF_A_KIND = 4
+STRAIGHT = 5
+FLUSH = 6
+FULL_HOUSE = 7
+FOUR_OF_A_KIND = 8
+STRAIGHT_FLUSH = 9
+
+CATEGORY_SHIFT = 20
+
+# Card keys: the low 31 bits count ranks in base 5 (at most 4 cards per rank), the upper bits count
+# suits in base 8 (at most 7 cards per suit), so the sum of the keys of a hand identifies both its
+# rank multiset and its suit distribution
+SUIT_SHIFT = 31
+RANK_KEY_MASK = (1 << SUIT_SHIFT) - 1
+
+CARD_KEYS = [5 ** (c >> 2) + (1 << (SUIT_SHIFT + 3 * (c & 3))) for c in range(52)]
+RANK_BITS = [1 << (c >> 2) for c in range(52)]
+
+
+def _encode(category: int, ranks: Sequence[int]) -> int:
+    strength = category
+    for i in range(5):
+        strength = (strength << 4) | (ranks[i] if i < len(ranks) else 0)
+    return strength
+
+
+def _straight_high(rank_mask: int) -> int:
+    for top in range(12, 3, -1):
+        window = 0b11111 << (top - 4)
+        if rank_mask & window == window:
+            return top + 2
+
+    # straight with low Ace
+    if rank_mask & 0b1000000001111 == 0b1000000001111:
+        return 5
+
+    return 0
+
+
+def _straight_ranks(high: int) -> List[int]:
+    return [high - i for i in range(4)] + [high - 4 if high > 5 else 1]
+
+
+def _mask_ranks(rank_mask: int) -> List[int]:
+    return [r + 2 for r in range(12, -1, -1) if rank_mask >> r & 1]
+
+
+def _build_straight_table() -> List[int]:
+    return [_straight_high(mask) for mask in range(1 << 13)]
+
+
+def _build_flush_table() -> List[int]:
+    table = [0] * (1 << 13)
+    for mask in range(1 << 13):
+        if bin(mask).count('1') < 5:
+            continue
+
+        high = STRAIGHT_TABLE[mask]
+        if high:
+            table[mask] = _encode(STRAIGHT_FLUSH, _straight_ranks(high))
+        else:
+            table[mask] = _encode(FLUSH, _mask_ranks(mask)[:5])
+
+    return table
+
+
+def _build_flush_suit_table() -> List[int]:
+    table = [-1] * (1 << 12)
+    for suit_key in range(1 << 12):
+        for suit in range(4):
+            if (suit_key >> (3 * suit)) & 0b111 >= 5:
+                table[suit_key] = suit
+
+    return table
+
+
+# pylint: disable=too-many-return-statements
+def _rank_multiset_strength(counts: List[int]) -> int:
+    # ranks ordered by (count, rank) descending, the same ordering used by eval_hand
+    grouped = sorted(((cnt, r + 2) for r, cnt in enumerate(counts) if cnt), reverse=True)
+    by_rank = [rank for (_, rank) in sorted(grouped, key=lambda x: x[1], reverse=True)]
+    quads = [rank for (cnt, rank) in grouped if cnt >= 4]
+    trips = [rank for (cnt, rank) in grouped if cnt == 3]
+    pairs = [rank for (cnt, rank) in grouped if cnt == 2]
+
+    if quads:
+        return _encode(FOUR_OF_A_KIND, [quads[0]] + [r for r in by_rank if r != quads[0]][:1])
+
+    if trips and len(trips) + len(pairs) >= 2:
+        return _encode(FULL_HOUSE, [trips[0], sorted(trips[1:] + pairs, reverse=True)[0]])
+
+    high = STRAIGHT_TABLE[sum(1 << (r - 2) for r in by_rank)]
+    if high:
+        return _encode(STRAIGHT, _straight_ranks(high))
+
+    if trips:
+        return _encode(THREE_OF_A_KIND, [trips[0]] + [r for r in by_rank if r != trips[0]][:2])
+
+    if len(pairs) >= 2:
+        return _encode(TWO_PAIRS, pairs[:2] + [r for r in by_rank if r not in pairs[:2]][:1])
+
+    if pairs:
+        return _encode(ONE_PAIR, [pairs[0]] + [r for r in by_rank if r != pairs[0]][:3])
+
+    return _encode(HIGH_CARD, by_rank[:5])
+
+
+def _build_rank_table() -> Dict[int, int]:
+    table = {}
+    powers = [5 ** r for r in range(13)]
+
+    for size in (5, 6, 7):
+        for ranks in combinations_with_replacement(range(13), size):
+            # skip impossible multisets with more than 4 cards of the same rank
+            if any(ranks[i] == ranks[i + 4] for i in range(size - 4)):
+                continue
+
+            key = sum(powers[r] for r in ranks)
+            if size == 5:
+                counts = [0] * 13
+                for r in ranks:
+                    counts[r] += 1
+                table[key] = _rank_multiset_strength(counts)
+            else:
+                # best hand of n cards is the best hand among its (n - 1) card subsets
+                table[key] = max(table[key - powers[r]] for r in set(ranks))
+
+    return table
+
+
+# Lookup tables, built once at import
+STRAIGHT_TABLE = _build_straight_table()
+FLUSH_TABLE = _build_flush_table()
+FLUSH_SUIT_TABLE = _build_flush_suit_table()
+RANK_TABLE = _build_rank_table()
+
+
+# Return integer strength of the best 5 card hand among 5 to 7 integer-encoded cards
+def evaluate_cards(cards: Sequence[int]) -> int:
+    key = sum(map(CARD_KEYS.__getitem__, cards))
+    flush_suit = FLUSH_SUIT_TABLE[key >> SUIT_SHIFT]
+
+    if flush_suit < 0:
+        return RANK_TABLE[key & RANK_KEY_MASK]
+
+    return FLUSH_TABLE[sum([RANK_BITS[c] for c in cards if c & 3 == flush_suit])]
+
+
+# Return hand category (HIGH_CARD..STRAIGHT_FLUSH) of a hand strength
+def strength_category(strength: int) -> int:
+    return strength >> CATEGORY_SHIFT
+
+
+def card_to_int(card: Card) -> int:
+    return CARD_INTS[card]
+
+
+def cards_to_ints(cards: Sequence[Card]) -> List[int]:
+    return [CARD_INTS[card] for card in cards]
+
+
+def int_to_card(card: int) -> Card:
+    return CARDS[card]
+
+
+def ints_to_cards(cards: Sequence[int]) -> List[Card]:
+    return [CARDS[card] for card in cards]
+
+
+def ints_to_combo(first: int, second: int) -> Combo:
+    return Combo.from_cards(CARDS[first], CARDS[second])
@@ -0,0 +1,364 @@
+import os
+import re
+import shutil
+import struct
+import zlib
+from typing import BinaryIO, Dict, Generator, List, NamedTuple, Optional, Tuple, Union
+
+from src.models.betting_state import BOARD_STATES, BettingState
+from src.models.game_round import GameRound
+
+
+# File layout: MAGIC, VERSION, then chunks of (flags, payload length, payload). A payload, zlib compressed
+# when flags has CHUNK_COMPRESSED, is a sequence of records, each one prefixed by its length.
+# Records of a file are only appended, so files (without their header) can be concatenated
+MAGIC = b'PKHH'
+VERSION = 1
+
+FILE_HEADER = struct.Struct('<4sB')
+CHUNK_HEADER = struct.Struct('<BI')
+RECORD_LENGTH = struct.Struct('<I')
+
+CHUNK_COMPRESSED = 1
+
+# Records are buffered until a chunk of buffer_size bytes can be written
+DEFAULT_BUFFER_SIZE = 1 << 16
+
+# Files written while a simulation runs, merged into (or renamed to) the hand history file at the end
+PART_PATTERN = re.compile(r'\.part\d+$')
+
+GAME_START = 1
+ROUND = 2
+GAME_END = 3
+
+GAME_START_HEADER = struct.Struct('<BIIB')      # type, init_pot, small_blind_stake, number of players
+ROUND_HEADER = struct.Struct('<BHBBB')          # type, round pos, number of players, small blind, big blind seats
+GAME_END_HEADER = struct.Struct('<BBH')         # type, winner, number of rounds
+ACTION = struct.Struct('<BBBI')                 # board state, seat, action, chips
+PAYOUT = struct.Struct('<BI')                   # seat, chips
+
+# Largest values of the fields: strings (player and action names) are prefixed by a 1 byte length, players are
+# counted and referenced by 1 byte, round positions and action counts are 2 bytes, chips 4 bytes
+MAX_STRING_LENGTH = 0xFF
+MAX_PLAYERS = 0xFF
+MAX_ROUND_POS = 0xFFFF
+MAX_ACTIONS = 0xFFFF
+MAX_CHIPS = 0xFFFFFFFF
+
+ACTIONS = ['small_blind', 'big_blind', 'fold', 'check', 'call', 'raise']
+ACTION_CODES = {action: code for (code, action) in enumerate(ACTIONS)}
+
+# actions unknown to the engine (sent by an agent) are kept by name
+OTHER_ACTION = 255
+
+
+class GameStartRecord(NamedTuple):
+    players: List[str]
+    init_pot: int
+    small_blind_stake: int
+    seed: Optional[int]
+
+
+class RoundRecord(NamedTuple):
+    pos: int
+    players: List[str]                          # players of the round, in seat order
+    player_pots: List[int]                      # chips at the start of the round
+    player_hands: List[Tuple[int, int]]
+    small_blind: str
+    big_blind: str
+    board_cards: List[int]
+    actions: List[Tuple[str, str, str, int]]    # (board state, player, action, chips) in the order of play
+    pot: int
+    payouts: Dict[str, int]
+
+
+class GameEndRecord(NamedTuple):
+    winner: str
+    rounds: int
+
+
+HandHistoryRecord = Union[GameStartRecord, RoundRecord, GameEndRecord]
+
+
+# Values out of the range of their field are rejected with a ValueError before anything of their record is written.
+# With players, they are validated before the file is created
+class HandHistoryWriter:
+
+    def __init__(self, path: str, compress=True, buffer_size=DEFAULT_BUFFER_SIZE, players: List[str] = None):
+        if players is not None:
+            validate_hand_history_players(players)
+
+        self._path = path
+        self._compress = compress
+        self._buffer_size = buffer_size
+        self._buffer = bytearray()
+        self._game_players: Dict[str, int] = {}
+
+        self._file = open(path, 'wb')
+        self._file.write(FILE_HEADER.pack(MAGIC, VERSION))
+
+    @property
+    def path(self):
+        return self._path
+
+    def write_game_start(self, players: List[str], init_pot: int, small_blind_stake: int, seed: int = None):
+        validate_hand_history_players(players)
+        check_range('init_pot', init_pot, MAX_CHIPS)
+        check_range('small_blind_stake', small_blind_stake, MAX_CHIPS)
+
+        self._game_players = {player: index for (index, player) in enumerate(players)}
+
+        record = bytearray(GAME_START_HEADER.pack(GAME_START, init_pot, small_blind_stake, len(players)))
+        for player in players:
+            record += pack_string(player)
+
+        # seeds are arbitrary integers, stored as signed little endian bytes (no bytes for no seed)
+        seed_bytes = b'' if seed is None else seed.to_bytes(seed.bit_length() // 8 + 1, 'little', signed=True)
+        record += bytes([len(seed_bytes)]) + seed_bytes
+
+        self._write_record(record)
+
+    def write_round(self, game_round: GameRound, betting_states: List[BettingState], round_payouts: Dict[str, int]):
+        players = game_round.players
+        actions = [(BOARD_STATES.index(betting_state.board_state), player, player_action)
+                   for betting_state in betting_states for (player, player_action) in betting_state.action_history]
+
+        check_range('round pos', game_round.pos, MAX_ROUND_POS)
+        check_range('number of actions', len(actions), MAX_ACTIONS)
+        for player_pot in game_round.player_pots:
+            check_range('player pot', player_pot, MAX_CHIPS)
+        for (_, _, (_, chips)) in actions:
+            check_range('action chips', chips, MAX_CHIPS)
+        check_range('pot', betting_states[-1].get_round_total_pot(), MAX_CHIPS)
+        for chips in round_payouts.values():
+            check_range('payout', chips, MAX_CHIPS)
+
+        record = bytearray(ROUND_HEADER.pack(ROUND, game_round.pos, len(players),
+                                             game_round.get_seat(game_round.small_blind),
+                                             game_round.get_seat(game_round.big_blind)))
+        record += bytes(self._game_players[player] for player in players)
+        record += struct.pack('<{}I'.format(len(players)), *game_round.player_pots)
+        record += bytes(card for player_hand in game_round.player_hands for card in player_hand)
+
+        board_cards = betting_states[-1].board_cards
+        record += bytes([len(board_cards)]) + bytes(board_cards)
+
+        record += struct.pack('<H', len(actions))
+        for (board_state, player, (action, chips)) in actions:
+            code = ACTION_CODES.get(action, OTHER_ACTION)
+            record += ACTION.pack(board_state, game_round.get_seat(player), code, chips)
+            if code == OTHER_ACTION:
+                record += pack_string(str(action))
+
+        record += struct.pack('<I', betting_states[-1].get_round_total_pot())
+        record += bytes([len(round_payouts)])
+        for (player, chips) in round_payouts.items():
+            record += PAYOUT.pack(game_round.get_seat(player), chips)
+
+        self._write_record(record)
+
+    def write_game_end(self, winner: str, rounds: int):
+        check_range('number of rounds', rounds, MAX_ROUND_POS)
+        self._write_record(GAME_END_HEADER.pack(GAME_END, self._game_players[winner], rounds))
+
+    def _write_record(self, record: bytes):
+        self._buffer += RECORD_LENGTH.pack(len(record))
+        self._buffer += record
+
+        if len(self._buffer) >= self._buffer_size:
+            self.flush()
+
+    def flush(self):
+        if not self._buffer:
+            return
+
+        if self._compress:
+            payload = zlib.compress(bytes(self._buffer))
+            self._file.write(CHUNK_HEADER.pack(CHUNK_COMPRESSED, len(payload)))
+        else:
+            payload = self._buffer
+            self._file.write(CHUNK_HEADER.pack(0, len(payload)))
+
+        self._file.write(payload)
+        self._file.flush()
+        self._buffer = bytearray()
+
+    def close(self):
+        self.flush()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+# Return records of a hand history file one by one, only one chunk is held in memory at a time
+def read_hand_history(path: str) -> Generator[HandHistoryRecord, None, None]:
+    with open(path, 'rb') as history_file:
+        read_file_header(history_file, path)
+
+        game_players: List[str] = []
+        for payload in read_chunks(history_file):
+            offset = 0
+            while offset < len(payload):
+                (length,) = RECORD_LENGTH.unpack_from(payload, offset)
+                offset += RECORD_LENGTH.size
+
+                record = decode_record(payload, offset, game_players)
+                offset += length
+
+                if isinstance(record, GameStartRecord):
+                    game_players = record.players
+                yield record
+
+
+def read_file_header(history_file: BinaryIO, path: str):
+    header = history_file.read(FILE_HEADER.size)
+    if len(header) < FILE_HEADER.size:
+        raise ValueError('Not a hand history file: {}'.format(path))
+
+    magic, version = FILE_HEADER.unpack(header)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError('Not a hand history file (version {}): {}'.format(VERSION, path))
+
+
+def read_chunks(history_file: BinaryIO) -> Generator[bytes, None, None]:
+    while True:
+        chunk_header = history_file.read(CHUNK_HEADER.size)
+        if not chunk_header:
+            return
+
+        flags, length = CHUNK_HEADER.unpack(chunk_header)
+        payload = history_file.read(length)
+        if len(payload) < length:
+            raise ValueError('Truncated hand history chunk')
+
+        yield zlib.decompress(payload) if flags & CHUNK_COMPRESSED else payload
+
+
+def decode_record(payload: bytes, offset: int, game_players: List[str]) -> HandHistoryRecord:
+    record_type = payload[offset]
+
+    if record_type == GAME_START:
+        _, init_pot, small_blind_stake, n_players = GAME_START_HEADER.unpack_from(payload, offset)
+        offset += GAME_START_HEADER.size
+
+        players = []
+        for _ in range(n_players):
+            player, offset = unpack_string(payload, offset)
+            players.append(player)
+
+        seed_length = payload[offset]
+        seed = int.from_bytes(payload[offset + 1:offset + 1 + seed_length], 'little', signed=True) \
+            if seed_length else None
+
+        return GameStartRecord(players, init_pot, small_blind_stake, seed)
+
+    if record_type == ROUND:
+        return decode_round(payload, offset, game_players)
+
+    if record_type == GAME_END:
+        _, winner, rounds = GAME_END_HEADER.unpack_from(payload, offset)
+        return GameEndRecord(game_players[winner], rounds)
+
+    raise ValueError('Unknown hand history record type: {}'.format(record_type))
+
+
+def decode_round(payload: bytes, offset: int, game_players: List[str]) -> RoundRecord:
+    _, pos, n_players, small_blind, big_blind = ROUND_HEADER.unpack_from(payload, offset)
+    offset += ROUND_HEADER.size
+
+    players = [game_players[index] for index in payload[offset:offset + n_players]]
+    offset += n_players
+
+    player_pots = list(struct.unpack_from('<{}I'.format(n_players), payload, offset))
+    offset += 4 * n_players
+
+    hand_cards = payload[offset:offset + 2 * n_players]
+    player_hands = [(hand_cards[i], hand_cards[i + 1]) for i in range(0, 2 * n_players, 2)]
+    offset += 2 * n_players
+
+    n_board_cards = payload[offset]
+    board_cards = list(payload[offset + 1:offset + 1 + n_board_cards])
+    offset += 1 + n_board_cards
+
+    (n_actions,) = struct.unpack_from('<H', payload, offset)
+    offset += 2
+
+    actions = []
+    for _ in range(n_actions):
+        board_state, seat, code, chips = ACTION.unpack_from(payload, offset)
+        offset += ACTION.size
+
+        if code == OTHER_ACTION:
+            action, offset = unpack_string(payload, offset)
+        else:
+            action = ACTIONS[code]
+        actions.append((BOARD_STATES[board_state], players[seat], action, chips))
+
+    (pot,) = struct.unpack_from('<I', payload, offset)
+    offset += 4
+
+    n_payouts = payload[offset]
+    offset += 1
+
+    payouts = {}
+    for _ in range(n_payouts):
+        seat, chips = PAYOUT.unpack_from(payload, offset)
+        offset += PAYOUT.size
+        payouts[players[seat]] = chips
+
+    return RoundRecord(pos, players, player_pots, player_hands, players[small_blind], players[big_blind],
+                       board_cards, actions, pot, payouts)
+
+
+# Raise a ValueError for players that cannot be written to a hand history file
+def validate_hand_history_players(players: List[str]):
+    if len(players) > MAX_PLAYERS:
+        raise ValueError('A hand history records at most {} players, got {}'.format(MAX_PLAYERS, len(players)))
+
+    for player in players:
+        if len(player.encode('utf-8')) > MAX_STRING_LENGTH:
+            raise ValueError('A hand history records player names of at most {} bytes: {}...'.format(
+                MAX_STRING_LENGTH, player[:32]))
+
+
+def check_range(name: str, value: int, max_value: int):
+    if not 0 <= value <= max_value:
+        raise ValueError('Hand history {} must be between 0 and {}, got {}'.format(name, max_value, value))
+
+
+def pack_string(value: str) -> bytes:
+    encoded = value.encode('utf-8')
+    if len(encoded) > MAX_STRING_LENGTH:
+        raise ValueError('Hand history strings are at most {} bytes: {}...'.format(MAX_STRING_LENGTH, value[:32]))
+    return bytes([len(encoded)]) + encoded
+
+
+def unpack_string(payload: bytes, offset: int) -> Tuple[str, int]:
+    length = payload[offset]
+    return payload[offset + 1:offset + 1 + length].decode('utf-8'), offset + 1 + length
+
+
+def hand_history_part_path(path: str, index: int) -> str:
+    return '{}.part{}'.format(path, index)
+
+
+def is_hand_history_part(path: str) -> bool:
+    return PART_PATTERN.search(path) is not None
+
+
+# Concatenate hand history files, e.g. written by parallel workers, into one file
+def merge_hand_histories(paths: List[str], output_path: str, remove=False):
+    with open(output_path, 'wb') as output_file:
+        output_file.write(FILE_HEADER.pack(MAGIC, VERSION))
+
+        for path in paths:
+            with open(path, 'rb') as history_file:
+                read_file_header(history_file, path)
+                shutil.copyfileobj(history_file, output_file)
+
+            if remove:
+                os.remove(path)
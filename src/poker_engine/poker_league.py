@@ -0,0 +1,398 @@
+import argparse
+import functools
+import itertools
+import json
+import logging
+import math
+import random
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, wait
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+
+from src.metrics import REGISTRY
+from src.poker_engine.poker_simulator import derive_game_seeds, start_new_game
+from src.poker_engine.poker_tournament import seat_players
+from src.poker_engine.poker_worker_pool import worker_pool
+
+
+LOGGER = logging.getLogger(__name__)
+
+LEAGUE_GAMES = REGISTRY.counter('poker_league_games_total', 'Games played in league matchups')
+LEAGUE_MATCHUPS = REGISTRY.counter('poker_league_matchups_total', 'League matchups finished, by reason',
+                                   ('reason',))
+
+# Elo scale of the ratings: 400 points is a 10 to 1 expected score
+ELO_SCALE = 400 / math.log(10)
+ELO_MEAN = 1500
+
+# z of the two-sided 95% confidence intervals of the leaderboard
+CI_Z = 1.96
+
+# Two-sided false stop rate of a matchup between equal players, over all the looks of the matchup
+DEFAULT_ALPHA = 0.01
+
+
+class Matchup:
+
+    def __init__(self, index: int, lineup: List[str], seed: int, max_games: int):
+        self._index = index
+        self._lineup = lineup
+        self._game_seeds = derive_game_seeds(seed, max_games)
+        self._games = 0
+        self._wins = {player: 0 for player in lineup}
+        self._stop_reason = None
+
+    @property
+    def index(self):
+        return self._index
+
+    @property
+    def lineup(self):
+        return self._lineup
+
+    @property
+    def games(self):
+        return self._games
+
+    @property
+    def wins(self):
+        return self._wins
+
+    @property
+    def stop_reason(self):
+        return self._stop_reason
+
+    @property
+    def is_finished(self):
+        return self._stop_reason is not None
+
+    # Return (first game, seeds) of the next batch of games
+    def next_batch(self, batch_size: int) -> Tuple[int, List[int]]:
+        return self._games, self._game_seeds[self._games:self._games + batch_size]
+
+    # boundaries: z to beat after a given number of games (see sequential_boundaries), no look at other counts
+    def add_results(self, wins: Dict[str, int], games: int, boundaries: Dict[int, float]):
+        self._games += games
+        for (player, win_count) in wins.items():
+            self._wins[player] += win_count
+
+        if self._games in boundaries and is_significant(self._wins, boundaries[self._games]):
+            self._stop_reason = 'significant'
+        elif self._games >= len(self._game_seeds):
+            self._stop_reason = 'max_games'
+
+    def stop(self, reason: str):
+        self._stop_reason = reason
+
+    def to_dict(self):
+        return {'lineup': self._lineup, 'games': self._games, 'wins': dict(self._wins), 'stopped': self._stop_reason}
+
+
+# Return lineups of the league: every heads-up pair, then for every larger table size, n_way_rounds random
+# seatings of all players at tables of that size
+def enumerate_matchups(players: List[str], table_sizes=(2,), n_way_rounds=1, seed: int = None) -> List[List[str]]:
+    rng = random.Random(seed)
+    lineups = []
+
+    for table_size in table_sizes:
+        if table_size == 2:
+            lineups.extend(list(pair) for pair in itertools.combinations(players, 2))
+            continue
+
+        for _ in range(n_way_rounds):
+            seating = list(players)
+            rng.shuffle(seating)
+            lineups.extend(table for table in seat_players(seating, table_size) if len(table) > 1)
+
+    return lineups
+
+
+def validate_league(players: List[str], table_sizes: List[int], n_way_rounds: int, min_games: int, max_games: int,
+                    batch_size: int = 10):
+    if len(set(players)) != len(players) or len(players) < 2:
+        raise ValueError('A league needs at least 2 distinct players')
+    if not table_sizes or min(table_sizes) < 2:
+        raise ValueError('Tables need at least 2 seats')
+    if n_way_rounds < 1:
+        raise ValueError('n_way_rounds must be at least 1')
+    if batch_size < 1:
+        raise ValueError('batch_size must be at least 1')
+    if not 1 <= min_games <= max_games <= MAX_LEAGUE_GAMES:
+        raise ValueError('Games of a matchup must verify 1 <= min_games <= max_games <= {}'.format(MAX_LEAGUE_GAMES))
+
+
+# Return True when the leader of the matchup wins significantly more often than the runner-up: sign test on
+# the games won by either of them, so that heads-up matchups are tested on every game
+def is_significant(wins: Dict[str, int], z: float) -> bool:
+    first, second = sorted(wins.values(), reverse=True)[:2]
+    if first + second == 0:
+        return False
+
+    return (first - second) / math.sqrt(first + second) >= z
+
+
+# Null matchups simulated to calibrate the early stopping boundary, and their fixed seed
+BOUNDARY_PATHS = 40000
+BOUNDARY_SEED = 0
+
+# Games of a matchup at most, the boundary calibration holds every look of BOUNDARY_PATHS matchups in memory
+MAX_LEAGUE_GAMES = 2000
+
+
+# Return the z boundary of every look of a matchup (after every batch, from min_games on). The boundary is
+# constant over the looks (Pocock) and calibrated on BOUNDARY_PATHS simulated matchups of equal players, with
+# the very statistic of is_significant, so that such a matchup stops early with probability alpha over all its
+# looks, leader and runner-up picking included
+@functools.lru_cache(maxsize=32)
+def sequential_boundaries(min_games: int, max_games: int, batch_size: int, table_size: int = 2,
+                          alpha: float = DEFAULT_ALPHA) -> Dict[int, float]:
+    looks = [games for games in list(range(batch_size, max_games, batch_size)) + [max_games] if games >= min_games]
+    if not looks:
+        return {}
+
+    rng = np.random.default_rng(BOUNDARY_SEED)
+    batch_games = np.diff([0] + [games for games in range(batch_size, max_games, batch_size)] + [max_games])
+    max_z = []
+
+    for paths in np.array_split(np.arange(BOUNDARY_PATHS), max(1, BOUNDARY_PATHS // 5000)):
+        # wins of every player after every batch, every game won by one player of the table
+        batch_wins = np.stack([rng.multinomial(games, [1 / table_size] * table_size, size=len(paths))
+                               for games in batch_games], axis=1)
+        wins = np.cumsum(batch_wins, axis=1)[:, [games in looks for games in np.cumsum(batch_games)]]
+
+        top_wins = np.sort(wins, axis=2)[:, :, -2:]
+        decided = top_wins.sum(axis=2)
+        z = np.where(decided > 0, (top_wins[:, :, 1] - top_wins[:, :, 0]) / np.sqrt(np.maximum(decided, 1)), 0.0)
+        max_z.append(z.max(axis=1))
+
+    # the smallest boundary crossed by at most alpha of the paths
+    max_z = np.sort(np.concatenate(max_z))
+    boundary = float(np.nextafter(max_z[int(np.ceil(len(max_z) * (1 - alpha))) - 1], np.inf))
+    return {games: boundary for games in looks}
+
+
+# Play games of a matchup, seats rotate by one every game so that every player plays every position
+def play_matchup_batch(lineup: List[str], init_pot: int, small_blind_stake: int, use_local: bool,
+                       first_game: int, game_seeds: List[int]) -> Dict[str, int]:
+    wins = {player: 0 for player in lineup}
+
+    for (game, game_seed) in enumerate(game_seeds, start=first_game):
+        rotation = game % len(lineup)
+        winner = start_new_game(players=lineup[rotation:] + lineup[:rotation], init_pot=init_pot,
+                                small_blind_stake=small_blind_stake, use_local=use_local, seed=game_seed)
+        wins[winner] += 1
+
+    LEAGUE_GAMES.inc(len(game_seeds))
+    return wins
+
+
+# play_matchup_batch for worker processes: metrics collected by the worker are returned to be merged by the parent
+def play_matchup_batch_with_metrics(*args) -> Tuple[Dict[str, int], dict]:
+    # a worker runs several tasks, every task returns only its own metrics
+    REGISTRY.reset()
+    wins = play_matchup_batch(*args)
+    return wins, REGISTRY.snapshot()
+
+
+# Return pairwise results of the matchups: a game won by a player is won against every other player of the table
+def pairwise_results(matchups: List[Matchup]) -> Tuple[Dict[Tuple[str, str], int], Dict[Tuple[str, str], int]]:
+    pair_wins: Dict[Tuple[str, str], int] = {}
+    pair_games: Dict[Tuple[str, str], int] = {}
+
+    for matchup in matchups:
+        for (player, opponent) in itertools.permutations(matchup.lineup, 2):
+            pair_wins[(player, opponent)] = pair_wins.get((player, opponent), 0) + matchup.wins[player]
+            pair_games[(player, opponent)] = pair_games.get((player, opponent), 0) + matchup.games
+
+    return pair_wins, pair_games
+
+
+# Return Elo-scaled Bradley-Terry ratings and their standard errors, fitted with minorization-maximization.
+# Every pair that played gets half a win each way, so that players without wins keep a finite rating
+def fit_ratings(players: List[str], pair_wins: Dict[Tuple[str, str], int], pair_games: Dict[Tuple[str, str], int],
+                iterations=500, tolerance=1e-9) -> Dict[str, Tuple[float, float]]:
+    opponents = {player: [] for player in players}
+    for ((player, opponent), games) in pair_games.items():
+        if games > 0:
+            opponents[player].append(opponent)
+
+    # two players are compared on the games won by either of them
+    comparisons = {pair: pair_wins[pair] + pair_wins[(pair[1], pair[0])] + 1 for pair in pair_games if pair_games[pair]}
+    total_wins = {player: sum(pair_wins[(player, opponent)] + 0.5 for opponent in opponents[player])
+                  for player in players}
+
+    strengths = {player: 1.0 for player in players}
+    for _ in range(iterations):
+        new_strengths = {}
+        for player in players:
+            denominator = sum(comparisons[(player, opponent)] / (strengths[player] + strengths[opponent])
+                              for opponent in opponents[player])
+            new_strengths[player] = total_wins[player] / denominator if denominator else 1.0
+
+        # strengths are only defined up to a factor, their geometric mean is kept at 1
+        log_mean = sum(math.log(strength) for strength in new_strengths.values()) / len(players)
+        new_strengths = {player: strength / math.exp(log_mean) for (player, strength) in new_strengths.items()}
+
+        change = max(abs(new_strengths[player] - strengths[player]) / strengths[player] for player in players)
+        strengths = new_strengths
+        if change < tolerance:
+            break
+
+    ratings = {}
+    for player in players:
+        information = sum(comparisons[(player, opponent)] * strengths[player] * strengths[opponent] /
+                          (strengths[player] + strengths[opponent]) ** 2 for opponent in opponents[player])
+        standard_error = ELO_SCALE / math.sqrt(information) if information else float('inf')
+        ratings[player] = (ELO_MEAN + ELO_SCALE * math.log(strengths[player]), standard_error)
+
+    return ratings
+
+
+# Return players ranked by rating, with 95% confidence intervals
+def build_leaderboard(players: List[str], matchups: List[Matchup]) -> List[dict]:
+    pair_wins, pair_games = pairwise_results(matchups)
+    ratings = fit_ratings(players, pair_wins, pair_games)
+
+    games = {player: 0 for player in players}
+    wins = {player: 0 for player in players}
+    for matchup in matchups:
+        for player in matchup.lineup:
+            games[player] += matchup.games
+            wins[player] += matchup.wins[player]
+
+    leaderboard = []
+    for (player, (rating, standard_error)) in sorted(ratings.items(), key=lambda item: -item[1][0]):
+        leaderboard.append({
+            'player': player,
+            'rating': round(rating, 1),
+            'ci_low': round(rating - CI_Z * standard_error, 1) if math.isfinite(standard_error) else None,
+            'ci_high': round(rating + CI_Z * standard_error, 1) if math.isfinite(standard_error) else None,
+            'games': games[player],
+            'wins': wins[player]
+        })
+
+    return leaderboard
+
+
+# Play a round-robin league: matchups (see enumerate_matchups) are played in batches of batch_size games on a
+# process pool, one batch per matchup at a time. A matchup stops once its leader is significantly ahead (after
+# min_games, sign test against the sequential boundaries of alpha) or after max_games. on_update gets the
+# leaderboard at most every update_interval seconds. Results only depend on the seed, whatever the number of workers
+def run_league(players: List[str], table_sizes=(2,), n_way_rounds=1, init_pot=100, small_blind_stake=5,
+               min_games=20, max_games=200, batch_size=10, alpha=DEFAULT_ALPHA, use_local=True, seed: int = None,
+               workers=1,
+               on_update: Callable[[dict], None] = None, is_cancelled: Callable[[], bool] = None,
+               update_interval=1.0) -> dict:
+    validate_league(players, table_sizes, n_way_rounds, min_games, max_games, batch_size)
+
+    start_time = time.perf_counter()
+    rng = random.Random(seed)
+    matchups = [Matchup(index, lineup, rng.getrandbits(64), max_games)
+                for (index, lineup) in enumerate(enumerate_matchups(players, table_sizes, n_way_rounds,
+                                                                    rng.getrandbits(64)))]
+    LOGGER.info('New league: %d players, %d matchups', len(players), len(matchups))
+
+    # the boundaries only depend on the number of players of a matchup
+    boundaries = {len(matchup.lineup): sequential_boundaries(min_games, max_games, batch_size, len(matchup.lineup),
+                                                             alpha)
+                  for matchup in matchups}
+
+    def batch_args(matchup: Matchup) -> tuple:
+        first_game, game_seeds = matchup.next_batch(batch_size)
+        return matchup.lineup, init_pot, small_blind_stake, use_local, first_game, game_seeds
+
+    last_update = time.perf_counter()
+
+    def add_batch_results(matchup: Matchup, wins: Dict[str, int]):
+        nonlocal last_update
+        matchup.add_results(wins, sum(wins.values()), boundaries[len(matchup.lineup)])
+        if matchup.is_finished:
+            LEAGUE_MATCHUPS.inc(labels=(matchup.stop_reason,))
+
+        # ratings are fitted on all the results, so they are not refreshed after every batch
+        if on_update and time.perf_counter() - last_update >= update_interval:
+            on_update(league_progress(players, matchups))
+            last_update = time.perf_counter()
+
+    if workers > 1:
+        with worker_pool(workers) as executor:
+            pending = {executor.submit(play_matchup_batch_with_metrics, *batch_args(matchup)): matchup
+                       for matchup in matchups}
+
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    matchup = pending.pop(future)
+                    wins, batch_metrics = future.result()
+                    REGISTRY.merge(batch_metrics)
+                    add_batch_results(matchup, wins)
+
+                    if not matchup.is_finished and not (is_cancelled and is_cancelled()):
+                        pending[executor.submit(play_matchup_batch_with_metrics, *batch_args(matchup))] = matchup
+
+                if is_cancelled and is_cancelled():
+                    for future in pending:
+                        future.cancel()
+                    break
+    else:
+        queue = deque(matchups)
+        while queue and not (is_cancelled and is_cancelled()):
+            matchup = queue.popleft()
+            add_batch_results(matchup, play_matchup_batch(*batch_args(matchup)))
+            if not matchup.is_finished:
+                queue.append(matchup)
+
+    for matchup in matchups:
+        if not matchup.is_finished:
+            matchup.stop('cancelled')
+
+    result = league_progress(players, matchups)
+    result['matchups'] = [matchup.to_dict() for matchup in matchups]
+
+    elapsed = time.perf_counter() - start_time
+    LOGGER.info('End league: %d games in %.1fs, %d of %d matchups stopped early, leader is %s',
+                result['games'], elapsed, result['stopped_early'], len(matchups), result['leaderboard'][0]['player'])
+    return result
+
+
+def league_progress(players: List[str], matchups: List[Matchup]) -> dict:
+    return {
+        'matchups': len(matchups),
+        'matchups_finished': sum(matchup.is_finished for matchup in matchups),
+        'stopped_early': sum(matchup.stop_reason == 'significant' for matchup in matchups),
+        'games': sum(matchup.games for matchup in matchups),
+        'leaderboard': build_leaderboard(players, matchups)
+    }
+
+
+def main(args: List[str] = None):
+    parser = argparse.ArgumentParser(description='Play a round-robin league and print the leaderboard')
+    parser.add_argument('--players', required=True, help='comma separated players')
+    parser.add_argument('--table-sizes', default='2', help='comma separated table sizes, 2 for heads-up pairs')
+    parser.add_argument('--n-way-rounds', type=int, default=1, help='seatings per table size larger than 2')
+    parser.add_argument('--init-pot', type=int, default=100)
+    parser.add_argument('--small-blind-stake', type=int, default=5)
+    parser.add_argument('--min-games', type=int, default=20)
+    parser.add_argument('--max-games', type=int, default=200)
+    parser.add_argument('--batch-size', type=int, default=10)
+    parser.add_argument('--alpha', type=float, default=DEFAULT_ALPHA,
+                        help='early stopping rate of a matchup between equal players')
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--remote', action='store_true', help='call agent containers instead of local agents')
+    args = parser.parse_args(args)
+
+    result = run_league(args.players.split(','), table_sizes=[int(size) for size in args.table_sizes.split(',')],
+                        n_way_rounds=args.n_way_rounds, init_pot=args.init_pot,
+                        small_blind_stake=args.small_blind_stake, min_games=args.min_games,
+                        max_games=args.max_games, batch_size=args.batch_size, alpha=args.alpha, use_local=not args.remote,
+                        seed=args.seed, workers=args.workers)
+    print(json.dumps(result['leaderboard'], indent=2))
+
+
+if __name__ == '__main__':
+    logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level='INFO')
+    main()
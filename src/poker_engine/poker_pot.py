@@ -0,0 +1,43 @@
+from typing import Dict, List, Tuple
+
+
+# Return pots as (chips, eligible players) from the chips every player committed in a round.
+# Each all-in level of the players still in the hand closes a pot, folded players' chips are added to the
+# pots but folded players are never eligible. `contenders` are the players still in the hand, in seat order
+def build_side_pots(player_chips: Dict[str, int], contenders: List[str]) -> List[Tuple[int, List[str]]]:
+    levels = sorted(set(player_chips[player] for player in contenders if player_chips.get(player, 0) > 0))
+
+    pots = []
+    previous_level = 0
+    for level in levels:
+        chips = sum(min(committed, level) - min(committed, previous_level) for committed in player_chips.values())
+        eligible = [player for player in contenders if player_chips.get(player, 0) >= level]
+        pots.append((chips, eligible))
+        previous_level = level
+
+    # chips of folded players above the biggest contender's bet go to the last pot
+    leftover = sum(max(committed - previous_level, 0) for committed in player_chips.values())
+    if leftover:
+        if pots:
+            chips, eligible = pots[-1]
+            pots[-1] = (chips + leftover, eligible)
+        else:
+            pots.append((leftover, list(contenders)))
+
+    return pots
+
+
+# Return chips won by every player: each pot is split between its eligible players holding the strongest hand,
+# odd chips go to the first winners in seat order
+def split_pots(pots: List[Tuple[int, List[str]]], player_strengths: Dict[str, int]) -> Dict[str, int]:
+    payouts: Dict[str, int] = {}
+
+    for (chips, eligible) in pots:
+        best_strength = max(player_strengths[player] for player in eligible)
+        winners = [player for player in eligible if player_strengths[player] == best_strength]
+
+        share, odd_chips = divmod(chips, len(winners))
+        for i, winner in enumerate(winners):
+            payouts[winner] = payouts.get(winner, 0) + share + (1 if i < odd_chips else 0)
+
+    return payouts
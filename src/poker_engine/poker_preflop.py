@@ -0,0 +1,106 @@
+import argparse
+import logging
+import os
+from functools import lru_cache
+from typing import List, Tuple
+
+import numpy as np
+from poker import Combo
+
+from src.poker_engine.poker_equity import equity
+from src.poker_engine.poker_hand_eval import CARDS, card_to_int
+from src.poker_engine.poker_worker_pool import worker_pool
+
+
+LOGGER = logging.getLogger(__name__)
+
+MAX_OPPONENTS = 9
+
+# Canonical starting hands on a 13x13 grid of rank indexes: pairs on the diagonal,
+# suited hands at [high][low] and offsuit hands at [low][high]
+PREFLOP_HANDS = 13 * 13
+
+PREFLOP_TABLE_PATH = os.path.join(os.path.dirname(__file__), 'data', 'preflop_equity.npy')
+
+
+# Return canonical starting hand index (0..168) of a Combo
+def preflop_hand_index(hole: Combo) -> int:
+    first, second = card_to_int(hole.first), card_to_int(hole.second)
+    high, low = max(first >> 2, second >> 2), min(first >> 2, second >> 2)
+
+    if (first & 3) == (second & 3):
+        return high * 13 + low
+
+    return low * 13 + high
+
+
+# Return a Combo representing a canonical starting hand index
+def preflop_hand_combo(index: int) -> Combo:
+    row, column = divmod(index, 13)
+    high, low = max(row, column), min(row, column)
+
+    # clubs for the high card, clubs (suited) or diamonds (pair and offsuit) for the low card
+    low_suit = 0 if row > column else 1
+    return Combo.from_cards(CARDS[high * 4], CARDS[low * 4 + low_suit])
+
+
+# Return precomputed equity of a starting hand against 1..9 random opponents
+def preflop_equity(hole: Combo, n_opponents: int) -> float:
+    if not 1 <= n_opponents <= MAX_OPPONENTS:
+        raise ValueError('Invalid number of opponents: {}'.format(n_opponents))
+
+    return float(load_preflop_table()[preflop_hand_index(hole), n_opponents - 1])
+
+
+# Return the (169, 9) equity table, memory-mapped from disk on first use
+@lru_cache(maxsize=None)
+def load_preflop_table(path: str = PREFLOP_TABLE_PATH) -> np.ndarray:
+    if not os.path.exists(path):
+        raise FileNotFoundError('Preflop equity table not found: {} (run `make build-preflop-table`)'.format(path))
+
+    return np.load(path, mmap_mode='r')
+
+
+def build_preflop_table(samples=50000, seed=0, workers=1) -> np.ndarray:
+    cells = [(index, n_opponents) for index in range(PREFLOP_HANDS) for n_opponents in range(1, MAX_OPPONENTS + 1)]
+    table = np.zeros((PREFLOP_HANDS, MAX_OPPONENTS), dtype=np.float32)
+
+    with worker_pool(workers) as executor:
+        cell_equities = executor.map(compute_preflop_cell, cells, [samples] * len(cells), [seed] * len(cells),
+                                     chunksize=MAX_OPPONENTS)
+
+        for (index, n_opponents), cell_equity in zip(cells, cell_equities):
+            table[index, n_opponents - 1] = cell_equity
+
+            if n_opponents == MAX_OPPONENTS:
+                LOGGER.info('Preflop equity of %s: %s', preflop_hand_combo(index), table[index].tolist())
+
+    return table
+
+
+def compute_preflop_cell(cell: Tuple[int, int], samples: int, seed: int) -> float:
+    index, n_opponents = cell
+    return equity(preflop_hand_combo(index), [], n_opponents, samples=samples,
+                  seed=seed * PREFLOP_HANDS * MAX_OPPONENTS + index * MAX_OPPONENTS + n_opponents).equity
+
+
+def save_preflop_table(table: np.ndarray, path: str = PREFLOP_TABLE_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    np.save(path, table.astype(np.float32))
+    LOGGER.info('Preflop equity table is saved to %s', path)
+
+
+def main(args: List[str] = None):
+    parser = argparse.ArgumentParser(description='Build the preflop equity table of the 169 starting hands')
+    parser.add_argument('--samples', type=int, default=50000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--output', default=PREFLOP_TABLE_PATH)
+    args = parser.parse_args(args)
+
+    save_preflop_table(build_preflop_table(samples=args.samples, seed=args.seed, workers=args.workers), args.output)
+
+
+if __name__ == '__main__':
+    logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level='INFO')
+    main()
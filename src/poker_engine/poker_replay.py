@@ -0,0 +1,174 @@
+import argparse
+import logging
+from typing import Callable, Generator, Iterator, List, Tuple
+
+from src.poker_engine.poker_agent import agent_call_action
+from src.poker_engine.poker_hand_history import GameEndRecord, GameStartRecord, RoundRecord, read_hand_history
+from src.poker_engine.poker_simulator import play_game
+
+
+LOGGER = logging.getLogger(__name__)
+
+# posted by the engine, not decided by agents
+BLIND_ACTIONS = ('small_blind', 'big_blind')
+
+ActionSource = Callable[[str, List[Tuple[str, int, int]]], Tuple[str, int]]
+
+
+class RecordedGame:
+
+    def __init__(self, game_start: GameStartRecord, rounds: List[RoundRecord], game_end: GameEndRecord):
+        self._game_start = game_start
+        self._rounds = rounds
+        self._game_end = game_end
+
+    @property
+    def game_start(self):
+        return self._game_start
+
+    @property
+    def rounds(self):
+        return self._rounds
+
+    @property
+    def game_end(self):
+        return self._game_end
+
+    # Return pots of all players of the game at the start of a round
+    def get_player_pots(self, round_pos: int) -> List[int]:
+        round_record = self.get_round(round_pos)
+        round_player_pots = dict(zip(round_record.players, round_record.player_pots))
+        return [round_player_pots.get(player, 0) for player in self._game_start.players]
+
+    def get_round(self, round_pos: int) -> RoundRecord:
+        for round_record in self._rounds:
+            if round_record.pos == round_pos:
+                return round_record
+
+        raise ValueError('Round {} is not recorded, the game has {} rounds'.format(round_pos, len(self._rounds)))
+
+
+# Return a game of a hand history file, games are counted from 0 in the order they were recorded
+def load_recorded_game(path: str, game_index=0) -> RecordedGame:
+    current_index = -1
+    game_start, rounds = None, []
+
+    for record in read_hand_history(path):
+        if isinstance(record, GameStartRecord):
+            current_index += 1
+            game_start, rounds = record, []
+        elif current_index == game_index:
+            if isinstance(record, RoundRecord):
+                rounds.append(record)
+            else:
+                return RecordedGame(game_start, rounds, record)
+
+    raise ValueError('Game {} is not recorded in {}'.format(game_index, path))
+
+
+# Replay a game from its seed: decks are the same as in the original game, actions are asked to the agents
+# (or to `action_source`) from start_round on. start_player_pots are the pots at the start of start_round
+def replay_game(players: List[str], init_pot: int, small_blind_stake: int, seed: int, use_local=True,
+                max_rounds=100, start_round=0, start_player_pots: List[int] = None,
+                action_source: ActionSource = None) -> str:
+    if start_round > 0 and not start_player_pots:
+        raise ValueError('Player pots at the start of round {} are needed to fast-forward'.format(start_round))
+
+    if action_source is None:
+        def action_source(player, valid_actions):
+            return agent_call_action(player=player, valid_actions=valid_actions, use_local=use_local)
+
+    game = play_game(players=players, init_pot=init_pot, small_blind_stake=small_blind_stake, max_rounds=max_rounds,
+                     seed=seed, start_round=start_round, start_player_pots=start_player_pots)
+
+    try:
+        player, valid_actions = next(game)
+        while True:
+            player_action = action_source(player, valid_actions)
+            LOGGER.debug('Replay decision: player=%s valid_actions=%s action=%s', player, valid_actions, player_action)
+            player, valid_actions = game.send(player_action)
+    except StopIteration as game_end:
+        return game_end.value
+
+
+# Replay a recorded game from round start_round on, previous rounds are skipped using the recorded pots.
+# By default the recorded actions are replayed (and checked against the engine), with use_agents the agents
+# are asked again, e.g. to reproduce the behaviour of an agent in the same spot
+def replay_recorded_game(path: str, game_index=0, start_round=0, use_agents=False, use_local=True,
+                         max_rounds=100) -> str:
+    recorded_game = load_recorded_game(path, game_index)
+    game_start = recorded_game.game_start
+
+    if game_start.seed is None:
+        raise ValueError('Game {} of {} has no seed and cannot be replayed'.format(game_index, path))
+
+    action_source = None
+    if not use_agents:
+        action_source = recorded_action_source(
+            round_record for round_record in recorded_game.rounds if round_record.pos >= start_round)
+
+    winner = replay_game(
+        players=game_start.players, init_pot=game_start.init_pot, small_blind_stake=game_start.small_blind_stake,
+        seed=game_start.seed, use_local=use_local, max_rounds=max_rounds, start_round=start_round,
+        start_player_pots=recorded_game.get_player_pots(start_round) if start_round > 0 else None,
+        action_source=action_source
+    )
+
+    if not use_agents and winner != recorded_game.game_end.winner:
+        raise ValueError('Replay diverged: winner is {}, recorded winner is {}'.format(
+            winner, recorded_game.game_end.winner))
+
+    LOGGER.info('Replayed game %d of %s from round %d, winner is %s', game_index, path, start_round, winner)
+    return winner
+
+
+# Return an action source answering decisions with the recorded actions, in the recorded order
+def recorded_action_source(round_records: Iterator[RoundRecord]) -> ActionSource:
+    recorded_decisions = recorded_player_actions(round_records)
+
+    def next_action(player: str, valid_actions: List[Tuple[str, int, int]]) -> Tuple[str, int]:
+        round_pos, recorded_player, player_action = next(recorded_decisions, (None, None, None))
+        if recorded_player != player:
+            raise ValueError('Replay diverged at round {}: {} is asked to act, recorded action is from {}'.format(
+                round_pos, player, recorded_player))
+
+        return player_action
+
+    return next_action
+
+
+def recorded_player_actions(round_records: Iterator[RoundRecord]) -> Generator[Tuple[int, str, Tuple[str, int]],
+                                                                               None, None]:
+    for round_record in round_records:
+        for (_, player, action, chips) in round_record.actions:
+            if action not in BLIND_ACTIONS:
+                yield round_record.pos, player, (action, chips)
+
+
+def main(args: List[str] = None):
+    parser = argparse.ArgumentParser(description='Replay a game from a hand history file or from a seed')
+    parser.add_argument('--history', help='hand history file written by the simulator')
+    parser.add_argument('--game', type=int, default=0, help='index of the game in the hand history file')
+    parser.add_argument('--seed', type=int, help='seed of the game, to replay without hand history')
+    parser.add_argument('--players', help='comma separated players, to replay from a seed')
+    parser.add_argument('--init-pot', type=int, default=100)
+    parser.add_argument('--small-blind-stake', type=int, default=5)
+    parser.add_argument('--round', type=int, default=0, help='fast-forward to this round (hand history only)')
+    parser.add_argument('--use-agents', action='store_true', help='ask the agents instead of replaying actions')
+    parser.add_argument('--remote', action='store_true', help='call agent containers instead of local agents')
+    args = parser.parse_args(args)
+
+    if args.history:
+        replay_recorded_game(args.history, game_index=args.game, start_round=args.round,
+                             use_agents=args.use_agents, use_local=not args.remote)
+    elif args.seed is not None and args.players:
+        winner = replay_game(args.players.split(','), args.init_pot, args.small_blind_stake, args.seed,
+                             use_local=not args.remote)
+        LOGGER.info('Replayed game with seed %d, winner is %s', args.seed, winner)
+    else:
+        parser.error('either --history or --seed and --players are required')
+
+
+if __name__ == '__main__':
+    logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level='INFO')
+    main()
@@ -1,61 +1,207 @@
 import logging
 import random
-from typing import List, Tuple
-
-from poker import Card
+import time
+from functools import partial
+from typing import Dict, Generator, List, Tuple
 
+from src.metrics import REGISTRY
 from src.models.game import Game
 from src.models.game_result import GameResult
 from src.models.game_round import GameRound
 from src.models.game_state import GameState
-from src.models.betting_state import BettingState
+from src.models.betting_state import BOARD_STATES, BettingState
 
 from src.poker_engine.poker_agent import agent_call_action
+from src.poker_engine.poker_deck import Deck
+from src.poker_engine.poker_hand_eval import ints_to_cards
+from src.poker_engine.poker_hand_history import HandHistoryWriter, hand_history_part_path, merge_hand_histories, \
+    validate_hand_history_players
+from src.poker_engine.poker_worker_pool import worker_pool
 
 
 LOGGER = logging.getLogger(__name__)
 
+GAMES = REGISTRY.counter('poker_games_total', 'Games played')
+DECISIONS = REGISTRY.counter('poker_decisions_total', 'Player decisions')
+ROUNDS_PER_GAME = REGISTRY.histogram('poker_game_rounds', 'Rounds played per game',
+                                     buckets=(1, 2, 5, 10, 20, 30, 50, 75, 100))
+STREET_SECONDS = REGISTRY.histogram('poker_street_seconds', 'Time spent per betting state, agent calls included',
+                                    label_names=('street',))
+
+
+# With metrics_path, metrics of the whole process are written there in the Prometheus text format at the end.
+# With hand_history_path, every round is recorded there (see poker_hand_history)
+def start_simulation(players: List[str], init_pot=100, small_blind_stake=5, max_iterations=100, use_local=True,
+                     seed: int = None, workers: int = 1, metrics_path: str = None, hand_history_path: str = None):
+    if hand_history_path:
+        validate_hand_history_players(players)
+
+    game_seeds = derive_game_seeds(seed, max_iterations)
+    start_time = time.perf_counter()
+    start_decisions = DECISIONS.value()
+
+    if workers > 1:
+        chunk_size = max(1, -(-max_iterations // (workers * 4)))
+        chunks = [game_seeds[i:i + chunk_size] for i in range(0, max_iterations, chunk_size)]
+
+        run_chunk = partial(run_games_with_metrics, players, init_pot, small_blind_stake, use_local)
+
+        # every chunk records its own file, merged in the order of the games at the end
+        chunk_history_paths = [hand_history_part_path(hand_history_path, i) if hand_history_path else None
+                               for i in range(len(chunks))]
+
+        chunk_histograms = []
+        with worker_pool(workers) as executor:
+            for (chunk_histogram, chunk_metrics) in executor.map(run_chunk, chunks, chunk_history_paths):
+                chunk_histograms.append(chunk_histogram)
+                REGISTRY.merge(chunk_metrics)
+
+        if hand_history_path:
+            merge_hand_histories(chunk_history_paths, hand_history_path, remove=True)
+    else:
+        chunk_histograms = [run_games(players, init_pot, small_blind_stake, use_local, game_seeds, hand_history_path)]
 
-def start_simulation(players: List[str], init_pot=100, small_blind_stake=5, max_iterations=100, use_local=True):
     histogram = {player: 0 for player in players}
-    for _ in range(max_iterations):
-        winner = start_new_game(
-            players=players, init_pot=init_pot,
-            small_blind_stake=small_blind_stake,
-            use_local=use_local
-        )
-        histogram[winner] += 1
+    for chunk_histogram in chunk_histograms:
+        for (player, win_count) in chunk_histogram.items():
+            histogram[player] += win_count
+
+    log_simulation_result(histogram, max_iterations)
+
+    elapsed = time.perf_counter() - start_time
+    LOGGER.info('Simulation throughput: %.1f games/s, %.1f decisions/s',
+                max_iterations / elapsed, (DECISIONS.value() - start_decisions) / elapsed)
+
+    if metrics_path:
+        with open(metrics_path, 'w') as metrics_file:
+            metrics_file.write(REGISTRY.render())
+        LOGGER.info('Simulation metrics are written to %s', metrics_path)
+
+    return histogram
 
+
+# Every game gets its own seed derived from the master seed, so results only depend on the seed
+def derive_game_seeds(seed: int, max_iterations: int) -> List[int]:
+    seed_generator = random.Random(seed) if seed is not None else random
+    return [seed_generator.getrandbits(64) for _ in range(max_iterations)]
+
+
+def log_simulation_result(histogram: Dict[str, int], max_iterations: int):
     histogram_percentage = {player: str(win_count * 100/max_iterations)
                                     + '%' for (player, win_count) in histogram.items()}
 
     LOGGER.info('End simulation. Winners are: %s', histogram_percentage)
+
+
+def run_games(players: List[str], init_pot: int, small_blind_stake: int, use_local: bool,
+              game_seeds: List[int], hand_history_path: str = None) -> Dict[str, int]:
+    hand_history = HandHistoryWriter(hand_history_path, players=players) if hand_history_path else None
+
+    histogram = {player: 0 for player in players}
+    try:
+        for game_seed in game_seeds:
+            winner = start_new_game(
+                players=players, init_pot=init_pot,
+                small_blind_stake=small_blind_stake,
+                use_local=use_local, seed=game_seed,
+                hand_history=hand_history
+            )
+            histogram[winner] += 1
+    finally:
+        if hand_history:
+            hand_history.close()
+
     return histogram
 
 
-def start_new_game(players: List[str], init_pot=100, small_blind_stake=5, max_rounds=100, use_local=True):
+# run_games for worker processes: metrics collected by the worker are returned to be merged by the parent
+def run_games_with_metrics(players: List[str], init_pot: int, small_blind_stake: int, use_local: bool,
+                           game_seeds: List[int], hand_history_path: str = None) -> Tuple[Dict[str, int], dict]:
+    # a worker runs several tasks, every task returns only its own metrics
+    REGISTRY.reset()
+    histogram = run_games(players, init_pot, small_blind_stake, use_local, game_seeds, hand_history_path)
+    return histogram, REGISTRY.snapshot()
+
+
+def start_new_game(players: List[str], init_pot=100, small_blind_stake=5, max_rounds=100, use_local=True,
+                   seed: int = None, hand_history: HandHistoryWriter = None):
+    game = play_game(players=players, init_pot=init_pot, small_blind_stake=small_blind_stake,
+                     max_rounds=max_rounds, seed=seed, hand_history=hand_history)
+
+    try:
+        player, valid_actions = next(game)
+        while True:
+            player_action = agent_call_action(player=player, valid_actions=valid_actions, use_local=use_local)
+            player, valid_actions = game.send(player_action)
+    except StopIteration as game_end:
+        return game_end.value
+
+
+# Game loop as a generator: yields (player, valid_actions) for every decision, expects the player action
+# to be sent back and returns the winner. Drivers decide how agents are called (see start_new_game).
+# A game is fully determined by its seed and the player actions. To resume a game at start_round, give the
+# player pots at the start of that round: the deck is fast-forwarded without playing the previous rounds
+def play_game(players: List[str], init_pot=100, small_blind_stake=5, max_rounds=100, seed: int = None,
+              hand_history: HandHistoryWriter = None, start_round=0,
+              start_player_pots: List[int] = None) -> Generator[Tuple[str, List[Tuple[str, int, int]]],
+                                                                Tuple[str, int], str]:
     new_game = Game(players=players, init_pot=init_pot, small_blind_stake=small_blind_stake)
 
-    LOGGER.info('New game: %s', new_game)
+    # unseeded games get a seed as well, so that they can be replayed
+    if seed is None:
+        seed = random.getrandbits(64)
+
+    LOGGER.info('New game (seed=%d): %s', seed, new_game)
 
     game_result = GameResult(None)
 
     game_state = GameState(
         players=players,
-        player_pots=[init_pot for _ in range(len(players))]
+        player_pots=start_player_pots or [init_pot for _ in range(len(players))]
     )
 
     LOGGER.debug('New game state: %s', game_state)
 
-    # test with only max_rounds
-    for pos in range(max_rounds):
+    if hand_history:
+        hand_history.write_game_start(players, init_pot, small_blind_stake, seed)
+
+    deck = Deck(random.Random(seed))
+
+    # dealing does not move cards in the deck, so the deck only depends on the number of shuffles
+    for _ in range(start_round):
+        deck.shuffle()
+
+    rounds = yield from play_rounds(game_state, small_blind_stake, deck, range(start_round, max_rounds), hand_history)
+
+    if len(game_state.remaining_players) == 1:
+        game_result.set_winner(game_state.remaining_players[0])
+    else:
+        # determine winner in the remaining players by number of chips
+        game_result.set_winner(game_state.get_player_with_most_chips())
+
+    GAMES.inc()
+    ROUNDS_PER_GAME.observe(rounds)
+
+    if hand_history:
+        hand_history.write_game_end(game_result.winner, rounds)
+
+    LOGGER.debug('End game. Winner is %s', game_result.winner)
+    return game_result.winner
+
+
+# Play the rounds at positions round_positions until one player is left, return the number of rounds played.
+# Blinds move with the round position, the deck is shuffled once per round
+def play_rounds(game_state: GameState, small_blind_stake: int, deck: Deck, round_positions: range,
+                hand_history: HandHistoryWriter = None):
+    rounds = 0
+
+    for pos in round_positions:
 
         if len(game_state.remaining_players) == 1:
-            game_result.set_winner(game_state.remaining_players[0])
             break
 
-        deck = list(Card)
-        random.shuffle(deck)
+        rounds += 1
+        deck.shuffle()
 
         game_round = GameRound(
             pos=pos, small_blind=game_state.get_small_blind_player(pos),
@@ -68,64 +214,43 @@ def start_new_game(players: List[str], init_pot=100, small_blind_stake=5, max_ro
 
         LOGGER.debug('New game round: %s', game_round)
 
-        state_index = -1
-        board_cards: List[Card] = []
+        betting_states = yield from play_round(game_round, game_state, deck)
+        round_payouts = round_complete(game_state, *betting_states)
 
-        # pre-flop state
-        state_index = state_index + 1
-        next_move, pre_flop_state = game_state_move(state_index, "pre-flop", board_cards,
-                                                    game_round, game_state, None, use_local)
+        if hand_history:
+            hand_history.write_round(game_round, betting_states, round_payouts)
 
-        if not next_move:
-            round_complete(game_state, pre_flop_state)
-            continue
-
-        # post-flop state
-        board_cards.extend([deck.pop() for __ in range(3)])
-        LOGGER.debug('Board cards: %s', board_cards)
+    return rounds
 
-        state_index = state_index + 1
-        next_move, post_flop_state = game_state_move(state_index, "post-flop", board_cards,
-                                                     game_round, game_state, pre_flop_state, use_local)
 
-        if not next_move:
-            round_complete(game_state, pre_flop_state, post_flop_state)
-            continue
+# Play the betting states of a round until it is complete, return the betting states played
+def play_round(game_round: GameRound, game_state: GameState, deck: Deck):
+    board_cards: List[int] = []
+    betting_states: List[BettingState] = []
 
-        # turn state
-        board_cards.extend([deck.pop() for __ in range(1)])
-        LOGGER.debug('Board cards: %s', board_cards)
+    for (state_index, board_state) in enumerate(BOARD_STATES):
+        if board_state == 'post-flop':
+            board_cards.extend(deck.deal_many(3))
+            log_board_cards(board_cards)
+        elif board_state in ('turn', 'river'):
+            board_cards.append(deck.deal())
+            log_board_cards(board_cards)
 
-        state_index = state_index + 1
-        next_move, turn_state = game_state_move(state_index, "turn", board_cards,
-                                                game_round, game_state, post_flop_state, use_local)
+        next_move, betting_state = yield from game_state_move(state_index, board_state, board_cards, game_round,
+                                                              game_state,
+                                                              betting_states[-1] if betting_states else None)
+        betting_states.append(betting_state)
 
         if not next_move:
-            round_complete(game_state, pre_flop_state, post_flop_state, turn_state)
-            continue
-
-        # river state
-        board_cards.extend([deck.pop() for __ in range(1)])
-        LOGGER.debug('Board cards: %s', board_cards)
-
-        state_index = state_index + 1
-        next_move, river_state = game_state_move(state_index, "river", board_cards,
-                                                 game_round, game_state, turn_state, use_local)
-
-        round_complete(game_state, pre_flop_state, post_flop_state, turn_state, river_state)
-
-    if not game_result.winner:
-        # determine winner in the remaining players by number of chips
-        game_result.set_winner(game_state.get_player_with_most_chips())
+            break
 
-    LOGGER.debug('End game. Winner is %s', game_result.winner)
-    return game_result.winner
+    return betting_states
 
 
-def game_state_move(state_index: int, board_state: str, board_cards: List[Card],
-                    game_round: GameRound, game_state: GameState, previous_betting_state: BettingState,
-                    use_local: bool):
+def game_state_move(state_index: int, board_state: str, board_cards: List[int],
+                    game_round: GameRound, game_state: GameState, previous_betting_state: BettingState):
 
+    start_time = time.perf_counter()
     has_next_move = True
     remaining_players = previous_betting_state.remaining_players if previous_betting_state else game_round.players
 
@@ -134,16 +259,13 @@ def game_state_move(state_index: int, board_state: str, board_cards: List[Card],
                                  previous_state=previous_betting_state)
 
     if betting_state.is_pre_flop_state():
-        betting_state.add_player_action(game_round.small_blind, ('small_blind', game_round.small_blind_stake))
-        betting_state.add_player_action(game_round.big_blind, ('big_blind', game_round.small_blind_stake*2))
-
-        game_state.update_player_pot(game_round.small_blind, -game_round.small_blind_stake)
-        game_state.update_player_pot(game_round.big_blind, -game_round.small_blind_stake*2)
+        post_blind(game_round.small_blind, 'small_blind', game_round.small_blind_stake, betting_state, game_state)
+        post_blind(game_round.big_blind, 'big_blind', game_round.small_blind_stake*2, betting_state, game_state)
 
     player_index = game_round.get_first_moving_player_index()
     while not betting_state.is_betting_state_complete():
 
-        player_move(player_index, game_round, betting_state, game_state, use_local)
+        yield from player_move(player_index, game_round, betting_state, game_state)
 
         player_index = player_index - 1
         if player_index < 0:
@@ -152,26 +274,45 @@ def game_state_move(state_index: int, board_state: str, board_cards: List[Card],
     if betting_state.is_round_complete():
         has_next_move = False
 
+    STREET_SECONDS.observe(time.perf_counter() - start_time, (board_state,))
+
     return has_next_move, betting_state
 
 
-def round_complete(game_state: GameState, *betting_states: List[BettingState]):
+def post_blind(player: str, blind: str, stake: int, betting_state: BettingState, game_state: GameState):
+    # a short-stacked player posts what is left and is all-in
+    player_pot = game_state.get_player_pot(player)
+    chip = min(stake, player_pot)
+
+    betting_state.add_player_action(player, (blind, chip), is_all_in=chip == player_pot)
+    game_state.update_player_pot(player, -chip)
+
+
+def round_complete(game_state: GameState, *betting_states: BettingState) -> Dict[str, int]:
     final_betting_state = betting_states[-1]
     LOGGER.debug('Round complete at betting state: %s', final_betting_state.board_state)
 
-    round_winner = final_betting_state.get_round_winner()
+    round_payouts = final_betting_state.get_round_payouts()
     round_total_pot = final_betting_state.get_round_total_pot()
 
-    LOGGER.debug('Round winner: %s', round_winner)
+    LOGGER.debug('Round payouts: %s', round_payouts)
     LOGGER.debug('Round total pot: %d', round_total_pot)
 
-    game_state.update_player_pot(round_winner, round_total_pot)
+    for (player, chip_amount) in round_payouts.items():
+        game_state.update_player_pot(player, chip_amount)
 
     LOGGER.debug('Updated game state: %s', game_state)
+    return round_payouts
+
+
+def log_board_cards(board_cards: List[int]):
+    # cards are only materialized for logging
+    if LOGGER.isEnabledFor(logging.DEBUG):
+        LOGGER.debug('Board cards: %s', ints_to_cards(board_cards))
 
 
 def player_move(player_index: int, game_round: GameRound, betting_state: BettingState,
-                game_state: GameState, use_local: bool):
+                game_state: GameState):
 
     player = game_round.players[player_index]
     player_pot = game_state.get_player_pot(player)
@@ -181,8 +322,14 @@ def player_move(player_index: int, game_round: GameRound, betting_state: Betting
         small_blind_stake=game_round.small_blind_stake
     )
     if valid_actions:
-        player_action = agent_call_action(player=player, valid_actions=valid_actions, use_local=use_local)
-        betting_state.add_player_action(player, player_action)
+        action, chip = yield (player, valid_actions)
+        DECISIONS.inc()
+
+        # players cannot bet more chips than they have
+        player_action = (action, min(chip, player_pot))
+        is_all_in = action in ('call', 'raise') and player_action[1] == player_pot
+
+        betting_state.add_player_action(player, player_action, is_all_in=is_all_in)
 
         execute_player_action(player, player_action, game_state)
 
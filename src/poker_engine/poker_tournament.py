@@ -0,0 +1,242 @@
+import argparse
+import json
+import logging
+import random
+import time
+from typing import Callable, Dict, List, NamedTuple, Tuple
+
+from src.metrics import REGISTRY
+from src.models.game_state import GameState
+from src.poker_engine.poker_agent import agent_call_action
+from src.poker_engine.poker_deck import Deck
+from src.poker_engine.poker_simulator import play_rounds
+from src.poker_engine.poker_worker_pool import worker_pool
+
+
+LOGGER = logging.getLogger(__name__)
+
+TOURNAMENTS = REGISTRY.counter('poker_tournaments_total', 'Tournaments played')
+TABLE_SEGMENTS = REGISTRY.counter('poker_tournament_table_segments_total', 'Table segments played in tournaments')
+TABLE_MOVES = REGISTRY.counter('poker_tournament_table_moves_total', 'Players moved by table breaking and balancing')
+
+# Small blind stakes of the blind levels, past the last level the small blind doubles every level
+DEFAULT_BLIND_LEVELS = (5, 10, 15, 25, 50, 75, 100, 150, 200, 300, 400, 600, 800, 1000)
+
+
+class TableSegmentResult(NamedTuple):
+    player_pots: List[int]
+    bust_hands: Dict[str, int]      # hand of the segment (from 1) at which a player ran out of chips
+    hands: int
+
+
+# Return the small blind stake of a level
+def level_small_blind(level: int, blind_levels: Tuple[int, ...] = DEFAULT_BLIND_LEVELS) -> int:
+    if level < len(blind_levels):
+        return blind_levels[level]
+
+    return blind_levels[-1] * 2 ** (level - len(blind_levels) + 1)
+
+
+# Play a multi-table tournament: players are seated at tables of table_size, every table plays hands_per_segment
+# hands (in parallel with workers), then busted players are removed, tables are broken and balanced and the blind
+# level follows the tournament clock (hands_per_level hands per level). Return the places, winner first
+def run_tournament(players: List[str], starting_stack=1000, table_size=9, blind_levels=DEFAULT_BLIND_LEVELS,
+                   hands_per_level=20, hands_per_segment=10, use_local=True, seed: int = None, workers: int = 1,
+                   max_hands: int = None, on_segment: Callable[[dict], None] = None,
+                   is_cancelled: Callable[[], bool] = None) -> dict:
+    validate_tournament(players, table_size, hands_per_level, hands_per_segment)
+
+    start_time = time.perf_counter()
+    rng = random.Random(seed)
+
+    seating = list(players)
+    rng.shuffle(seating)
+    tables = seat_players(seating, table_size)
+    table_positions = [0 for _ in tables]
+    stacks = {player: starting_stack for player in players}
+
+    # busted players, first busted first
+    eliminated: List[str] = []
+    clock = 0
+    segments = 0
+    moves = 0
+
+    executor = worker_pool(workers) if workers > 1 else None
+    try:
+        while len(tables) > 1 or len(tables[0]) > 1:
+            if is_cancelled and is_cancelled():
+                break
+            if max_hands is not None and clock >= max_hands:
+                LOGGER.info('Tournament stopped after %d hands, remaining players are ranked by chips', clock)
+                break
+
+            level = clock // hands_per_level
+            small_blind_stake = level_small_blind(level, blind_levels)
+
+            table_args = [(table_players, [stacks[player] for player in table_players], small_blind_stake,
+                           table_position, hands_per_segment, use_local, rng.getrandbits(64))
+                          for (table_players, table_position) in zip(tables, table_positions)]
+
+            if executor:
+                results = []
+                for (result, segment_metrics) in executor.map(play_table_segment_with_metrics, *zip(*table_args)):
+                    results.append(result)
+                    REGISTRY.merge(segment_metrics)
+            else:
+                results = [play_table_segment(*args) for args in table_args]
+
+            busted = []
+            for (table_players, result) in zip(tables, results):
+                for (player, player_pot) in zip(table_players, result.player_pots):
+                    # busted players of the segment are ranked by bust hand, then by chips before the segment
+                    if player_pot == 0:
+                        busted.append((result.bust_hands[player], stacks[player], player))
+                    stacks[player] = player_pot
+
+            eliminated.extend(player for (_, _, player) in sorted(busted))
+
+            table_positions = [position + result.hands for (position, result) in zip(table_positions, results)]
+            tables, table_positions, segment_moves = balance_tables(tables, table_positions, stacks, table_size)
+
+            clock += hands_per_segment
+            segments += 1
+            moves += segment_moves
+            TABLE_SEGMENTS.inc(len(results))
+            TABLE_MOVES.inc(segment_moves)
+
+            progress = {'segments': segments, 'hands': clock, 'level': level, 'small_blind_stake': small_blind_stake,
+                        'players_left': sum(len(table_players) for table_players in tables), 'tables': len(tables)}
+            LOGGER.info('Tournament progress: %s', progress)
+            if on_segment:
+                on_segment(progress)
+    finally:
+        if executor:
+            executor.shutdown()
+
+    remaining = sorted((player for table_players in tables for player in table_players),
+                       key=lambda player: -stacks[player])
+    places = remaining + eliminated[::-1]
+
+    TOURNAMENTS.inc()
+    elapsed = time.perf_counter() - start_time
+    LOGGER.info('End tournament. Winner is %s after %d hands (%d segments, %.1fs)', places[0], clock, segments, elapsed)
+
+    return {
+        'places': places,
+        'hands': clock,
+        'segments': segments,
+        'level': clock // hands_per_level,
+        'table_moves': moves,
+        'is_complete': len(remaining) == 1,
+        'stacks': {player: stacks[player] for player in remaining}
+    }
+
+
+def validate_tournament(players: List[str], table_size: int, hands_per_level: int, hands_per_segment: int):
+    if len(set(players)) != len(players) or len(players) < 2:
+        raise ValueError('A tournament needs at least 2 distinct players')
+    if table_size < 2:
+        raise ValueError('Tables need at least 2 seats')
+    if hands_per_level < 1 or hands_per_segment < 1:
+        raise ValueError('hands_per_level and hands_per_segment must be at least 1')
+
+
+# Return tables of at most table_size seats, with the same number of players give or take one
+def seat_players(players: List[str], table_size: int) -> List[List[str]]:
+    n_tables = -(-len(players) // table_size)
+    return [players[i::n_tables] for i in range(n_tables)]
+
+
+# Remove busted players, break the smallest tables while the others have enough free seats, then move players
+# from the largest to the smallest tables until tables differ by one player at most. Return the new tables,
+# their positions and the number of players moved
+def balance_tables(tables: List[List[str]], table_positions: List[int], stacks: Dict[str, int],
+                   table_size: int) -> Tuple[List[List[str]], List[int], int]:
+    tables = [[player for player in table_players if stacks[player] > 0] for table_players in tables]
+    table_positions = [position for (table_players, position) in zip(tables, table_positions) if table_players]
+    tables = [table_players for table_players in tables if table_players]
+
+    moves = 0
+    n_tables = -(-sum(len(table_players) for table_players in tables) // table_size)
+
+    while len(tables) > n_tables:
+        broken_index = min(range(len(tables)), key=lambda index: len(tables[index]))
+        broken_table = tables.pop(broken_index)
+        table_positions.pop(broken_index)
+
+        for player in broken_table:
+            min(tables, key=len).append(player)
+            moves += 1
+
+    while max(len(table_players) for table_players in tables) - min(len(table_players) for table_players in tables) > 1:
+        source_index = max(range(len(tables)), key=lambda index: len(tables[index]))
+        target = min(tables, key=len)
+
+        # the player due for the next big blind moves, so that nobody skips the blinds
+        source = tables[source_index]
+        target.append(source.pop((table_positions[source_index] + 1) % len(source)))
+        moves += 1
+
+    return tables, table_positions, moves
+
+
+# Play up to hands hands at a table, blinds start from the table position
+def play_table_segment(players: List[str], player_pots: List[int], small_blind_stake: int, table_position: int,
+                       hands: int, use_local: bool, seed: int) -> TableSegmentResult:
+    game_state = GameState(players=players, player_pots=player_pots)
+    deck = Deck(random.Random(seed))
+    bust_hands = {}
+
+    hands_played = 0
+    while hands_played < hands and len(game_state.remaining_players) > 1:
+        position = table_position + hands_played
+        hand = play_rounds(game_state, small_blind_stake, deck, range(position, position + 1))
+
+        try:
+            player, valid_actions = next(hand)
+            while True:
+                player_action = agent_call_action(player=player, valid_actions=valid_actions, use_local=use_local)
+                player, valid_actions = hand.send(player_action)
+        except StopIteration:
+            pass
+
+        hands_played += 1
+        for player in players:
+            if player not in bust_hands and game_state.get_player_pot(player) == 0:
+                bust_hands[player] = hands_played
+
+    return TableSegmentResult(list(game_state.player_pots), bust_hands, hands_played)
+
+
+# play_table_segment for worker processes: metrics collected by the worker are returned to be merged by the parent
+def play_table_segment_with_metrics(*args) -> Tuple[TableSegmentResult, dict]:
+    # a worker runs several tasks, every task returns only its own metrics
+    REGISTRY.reset()
+    result = play_table_segment(*args)
+    return result, REGISTRY.snapshot()
+
+
+def main(args: List[str] = None):
+    parser = argparse.ArgumentParser(description='Play a multi-table tournament')
+    parser.add_argument('--players', help='comma separated players (default: --n-players generated players)')
+    parser.add_argument('--n-players', type=int, default=180)
+    parser.add_argument('--starting-stack', type=int, default=1000)
+    parser.add_argument('--table-size', type=int, default=9)
+    parser.add_argument('--hands-per-level', type=int, default=20)
+    parser.add_argument('--hands-per-segment', type=int, default=10)
+    parser.add_argument('--max-hands', type=int)
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--remote', action='store_true', help='call agent containers instead of local agents')
+    args = parser.parse_args(args)
+
+    players = args.players.split(',') if args.players else ['player{}'.format(i) for i in range(args.n_players)]
+    result = run_tournament(players, starting_stack=args.starting_stack, table_size=args.table_size,
+                            hands_per_level=args.hands_per_level, hands_per_segment=args.hands_per_segment,
+                            use_local=not args.remote, seed=args.seed, workers=args.workers, max_hands=args.max_hands)
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == '__main__':
+    logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level='INFO')
+    main()
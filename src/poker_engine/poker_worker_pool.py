@@ -0,0 +1,37 @@
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List
+
+from src.poker_engine.poker_agent import agent_urls, set_agent_urls
+from src.poker_engine.poker_agent_runtime import register_subprocess_agent, subprocess_agents
+
+
+LOGGING_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# Worker processes are not forked from the simulator, which runs request, job and monitor threads: a fork copies
+# the locks they hold. They are forked from a fork server instead (spawned where there is none), which imports
+# the main module and the engine once
+WORKER_CONTEXT = multiprocessing.get_context(
+    'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn')
+
+if WORKER_CONTEXT.get_start_method() == 'forkserver':
+    WORKER_CONTEXT.set_forkserver_preload(['__main__', 'src.poker_engine.poker_duplicate',
+                                           'src.poker_engine.poker_equity', 'src.poker_engine.poker_league',
+                                           'src.poker_engine.poker_tournament'])
+
+
+# Process pool of the simulations, workers call the agents of a player as the simulator did when the pool started
+def worker_pool(workers: int) -> ProcessPoolExecutor:
+    return ProcessPoolExecutor(max_workers=workers, mp_context=WORKER_CONTEXT, initializer=init_worker,
+                               initargs=(agent_urls(), subprocess_agents(), logging.getLogger().level))
+
+
+# Workers start without the state of the simulator, the agent routes and the log level are set from its copy
+def init_worker(urls: Dict[str, List[str]], agent_dirs: Dict[str, str], log_level: int):
+    logging.basicConfig(format=LOGGING_FORMAT, level=log_level)
+
+    for (player, player_urls) in urls.items():
+        set_agent_urls(player, player_urls)
+    for (player, agent_dir) in agent_dirs.items():
+        register_subprocess_agent(player, agent_dir)
@@ -0,0 +1,227 @@
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Callable, Dict, List
+
+from src.agent_container_pool import AgentContainerPool
+from src.metrics import REGISTRY
+from src.models.duplicate_job import DuplicateJob
+from src.models.job import Job
+from src.models.league_job import LeagueJob
+from src.models.simulation_job import SimulationJob
+from src.models.tournament_job import TournamentJob
+from src.poker_engine.poker_async_simulator import start_async_simulation
+from src.poker_engine.poker_batch_simulator import start_batched_simulation
+from src.poker_engine.poker_duplicate import start_duplicate_simulation
+from src.poker_engine.poker_hand_history import HandHistoryWriter, hand_history_part_path, merge_hand_histories, \
+    validate_hand_history_players
+from src.poker_engine.poker_simulator import derive_game_seeds, log_simulation_result, run_games_with_metrics, \
+    start_new_game
+from src.poker_engine.poker_league import run_league
+from src.poker_engine.poker_tournament import run_tournament
+from src.poker_engine.poker_worker_pool import worker_pool
+
+
+LOGGER = logging.getLogger(__name__)
+
+
+class SimulationJobManager:
+
+    # games per process pool task, serial jobs report progress after every game
+    CHUNK_SIZE = 10
+
+    # jobs submitted with record_hand_history write their hand history into hand_history_dir.
+    # With an agent_pool, jobs calling agent containers start once the agents of their players are ready.
+    # Only the max_finished_jobs most recently finished jobs are kept, older ones are not found anymore
+    def __init__(self, max_workers: int = 2, hand_history_dir: str = None, agent_pool: AgentContainerPool = None,
+                 max_finished_jobs: int = 100):
+        self._hand_history_dir = hand_history_dir
+        self._agent_pool = agent_pool
+        self._max_finished_jobs = max_finished_jobs
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='simulation-job')
+        self._jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def hand_history_dir(self):
+        return self._hand_history_dir
+
+    # With the async runner, games run concurrently on an event loop of the job thread instead of worker processes:
+    # better throughput for agent containers, which keep the simulator waiting on the network. The batched runner
+    # plays games side by side on the job thread and sends every agent one request for all its pending decisions
+    def submit(self, players: List[str], init_pot: int, small_blind_stake: int, max_iterations: int,
+               use_local: bool, seed: int = None, workers: int = 1, record_hand_history=False,
+               runner: str = SimulationJob.PROCESS_RUNNER) -> SimulationJob:
+        if runner not in SimulationJob.RUNNERS:
+            raise ValueError('Unknown runner: {}, expected one of {}'.format(runner, SimulationJob.RUNNERS))
+        if record_hand_history and not self._hand_history_dir:
+            raise ValueError('No hand history directory is configured')
+        if record_hand_history and runner != SimulationJob.PROCESS_RUNNER:
+            raise ValueError('Hand histories are not recorded by {} simulations'.format(runner))
+        if record_hand_history:
+            validate_hand_history_players(players)
+
+        job = SimulationJob(players=players, init_pot=init_pot, small_blind_stake=small_blind_stake,
+                            max_iterations=max_iterations, use_local=use_local, seed=seed, workers=workers,
+                            hand_history_dir=self._hand_history_dir if record_hand_history else None,
+                            runner=runner)
+
+        return self._submit(job, lambda: self._run_simulation(job))
+
+    # Tournaments run as jobs as well, on the same threads as simulations
+    def submit_tournament(self, players: List[str], starting_stack: int, table_size: int, hands_per_level: int,
+                          hands_per_segment: int, use_local: bool, seed: int = None, workers: int = 1,
+                          max_hands: int = None) -> TournamentJob:
+        job = TournamentJob(players=players, starting_stack=starting_stack, table_size=table_size,
+                            hands_per_level=hands_per_level, hands_per_segment=hands_per_segment, use_local=use_local,
+                            seed=seed, workers=workers, max_hands=max_hands)
+
+        return self._submit(job, lambda: run_tournament(
+            job.players, starting_stack=job.starting_stack, table_size=job.table_size,
+            hands_per_level=job.hands_per_level, hands_per_segment=job.hands_per_segment, use_local=job.use_local,
+            seed=job.seed, workers=job.workers, max_hands=job.max_hands, on_segment=job.set_progress,
+            is_cancelled=lambda: job.is_cancel_requested
+        ))
+
+    def submit_league(self, players: List[str], table_sizes: List[int], n_way_rounds: int, init_pot: int,
+                      small_blind_stake: int, min_games: int, max_games: int, use_local: bool, seed: int = None,
+                      workers: int = 1) -> LeagueJob:
+        job = LeagueJob(players=players, table_sizes=table_sizes, n_way_rounds=n_way_rounds, init_pot=init_pot,
+                        small_blind_stake=small_blind_stake, min_games=min_games, max_games=max_games,
+                        use_local=use_local, seed=seed, workers=workers)
+
+        return self._submit(job, lambda: run_league(
+            job.players, table_sizes=job.table_sizes, n_way_rounds=job.n_way_rounds, init_pot=job.init_pot,
+            small_blind_stake=job.small_blind_stake, min_games=job.min_games, max_games=job.max_games,
+            use_local=job.use_local, seed=job.seed, workers=job.workers, on_update=job.set_progress,
+            is_cancelled=lambda: job.is_cancel_requested
+        ))
+
+    def submit_duplicate(self, players: List[str], init_pot: int, small_blind_stake: int, max_deals: int,
+                         max_rounds: int, use_local: bool, seed: int = None, workers: int = 1) -> DuplicateJob:
+        job = DuplicateJob(players=players, init_pot=init_pot, small_blind_stake=small_blind_stake,
+                           max_deals=max_deals, max_rounds=max_rounds, use_local=use_local, seed=seed, workers=workers)
+
+        return self._submit(job, lambda: start_duplicate_simulation(
+            job.players, init_pot=job.init_pot, small_blind_stake=job.small_blind_stake, max_deals=job.max_deals,
+            max_rounds=job.max_rounds, use_local=job.use_local, seed=job.seed, workers=job.workers,
+            on_progress=job.set_progress, is_cancelled=lambda: job.is_cancel_requested
+        ))
+
+    def get_job(self, job_id: str) -> Job:
+        return self._jobs.get(job_id)
+
+    def get_jobs(self) -> List[Job]:
+        with self._lock:
+            return list(self._jobs.values())
+
+    def cancel(self, job_id: str) -> Job:
+        job = self._jobs.get(job_id)
+        if job and not job.is_finished:
+            job.request_cancel()
+        return job
+
+    def _submit(self, job: Job, run: Callable[[], object]) -> Job:
+        with self._lock:
+            self._jobs[job.id] = job
+
+        self._executor.submit(self._run, job, run).add_done_callback(lambda _: self._forget_finished_jobs())
+        LOGGER.info('New %s job: %s', job.TYPE, job)
+        return job
+
+    def _forget_finished_jobs(self):
+        with self._lock:
+            finished_jobs = sorted((job for job in self._jobs.values() if job.is_finished),
+                                   key=lambda job: job.finished_at)
+            for job in finished_jobs[:max(len(finished_jobs) - self._max_finished_jobs, 0)]:
+                del self._jobs[job.id]
+                LOGGER.debug('Finished job is forgotten: %s', job.id)
+
+    # Run a job on a job thread: run returns the result of the job, a job cancelled while running keeps the
+    # result it got so far
+    def _run(self, job: Job, run: Callable[[], object]):
+        if job.is_cancel_requested:
+            job.set_finished(Job.CANCELLED)
+            return
+
+        try:
+            if self._agent_pool and not job.use_local:
+                self._agent_pool.wait_ready(job.players)
+
+            job.set_running()
+            result = run()
+        except Exception as ex:  # pylint: disable=broad-except
+            LOGGER.exception('%s job failed: %s', job.TYPE.capitalize(), job.id)
+            job.set_finished(Job.FAILED, error=str(ex))
+            return
+
+        job.set_finished(Job.CANCELLED if job.is_cancel_requested else Job.COMPLETED, result=result)
+
+    def _run_simulation(self, job: SimulationJob):
+        if job.runner == SimulationJob.ASYNC_RUNNER:
+            start_async_simulation(job.players, init_pot=job.init_pot, small_blind_stake=job.small_blind_stake,
+                                   max_iterations=job.max_iterations, use_local=job.use_local, seed=job.seed,
+                                   on_result=job.add_results, is_cancelled=lambda: job.is_cancel_requested)
+        elif job.runner == SimulationJob.BATCHED_RUNNER:
+            start_batched_simulation(job.players, init_pot=job.init_pot, small_blind_stake=job.small_blind_stake,
+                                     max_iterations=job.max_iterations, use_local=job.use_local, seed=job.seed,
+                                     on_result=job.add_results, is_cancelled=lambda: job.is_cancel_requested)
+        else:
+            self._run_chunks(job)
+
+        log_simulation_result(job.histogram, job.max_iterations)
+
+    def _run_chunks(self, job: SimulationJob):
+        game_seeds = derive_game_seeds(job.seed, job.max_iterations)
+
+        if job.hand_history_path:
+            os.makedirs(os.path.dirname(job.hand_history_path), exist_ok=True)
+
+        if job.workers <= 1:
+            self._run_serial(job, game_seeds)
+            return
+
+        chunks = [game_seeds[i:i + self.CHUNK_SIZE] for i in range(0, len(game_seeds), self.CHUNK_SIZE)]
+        chunk_history_paths = [hand_history_part_path(job.hand_history_path, i) if job.hand_history_path else None
+                               for i in range(len(chunks))]
+        run_chunk = partial(run_games_with_metrics, job.players, job.init_pot, job.small_blind_stake, job.use_local)
+
+        try:
+            with worker_pool(job.workers) as executor:
+                futures = [executor.submit(run_chunk, chunk, chunk_history_path)
+                           for (chunk, chunk_history_path) in zip(chunks, chunk_history_paths)]
+                for future in futures:
+                    if job.is_cancel_requested:
+                        for pending in futures:
+                            pending.cancel()
+                        return
+
+                    chunk_histogram, chunk_metrics = future.result()
+                    REGISTRY.merge(chunk_metrics)
+                    job.add_results(chunk_histogram)
+        finally:
+            # a cancelled job keeps the games of every chunk that was started
+            if job.hand_history_path:
+                merge_hand_histories([path for path in chunk_history_paths if os.path.exists(path)],
+                                     job.hand_history_path, remove=True)
+
+    def _run_serial(self, job: SimulationJob, game_seeds: List[int]):
+        # the hand history is written to a part file until the job ends, so that analytics skip it meanwhile
+        hand_history = HandHistoryWriter(hand_history_part_path(job.hand_history_path, 0), players=job.players) \
+            if job.hand_history_path else None
+
+        try:
+            for game_seed in game_seeds:
+                if job.is_cancel_requested:
+                    return
+
+                winner = start_new_game(players=job.players, init_pot=job.init_pot,
+                                        small_blind_stake=job.small_blind_stake, use_local=job.use_local,
+                                        seed=game_seed, hand_history=hand_history)
+                job.add_results({winner: 1})
+        finally:
+            if hand_history:
+                hand_history.close()
+                os.replace(hand_history.path, job.hand_history_path)
@@ -0,0 +1,17 @@
+from unittest import mock
+
+import pytest
+
+
+# There is no Docker daemon where the tests run: the Docker client is created when src.docker_client_wrapper is
+# imported, before any test can patch it
+mock.patch('docker.from_env').start()
+
+
+@pytest.fixture
+def app_client(monkeypatch):
+    import app  # pylint: disable=import-outside-toplevel
+
+    monkeypatch.setattr(app, 'PLAYERS', ['playerOne', 'playerTwo', 'playerThree'])
+    app.app.config['TESTING'] = True
+    return app.app.test_client()
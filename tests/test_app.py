@@ -0,0 +1,96 @@
+import pytest
+
+
+@pytest.mark.parametrize('query', [
+    'hole=AsKs&samples=many',
+    'hole=AsKs&opponents=0',
+    'hole=AsKs&opponents=two',
+    'hole=AsKs&board=Td7c',
+    'hole=AsKs&board=AsTd7c',
+    'hole=AsKs&ci_width=wide',
+    'hole=AsKs&workers=all',
+    'hole=XxYy',
+    'board=Td7c2s',
+])
+def test_equity_rejects_bad_parameters(app_client, query):
+    res = app_client.get('/equity?' + query)
+
+    assert res.status_code == 400
+
+
+def test_equity(app_client):
+    res = app_client.get('/equity?hole=AsAh&board=Td7c2s&samples=2000&seed=1')
+
+    assert res.status_code == 200
+    assert res.get_json()['samples'] == 2000
+    assert 0.5 < res.get_json()['equity'] <= 1
+
+
+@pytest.mark.parametrize('query', [
+    'players=playerOne,playerTwo&table_size=1',
+    'players=playerOne,playerTwo&hands_per_level=0',
+    'players=playerOne,playerTwo&hands_per_segment=0',
+    'players=playerOne,playerOne',
+    'players=playerOne',
+    'players=playerOne,playerTwo&starting_stack=lots',
+    'players=playerOne,playerTwo&max_hands=all',
+    'players=playerOne,playerFour',
+])
+def test_start_tournament_rejects_bad_parameters(app_client, query):
+    res = app_client.post('/tournaments/start_new?' + query)
+
+    assert res.status_code == 400
+
+
+@pytest.mark.parametrize('query', [
+    'players=playerOne,playerTwo&max_deals=1',
+    'players=playerOne,playerTwo&max_deals=some',
+    'players=playerOne',
+    'players=playerOne,playerOne',
+    'players=playerOne,playerTwo&seed=random',
+    'players=playerOne,playerFour',
+])
+def test_start_duplicate_rejects_bad_parameters(app_client, query):
+    res = app_client.post('/duplicates/start_new?' + query)
+
+    assert res.status_code == 400
+
+
+@pytest.mark.parametrize('query', [
+    'players=playerOne,playerTwo&table_sizes=two',
+    'players=playerOne,playerTwo&table_sizes=0',
+    'players=playerOne,playerTwo&table_sizes=1',
+    'players=playerOne,playerTwo&table_sizes=2,1',
+    'players=playerOne,playerTwo&n_way_rounds=once',
+    'players=playerOne,playerTwo&n_way_rounds=0',
+    'players=playerOne,playerTwo&min_games=50&max_games=20',
+    'players=playerOne,playerTwo&max_games=-5',
+    'players=playerOne,playerTwo&max_games=1000000',
+    'players=playerOne,playerTwo&seed=random',
+    'players=playerOne',
+    'players=playerOne,playerOne',
+    'players=playerOne,playerFour',
+])
+def test_start_league_rejects_bad_parameters(app_client, query):
+    res = app_client.post('/leagues/start_new?' + query)
+
+    assert res.status_code == 400
+
+
+@pytest.mark.parametrize('query', [
+    'runner=async&record=true',
+    'runner=batched&record=true',
+    'runner=threads',
+    'workers=all',
+])
+def test_start_simulation_rejects_bad_parameters(app_client, query):
+    res = app_client.post('/simulations/start_new?players=playerOne,playerTwo&init_pot=100&small_blind_stake=5'
+                          '&max_iterations=10&' + query)
+
+    assert res.status_code == 400
+
+
+@pytest.mark.parametrize('path', ['/simulations/unknown', '/tournaments/unknown', '/leagues/unknown',
+                                  '/duplicates/unknown'])
+def test_unknown_jobs_are_not_found(app_client, path):
+    assert app_client.get(path).status_code == 404
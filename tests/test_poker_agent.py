@@ -0,0 +1,54 @@
+from unittest import mock
+
+import pytest
+
+from src.poker_engine.poker_agent import AgentClient, parse_agent_action, parse_agent_actions
+
+
+VALID_ACTIONS = [('fold', 0, 0), ('call', 10, 10), ('raise', 15, 100)]
+
+
+@pytest.mark.parametrize('agent_action', [
+    None,
+    'ab',
+    ['raise'],
+    ['raise', 20, 'now'],
+    ['raise', 'lots'],
+    ['raise', 20.5],
+    ['raise', True],
+    ['raise', 5],
+    ['raise', 101],
+    ['call', 5],
+    ['bet', 10],
+    ['check', 0],
+    {'action': 'raise', 'amount': 20},
+])
+def test_malformed_agent_actions_are_rejected(agent_action):
+    with pytest.raises(ValueError):
+        parse_agent_action(agent_action, VALID_ACTIONS)
+
+
+@pytest.mark.parametrize('agent_action', [['fold', 0], ['call', 10], ['raise', 15], ('raise', 100)])
+def test_valid_agent_actions(agent_action):
+    assert parse_agent_action(agent_action, VALID_ACTIONS) == tuple(agent_action)
+
+
+@pytest.mark.parametrize('res', [{'agent_actions': [['call', 10]]}, {'agent_actions': None}, {}])
+def test_batches_of_the_wrong_size_are_rejected(res):
+    with pytest.raises((KeyError, ValueError)):
+        parse_agent_actions(res, [VALID_ACTIONS, VALID_ACTIONS])
+
+
+@pytest.mark.parametrize('res', [None, {}, {'agent_action': None}, {'agent_action': ['raise', 'lots']},
+                                 {'agent_action': ['bet', 10]}, {'agent_action': 'ab'}, ['call', 10]])
+def test_agent_client_falls_back_on_malformed_responses(res):
+    client = AgentClient('playerOne')
+    with mock.patch.object(client, '_post_with_retries', return_value=res):
+        assert client.call_action(VALID_ACTIONS) == ('fold', 0)
+        assert client.call_actions([VALID_ACTIONS, [('check', 0, 0)]]) == [('fold', 0), ('check', 0)]
+
+
+def test_agent_client_returns_valid_responses():
+    client = AgentClient('playerOne')
+    with mock.patch.object(client, '_post_with_retries', return_value={'agent_action': ['raise', 20]}):
+        assert client.call_action(VALID_ACTIONS) == ('raise', 20)
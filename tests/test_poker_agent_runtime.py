@@ -0,0 +1,43 @@
+from unittest import mock
+
+import pytest
+
+from src.poker_engine.poker_agent_runtime import SubprocessAgent
+
+
+VALID_ACTIONS = [('fold', 0, 0), ('call', 10, 10), ('raise', 15, 100)]
+
+
+def subprocess_agent(tmp_path, agent_action: str) -> SubprocessAgent:
+    (tmp_path / 'src').mkdir()
+    (tmp_path / 'src' / '__init__.py').write_text('')
+    (tmp_path / 'src' / 'poker_agent.py').write_text(
+        'def get_agent_action(valid_actions):\n    return {}\n'.format(agent_action))
+    return SubprocessAgent('playerOne', str(tmp_path), timeout=10)
+
+
+@pytest.mark.parametrize('agent_action', ['None', "'ab'", "('raise', 'lots')", "('bet', 10)", "('raise', 500)",
+                                          "['call', 10, 10]", '1 / 0'])
+def test_malformed_replies_get_the_fallback_action(tmp_path, agent_action):
+    agent = subprocess_agent(tmp_path, agent_action)
+    try:
+        assert agent.call_action(VALID_ACTIONS) == ('fold', 0)
+        assert agent.call_actions([VALID_ACTIONS, [('check', 0, 0)]]) == [('fold', 0), ('check', 0)]
+    finally:
+        agent.close()
+
+
+def test_valid_replies(tmp_path):
+    agent = subprocess_agent(tmp_path, "('call', valid_actions[1][1])")
+    try:
+        assert agent.call_action(VALID_ACTIONS) == ('call', 10)
+        assert agent.call_actions([VALID_ACTIONS, VALID_ACTIONS]) == [('call', 10), ('call', 10)]
+    finally:
+        agent.close()
+
+
+@pytest.mark.parametrize('reply', [{'agent_actions': [['call', 10]]}, {'agent_actions': None}, None, [1, 2]])
+def test_batch_replies_of_the_wrong_size_get_the_fallback_action(tmp_path, reply):
+    agent = subprocess_agent(tmp_path, "('call', 10)")
+    with mock.patch.object(agent, '_call_worker', return_value=reply):
+        assert agent.call_actions([VALID_ACTIONS, [('check', 0, 0)]]) == [('fold', 0), ('check', 0)]
@@ -0,0 +1,26 @@
+import pytest
+
+from src.poker_engine.poker_duplicate import play_duplicate_deal, start_duplicate_simulation
+from src.poker_engine.poker_simulator import derive_game_seeds
+
+
+PLAYERS = ['a', 'b', 'c']
+
+
+def test_seeded_duplicate_results_do_not_depend_on_workers():
+    results = [start_duplicate_simulation(PLAYERS, max_deals=6, max_rounds=20, seed=3, workers=workers)
+               for workers in (1, 2)]
+
+    assert results[1] == results[0]
+
+
+@pytest.mark.parametrize('players', [['a', 'b'], PLAYERS, ['a', 'b', 'c', 'd']])
+def test_duplicate_deals_of_identical_agents_score_zero(players):
+    # the local agent plays every seat the same way, whoever sits there
+    for seed in derive_game_seeds(1, 10):
+        seating_results = play_duplicate_deal(players, init_pot=100, small_blind_stake=5, max_rounds=30,
+                                              use_local=True, seed=seed)
+
+        assert len(seating_results) == len(players)
+        for player in players:
+            assert sum(seating[player] for seating in seating_results) == 0
@@ -0,0 +1,17 @@
+import itertools
+
+import numpy as np
+
+from src.poker_engine.poker_equity import board_strength_table
+from src.poker_engine.poker_hand_batch import evaluate_board
+
+
+def test_board_strength_table_matches_evaluated_hands():
+    board_cards = (0, 9, 18, 27, 51)
+    hole_cards = np.array([pair for pair in itertools.combinations(range(52), 2) if not set(pair) & set(board_cards)])
+
+    table = board_strength_table(board_cards)
+
+    assert (table[hole_cards[:, 0], hole_cards[:, 1]] == evaluate_board(hole_cards, board_cards)).all()
+    assert (table[hole_cards[:, 1], hole_cards[:, 0]] == evaluate_board(hole_cards, board_cards)).all()
+    assert (table[list(board_cards), list(board_cards)] == -1).all()
@@ -0,0 +1,21 @@
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from src.poker_engine.poker_hand_analytics import SUMMARY_SUFFIX, find_hand_histories, load_summary, \
+    scan_hand_history
+from src.poker_engine.poker_simulator import start_simulation
+
+
+def test_concurrent_summaries_are_written_atomically(tmp_path):
+    path = str(tmp_path / 'games.phh')
+    start_simulation(['a', 'b', 'c'], max_iterations=5, seed=2, hand_history_path=path)
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        summaries = list(executor.map(lambda _: load_summary(path), range(32)))
+
+    assert all(summary == scan_hand_history(path) for summary in summaries)
+    with open(path + SUMMARY_SUFFIX) as summary_file:
+        assert json.load(summary_file)['summary'] == summaries[0]
+    assert sorted(os.listdir(str(tmp_path))) == ['games.phh', 'games.phh' + SUMMARY_SUFFIX]
+    assert find_hand_histories(str(tmp_path)) == [path]
@@ -0,0 +1,95 @@
+import random
+from collections import Counter
+from itertools import combinations
+
+import pytest
+from poker import Card, Combo
+
+from src.poker_engine.poker_hand_check import compare_hands, detect_hand
+from src.poker_engine.poker_hand_eval import CARDS, FLUSH, STRAIGHT, STRAIGHT_FLUSH, cards_to_ints, evaluate_cards, \
+    strength_category
+
+
+# Return (category, tie breaking ranks) of 5 integer-encoded cards, ranks are 2..14
+def brute_force_five(cards):
+    ranks = sorted(((card >> 2) + 2 for card in cards), reverse=True)
+    groups = sorted(Counter(ranks).items(), key=lambda rank_count: (rank_count[1], rank_count[0]), reverse=True)
+    group_ranks = tuple(rank for (rank, _) in groups)
+    group_counts = [count for (_, count) in groups]
+    flush = len({card & 3 for card in cards}) == 1
+
+    straight_high = None
+    if len(groups) == 5 and ranks[0] - ranks[4] == 4:
+        straight_high = ranks[0]
+    elif ranks == [14, 5, 4, 3, 2]:
+        straight_high = 5
+
+    if straight_high and flush:
+        return (9, straight_high)
+    if group_counts[0] == 4:
+        return (8,) + group_ranks
+    if group_counts[:2] == [3, 2]:
+        return (7,) + group_ranks
+    if flush:
+        return (6,) + tuple(ranks)
+    if straight_high:
+        return (5, straight_high)
+    if group_counts[0] == 3:
+        return (4,) + group_ranks
+    if group_counts[:2] == [2, 2]:
+        return (3,) + group_ranks
+    if group_counts[0] == 2:
+        return (2,) + group_ranks
+    return (1,) + tuple(ranks)
+
+
+def brute_force(cards):
+    return max(brute_force_five(hand) for hand in combinations(cards, 5))
+
+
+@pytest.mark.parametrize('n_cards', [5, 6, 7])
+def test_evaluate_cards_orders_hands_as_brute_force(n_cards):
+    rng = random.Random(n_cards)
+    hands = [rng.sample(range(52), n_cards) for _ in range(3000)]
+    scored = sorted((brute_force(hand), evaluate_cards(hand)) for hand in hands)
+
+    for (brute_strength, strength) in scored:
+        assert strength_category(strength) == brute_strength[0]
+
+    for ((brute_low, low), (brute_high, high)) in zip(scored, scored[1:]):
+        assert (brute_low == brute_high) == (low == high)
+        assert low <= high
+
+
+def test_evaluate_cards_straights_and_flushes():
+    def strength(cards):
+        return evaluate_cards(cards_to_ints([Card(card) for card in cards.split()]))
+
+    wheel = strength('Ah 2c 3d 4s 5h 9c Kd')
+    six_high = strength('2c 3d 4s 5h 6h 9c Kd')
+    assert strength_category(wheel) == STRAIGHT
+    assert wheel < six_high
+    assert strength('2h 3h 4h 5h 7h 9c 9d') > strength('Ts Jh Qd Kc Ac 9c 9d')
+    assert strength_category(strength('2h 3h 4h 5h 7h 9c 9d')) == FLUSH
+    assert strength_category(strength('Ah 2h 3h 4h 5h Kc Qd')) == STRAIGHT_FLUSH
+    assert strength('Ah 2h 3h 4h 5h Kc Qd') < strength('2h 3h 4h 5h 6h Kc Qd')
+
+
+def test_detect_hand_picks_the_best_five_cards():
+    rng = random.Random(0)
+    for _ in range(500):
+        cards = [CARDS[card] for card in rng.sample(range(52), 7)]
+        best_hand = detect_hand(Combo.from_cards(cards[0], cards[1]), cards[2:])
+
+        assert len(best_hand) == 5
+        assert set(best_hand) <= set(cards)
+        assert evaluate_cards(cards_to_ints(best_hand)) == evaluate_cards(cards_to_ints(cards))
+
+
+def test_compare_hands_keeps_the_last_of_equal_hands():
+    first = [Card(card) for card in 'As Ks Qd Jc 9h'.split()]
+    second = [Card(card) for card in 'Ah Kh Qc Jd 9s'.split()]
+    weaker = [Card(card) for card in 'As Ks Qd Jc 8h'.split()]
+
+    assert compare_hands([first, second]) is second
+    assert compare_hands([first, weaker]) is first
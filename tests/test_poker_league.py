@@ -0,0 +1,28 @@
+import pytest
+
+from src.poker_engine.poker_league import MAX_LEAGUE_GAMES, run_league
+
+
+@pytest.mark.parametrize('kwargs', [
+    {'table_sizes': [0]},
+    {'table_sizes': [1]},
+    {'table_sizes': []},
+    {'n_way_rounds': 0},
+    {'batch_size': 0},
+    {'min_games': 0},
+    {'min_games': 50, 'max_games': 20},
+    {'max_games': -5},
+    {'max_games': MAX_LEAGUE_GAMES + 1},
+])
+def test_run_league_rejects_bad_parameters(kwargs):
+    with pytest.raises(ValueError):
+        run_league(['playerOne', 'playerTwo', 'playerThree'], **kwargs)
+
+
+def test_seeded_league_leaderboard():
+    players = ['playerOne', 'playerTwo', 'playerThree']
+    results = [run_league(players, table_sizes=[2, 3], min_games=4, max_games=8, batch_size=4, seed=3)
+               for _ in range(2)]
+
+    assert results[0]['leaderboard'] == results[1]['leaderboard']
+    assert {row['player'] for row in results[0]['leaderboard']} == set(players)
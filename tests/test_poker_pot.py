@@ -0,0 +1,48 @@
+import random
+
+from src.poker_engine.poker_hand_history import RoundRecord, read_hand_history
+from src.poker_engine.poker_pot import build_side_pots, split_pots
+from src.poker_engine.poker_simulator import start_simulation
+
+
+PLAYERS = ['p{}'.format(i) for i in range(6)]
+
+
+def test_side_pots_conserve_chips():
+    rng = random.Random(0)
+    for _ in range(5000):
+        player_chips = {player: rng.choice([0, 5, 10, 25, 50, rng.randint(1, 200)]) for player in PLAYERS}
+        contenders = [player for player in PLAYERS if rng.random() < 0.6] or [rng.choice(PLAYERS)]
+        player_strengths = {player: rng.randint(1, 4) for player in contenders}
+
+        pots = build_side_pots(player_chips, contenders)
+        payouts = split_pots(pots, player_strengths)
+
+        assert sum(chips for (chips, _) in pots) == sum(player_chips.values())
+        assert sum(payouts.values()) == sum(player_chips.values())
+        assert all(eligible and set(eligible) <= set(contenders) for (_, eligible) in pots)
+        assert set(payouts) <= set(contenders)
+
+
+def test_side_pots_of_all_in_levels():
+    player_chips = {'a': 100, 'b': 40, 'c': 100, 'd': 20}
+    pots = build_side_pots(player_chips, ['a', 'b', 'c'])
+
+    # d folded after putting 20 chips in, b is all in for 40
+    assert pots == [(140, ['a', 'b', 'c']), (120, ['a', 'c'])]
+    assert split_pots(pots, {'a': 1, 'b': 3, 'c': 2}) == {'b': 140, 'c': 120}
+    assert split_pots(pots, {'a': 2, 'b': 1, 'c': 2}) == {'a': 130, 'c': 130}
+
+
+def test_games_conserve_chips(tmp_path):
+    players = ['a', 'b', 'c', 'd']
+    init_pot = 100
+    path = str(tmp_path / 'games.phh')
+    start_simulation(players, init_pot=init_pot, max_iterations=20, seed=1, hand_history_path=path)
+
+    rounds = [record for record in read_hand_history(path) if isinstance(record, RoundRecord)]
+    assert rounds
+    for round_record in rounds:
+        # busted players have no chips left
+        assert sum(round_record.player_pots) == init_pot * len(players)
+        assert sum(round_record.payouts.values()) == round_record.pot
@@ -0,0 +1,40 @@
+import pytest
+
+from src.poker_engine.poker_replay import load_recorded_game, replay_game, replay_recorded_game
+from src.poker_engine.poker_simulator import start_simulation
+
+
+PLAYERS = ['a', 'b', 'c']
+
+
+@pytest.fixture(scope='module')
+def hand_history_path(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp('hand_histories') / 'games.phh')
+    start_simulation(PLAYERS, max_iterations=5, seed=11, hand_history_path=path)
+    return path
+
+
+@pytest.mark.parametrize('game_index', range(5))
+def test_replay_equals_recorded_game(hand_history_path, game_index):
+    recorded_game = load_recorded_game(hand_history_path, game_index)
+
+    # recorded actions are checked against the decisions asked by the engine
+    assert replay_recorded_game(hand_history_path, game_index) == recorded_game.game_end.winner
+
+    game_start = recorded_game.game_start
+    assert replay_game(game_start.players, game_start.init_pot, game_start.small_blind_stake,
+                       game_start.seed) == recorded_game.game_end.winner
+
+
+@pytest.mark.parametrize('game_index', range(5))
+def test_replay_from_a_later_round(hand_history_path, game_index):
+    recorded_game = load_recorded_game(hand_history_path, game_index)
+    start_round = recorded_game.rounds[len(recorded_game.rounds) // 2].pos
+
+    assert replay_recorded_game(hand_history_path, game_index, start_round=start_round) == \
+        recorded_game.game_end.winner
+
+
+def test_replay_of_a_missing_game(hand_history_path):
+    with pytest.raises(ValueError):
+        load_recorded_game(hand_history_path, 5)
@@ -0,0 +1,19 @@
+from src.poker_engine.poker_batch_simulator import start_batched_simulation
+from src.poker_engine.poker_simulator import start_simulation
+
+
+PLAYERS = ['a', 'b', 'c']
+
+
+def test_seeded_simulation_results_do_not_depend_on_workers():
+    histograms = [start_simulation(PLAYERS, max_iterations=24, seed=7, workers=workers) for workers in (1, 2, 3)]
+
+    assert sum(histograms[0].values()) == 24
+    assert histograms[1] == histograms[0]
+    assert histograms[2] == histograms[0]
+
+
+def test_batched_simulation_results_match_serial_simulation():
+    histogram = start_simulation(PLAYERS, max_iterations=24, seed=7)
+
+    assert start_batched_simulation(PLAYERS, max_iterations=24, use_local=True, seed=7, tables=5) == histogram
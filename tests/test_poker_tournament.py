@@ -0,0 +1,9 @@
+from src.poker_engine.poker_tournament import run_tournament
+
+
+def test_seeded_tournament_results_do_not_depend_on_workers():
+    players = ['p{}'.format(i) for i in range(6)]
+    results = [run_tournament(players, starting_stack=100, table_size=3, hands_per_level=5, seed=5, workers=workers)
+               for workers in (1, 2)]
+
+    assert results[1] == results[0]
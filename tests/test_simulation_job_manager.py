@@ -0,0 +1,70 @@
+import time
+
+import pytest
+
+from src.models.job import Job
+from src.models.simulation_job import SimulationJob
+from src.simulation_job_manager import SimulationJobManager
+
+
+PLAYERS = ['a', 'b', 'c']
+
+
+def wait_finished(job, timeout=60):
+    deadline = time.time() + timeout
+    while not job.is_finished and time.time() < deadline:
+        time.sleep(0.01)
+    return job
+
+
+@pytest.mark.parametrize('runner', [SimulationJob.BATCHED_RUNNER, SimulationJob.ASYNC_RUNNER])
+def test_seeded_runner_results_match_process_runner(runner):
+    manager = SimulationJobManager()
+    jobs = [manager.submit(PLAYERS, init_pot=100, small_blind_stake=5, max_iterations=20, use_local=True, seed=3,
+                           runner=job_runner)
+            for job_runner in (SimulationJob.PROCESS_RUNNER, runner)]
+
+    serial, other = [wait_finished(job) for job in jobs]
+
+    assert serial.status == SimulationJob.COMPLETED
+    assert other.status == SimulationJob.COMPLETED
+    assert other.to_dict()['runner'] == runner
+    assert other.histogram == serial.histogram
+
+
+def test_submit_rejects_unknown_runner():
+    with pytest.raises(ValueError):
+        SimulationJobManager().submit(PLAYERS, init_pot=100, small_blind_stake=5, max_iterations=20, use_local=True,
+                                      runner='threads')
+
+
+def test_jobs_share_the_lifecycle():
+    manager = SimulationJobManager()
+    league = manager.submit_league(PLAYERS, table_sizes=[2], n_way_rounds=1, init_pot=100, small_blind_stake=5,
+                                   min_games=2, max_games=4, use_local=True, seed=1)
+    failing = manager.submit_league(PLAYERS, table_sizes=[2], n_way_rounds=1, init_pot=100, small_blind_stake=5,
+                                    min_games=2, max_games=-5, use_local=True, seed=1)
+    duplicate = manager.submit_duplicate(PLAYERS[:2], init_pot=100, small_blind_stake=5, max_deals=2, max_rounds=2,
+                                         use_local=True, seed=1)
+
+    assert wait_finished(league).status == Job.COMPLETED
+    assert league.to_dict()['type'] == 'league'
+    assert league.result['leaderboard']
+    assert wait_finished(failing).status == Job.FAILED
+    assert failing.to_dict()['error']
+    assert wait_finished(duplicate).status == Job.COMPLETED
+    assert duplicate.to_dict()['result'] == duplicate.result
+
+
+def test_only_the_last_finished_jobs_are_kept():
+    manager = SimulationJobManager(max_workers=1, max_finished_jobs=2)
+    jobs = [manager.submit(PLAYERS, init_pot=100, small_blind_stake=5, max_iterations=1, use_local=True, seed=seed)
+            for seed in range(4)]
+
+    deadline = time.time() + 60
+    while len(manager.get_jobs()) > 2 and time.time() < deadline:
+        time.sleep(0.01)
+
+    assert all(wait_finished(job).status == Job.COMPLETED for job in jobs)
+    assert manager.get_jobs() == jobs[2:]
+    assert manager.get_job(jobs[0].id) is None